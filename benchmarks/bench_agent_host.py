@@ -0,0 +1,146 @@
+"""
+Benchmark memory per agent with a process per agent and with agent hosts.
+
+Serves the socket.io app and starts idle agents against it like the
+server does, with `start_agent` in a process per agent or `host_agents`
+for all of them in one host process. Once every agent is connected it
+reports the resident (RSS) and proportional (PSS, shared pages split
+between processes) memory per agent. Reads /proc, so runs on Linux only.
+
+Run with: python benchmarks/bench_agent_host.py [agents] [start method]
+"""
+import asyncio
+import socket
+import sys
+import tempfile
+from pathlib import Path
+
+import uvicorn
+
+from zycelium.zygote.api import api
+from zycelium.zygote.broker import routes
+from zycelium.zygote.host import host_agents, pack_agents
+from zycelium.zygote.plugin import start_agent
+from zycelium.zygote.server import DrainingServer, sio_app
+from zycelium.zygote.supervisor import Supervisor, agent_context
+
+AGENT_MODULE = """
+from zycelium.zygote.agent import Agent
+
+agent = Agent({name!r})
+
+
+@agent.on_interval(seconds=60)
+async def poll():
+    pass
+"""
+
+
+def write_agent_modules(path: Path, names: list) -> None:
+    """Write an importable module with an idle agent for every name."""
+    for name in names:
+        (path / f"{name}.py").write_text(AGENT_MODULE.format(name=name))
+    sys.path.insert(0, str(path))
+
+
+async def provision(names: list) -> dict:
+    """Create agents in a space, return a map of name to (uuid, auth)."""
+    space = await api.create_space("bench")
+    agents = {}
+    for name in names:
+        agent = await api.create_agent(name)
+        await api.join_space(space["uuid"], agent["uuid"])
+        token = await api.create_auth_token(agent["uuid"])
+        agents[name] = (agent["uuid"], {"token": token["token"]})
+    return agents
+
+
+async def start_server() -> tuple:
+    """Serve the socket.io app on a free port, return the server, task and url."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = DrainingServer(
+        uvicorn.Config(
+            sio_app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"
+        )
+    )
+    server.install_signal_handlers = lambda: None  # type: ignore
+    serving = asyncio.create_task(server.serve())
+    while not server.started and not serving.done():
+        await asyncio.sleep(0.01)
+    return server, serving, f"http://127.0.0.1:{port}"
+
+
+def memory(pid: int) -> tuple:
+    """Get (rss, pss) of a process in KiB."""
+    values = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        key, _, value = line.partition(":")
+        if key in ("Rss", "Pss"):
+            values[key] = int(value.split()[0])
+    return values["Rss"], values["Pss"]
+
+
+async def run(
+    sup: Supervisor, url: str, agents: dict, strategy: str, settle: float = 2.0
+) -> tuple:
+    """Start agents packed by strategy, return process count and total (rss, pss)."""
+    auth = {name: agent_auth for name, (_, agent_auth) in agents.items()}
+    groups = pack_agents(auth, strategy)
+    for i, group in enumerate(groups):
+        if len(group) == 1:
+            await sup.add_process(
+                group[0], start_agent, group[0], url=url, auth=auth[group[0]]
+            )
+        else:
+            await sup.add_process(
+                f"agent-host-{i}",
+                host_agents,
+                {name: auth[name] for name in group},
+                url=url,
+                restart_policy=sup.policy,
+                members=group,
+            )
+    await sup.start()
+    try:
+        while not all(routes.sids_for_agent(uuid) for uuid, _ in agents.values()):
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(settle)
+        usage = [memory(process.status()["pid"]) for process in sup.processes.values()]
+    finally:
+        await sup.stop()
+        while any(routes.sids_for_agent(uuid) for uuid, _ in agents.values()):
+            await asyncio.sleep(0.05)
+    return len(groups), sum(rss for rss, _ in usage), sum(pss for _, pss in usage)
+
+
+async def main(count: int, method: str) -> None:
+    """Run benchmark."""
+    names = [f"bench_agent_{i}" for i in range(count)]
+    print(f"{count} agents, {method} start method")
+    with tempfile.TemporaryDirectory() as path:
+        write_agent_modules(Path(path), names)
+        await api.start("sqlite://:memory:")
+        server, serving, url = await start_server()
+        try:
+            agents = await provision(names)
+            for strategy in ("process", "host"):
+                sup = Supervisor(context=agent_context(method))
+                processes, rss, pss = await run(sup, url, agents, strategy)
+                print(
+                    f"{strategy:<8} {processes:>4} processes "
+                    f"{rss / count / 1024:8.1f} MiB RSS/agent "
+                    f"{pss / count / 1024:8.1f} MiB PSS/agent"
+                )
+        finally:
+            server.should_exit = True
+            await serving
+            await api.stop()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(
+        main(int(args[0]) if args else 10, args[1] if len(args) > 1 else "forkserver")
+    )
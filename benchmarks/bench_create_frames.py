@@ -0,0 +1,75 @@
+"""
+Benchmark frame ingestion: one frame per call against bulk create_frames.
+
+Run with: python benchmarks/bench_create_frames.py [frames]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from zycelium.zygote.api import ZygoteAPI
+
+
+async def setup(api: ZygoteAPI, spaces: int = 3) -> tuple:
+    """Create an agent that joined a few spaces."""
+    agent = await api.create_agent("bench")
+    space_uuids = []
+    for i in range(spaces):
+        space = await api.create_space(f"bench-{i}")
+        await api.join_space(space["uuid"], agent["uuid"])
+        space_uuids.append(space["uuid"])
+    return agent["uuid"], space_uuids
+
+
+def make_frames(count: int, agent_uuid: str, space_uuids: list) -> list:
+    """Make frames to ingest."""
+    return [
+        {
+            "kind": "event",
+            "name": "bench/reading",
+            "data": {"value": i, "unit": "C"},
+            "agent_uuid": agent_uuid,
+            "space_uuids": space_uuids,
+        }
+        for i in range(count)
+    ]
+
+
+async def bench_single(api: ZygoteAPI, frames: list) -> float:
+    """Ingest frames one call at a time, return frames per second."""
+    start = time.perf_counter()
+    for frame in frames:
+        await api.create_frame(**frame)
+    return len(frames) / (time.perf_counter() - start)
+
+
+async def bench_bulk(api: ZygoteAPI, frames: list, batch_size: int) -> float:
+    """Ingest frames in batches, return frames per second."""
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        await api.create_frames(frames[i : i + batch_size])
+    return len(frames) / (time.perf_counter() - start)
+
+
+async def main(count: int) -> None:
+    """Run benchmarks."""
+    with tempfile.TemporaryDirectory() as tmp:
+        api = ZygoteAPI()
+        api.logger.disabled = True
+        await api.start(f"sqlite://{Path(tmp) / 'bench.db'}")
+        try:
+            agent_uuid, space_uuids = await setup(api)
+            frames = make_frames(count, agent_uuid, space_uuids)
+            rate = await bench_single(api, frames)
+            print(f"create_frame           {rate:10.0f} frames/sec")
+            for batch_size in (10, 100, 1000):
+                rate = await bench_bulk(api, frames, batch_size)
+                print(f"create_frames({batch_size:>4})    {rate:10.0f} frames/sec")
+        finally:
+            await api.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,76 @@
+"""
+Benchmark unjoined agent and space queries as memberships grow.
+
+Creates agents and spaces, each agent joining a few random spaces, then
+times listing the spaces an agent has not joined, all of them and a page.
+The time per query should grow no faster than the number of spaces.
+
+Run with: python benchmarks/bench_memberships.py [sizes...]
+"""
+import asyncio
+import random
+import sys
+import time
+from uuid import uuid4
+
+from tortoise import Tortoise
+
+from zycelium.zygote.api import ZygoteAPI
+
+
+async def populate(size: int, per_agent: int = 5) -> tuple:
+    """Insert size agents and spaces with random memberships."""
+    rand = random.Random(42)
+    agents = [str(uuid4()) for _ in range(size)]
+    spaces = [str(uuid4()) for _ in range(size)]
+    connection = Tortoise.get_connection("default")
+    for table, uuids in (("agent", agents), ("space", spaces)):
+        await connection.execute_many(
+            f'INSERT INTO "{table}" (uuid, name, data, meta, created_at, updated_at) '
+            "VALUES (?, ?, '{}', '{}', datetime('now'), datetime('now'))",
+            [[uuid, f"{table}-{i:06d}"] for i, uuid in enumerate(uuids)],
+        )
+    await connection.execute_many(
+        'INSERT INTO "agent_space" (agent_id, space_id) VALUES (?, ?)',
+        [
+            [agent, space]
+            for agent in agents
+            for space in rand.sample(spaces, min(per_agent, size))
+        ],
+    )
+    return agents, spaces
+
+
+async def measure(api: ZygoteAPI, agents: list, calls: int) -> tuple:
+    """Time uncached queries, return (unjoined, page) seconds per call."""
+    rand = random.Random(7)
+    results = []
+    for query in (
+        lambda: api.get_unjoined_spaces(rand.choice(agents)),
+        lambda: api.get_unjoined_spaces(rand.choice(agents), limit=50),
+    ):
+        start = time.perf_counter()
+        for _ in range(calls):
+            api._invalidate()  # pylint: disable=protected-access
+            await query()
+        results.append((time.perf_counter() - start) / calls)
+    return tuple(results)
+
+
+async def main(sizes: list) -> None:
+    """Run benchmark."""
+    print(f"{'size':>8} {'unjoined':>12} {'page of 50':>12}")
+    for size in sizes:
+        api = ZygoteAPI()
+        api.logger.disabled = True
+        await api.start("sqlite://:memory:")
+        try:
+            agents, _ = await populate(size)
+            unjoined, page = await measure(api, agents, calls=20)
+        finally:
+            await api.stop()
+        print(f"{size:>8} {unjoined * 1e3:10.2f}ms {page * 1e3:10.2f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(arg) for arg in sys.argv[1:]] or [1000, 2000, 4000, 8000]))
@@ -0,0 +1,99 @@
+"""
+Benchmark frame reads while frames are being written, per storage profile.
+
+A writer stores batches of frames as fast as it can while a reader pages
+through recent frames, as the web UI does. Reports write throughput and
+read latency for each profile.
+
+Run with: python benchmarks/bench_mixed_rw.py [seconds] [batch size]
+"""
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from zycelium.zygote.api import ZygoteAPI
+from zycelium.zygote.storage import STORAGE_PROFILES, storage_urls
+
+
+async def writer(api: ZygoteAPI, agent_uuid: str, space_uuid: str, batch: int, stop):
+    """Write batches of frames until stopped, return frames written."""
+    written = 0
+    while not stop.is_set():
+        result = await api.create_frames(
+            [
+                {
+                    "kind": "event",
+                    "name": "bench/reading",
+                    "data": {"value": written + i},
+                    "agent_uuid": agent_uuid,
+                    "space_uuids": [space_uuid],
+                }
+                for i in range(batch)
+            ]
+        )
+        written += len(result.get("frames", []))
+        await asyncio.sleep(0)
+    return written
+
+
+async def reader(api: ZygoteAPI, space_uuid: str, stop) -> list:
+    """Read pages of frames until stopped, return latencies in seconds."""
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        page = await api.get_frames(limit=50, space_uuid=space_uuid)
+        if page.get("next"):
+            await api.get_frames(cursor=page["next"], limit=50, space_uuid=space_uuid)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0)
+    return latencies
+
+
+async def run(profile: str, seconds: float, batch: int) -> None:
+    """Run the benchmark against a new database."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url, read_db_url = storage_urls(Path(tmp) / "bench.db", profile=profile)
+        api = ZygoteAPI()
+        api.logger.disabled = True
+        await api.start(db_url, read_db_url)
+        try:
+            agent = await api.create_agent("bench")
+            space = await api.create_space("bench")
+            await api.join_space(space["uuid"], agent["uuid"])
+            stop = asyncio.Event()
+            tasks = [
+                asyncio.create_task(
+                    writer(api, agent["uuid"], space["uuid"], batch, stop)
+                ),
+                asyncio.create_task(reader(api, space["uuid"], stop)),
+            ]
+            await asyncio.sleep(seconds)
+            stop.set()
+            written, latencies = await asyncio.gather(*tasks)
+        finally:
+            await api.stop()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0.0
+    print(
+        f"{profile:<8} {written / seconds:10.0f} frames/s written "
+        f"{len(latencies) / seconds:8.0f} reads/s "
+        f"p50 {statistics.median(latencies) * 1000 if latencies else 0:7.2f} ms "
+        f"p99 {p99 * 1000:7.2f} ms"
+    )
+
+
+async def main(seconds: float, batch: int) -> None:
+    """Run benchmark."""
+    for profile in STORAGE_PROFILES:
+        await run(profile, seconds, batch)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(
+        main(float(args[0]) if args else 5.0, int(args[1]) if len(args) > 1 else 100)
+    )
@@ -0,0 +1,107 @@
+"""
+Benchmark server-side subscription filtering in the frame fan-out.
+
+Many agents share one space and each subscribes to a few of many topics.
+Reports deliveries and time per frame with and without filtering.
+
+Run with: python benchmarks/bench_subscriptions.py [agents] [topics] [frames]
+"""
+import asyncio
+import random
+import sys
+import time
+
+import socketio
+
+from zycelium.zygote.fanout import FanOut
+from zycelium.zygote.routing import RoutingRegistry
+from zycelium.zygote.subscriptions import SubscriptionIndex
+
+
+class Manager:
+    """Socket.io manager that knows every sid."""
+
+    def eio_sid_from_sid(self, sid, _namespace):
+        """Map sid to engine.io sid."""
+        return sid
+
+
+class EngineIO:
+    """Engine.io server that counts sent bytes."""
+
+    def __init__(self):
+        self.sent_bytes = 0
+
+    async def send(self, _eio_sid, data):
+        """Count packet."""
+        self.sent_bytes += len(data)
+
+
+class Server:
+    """Socket.io server with a counting transport."""
+
+    packet_class = socketio.packet.Packet
+
+    def __init__(self):
+        self.manager = Manager()
+        self.eio = EngineIO()
+
+
+def setup(agents: int, topics: list, per_agent: int) -> tuple:
+    """Connect agents to one space with random subscriptions."""
+    rand = random.Random(42)
+    routes = RoutingRegistry()
+    index = SubscriptionIndex()
+    for i in range(agents):
+        sid = f"sid-{i}"
+        routes.add(
+            sid,
+            {
+                "uuid": f"agent-{i}",
+                "name": f"agent-{i}",
+                "spaces": [{"uuid": "home", "name": "home"}],
+            },
+        )
+        if i % 50 == 0:
+            subscriptions = ["*"]
+        elif i % 10 == 0:
+            prefix = rand.choice(topics).split("/")[0]
+            subscriptions = [f"{prefix}/*"]
+        else:
+            subscriptions = rand.sample(topics, per_agent)
+        index.add(sid, subscriptions)
+    return routes, index
+
+
+async def run(fanout: FanOut, names: list) -> float:
+    """Deliver frames, return seconds per frame."""
+    start = time.perf_counter()
+    for name in names:
+        await fanout.deliver(
+            f"event-{name}", {"name": name, "data": {"value": 1}}, ["home"], name=name
+        )
+    return (time.perf_counter() - start) / len(names)
+
+
+async def main(agents: int, topic_count: int, frames: int) -> None:
+    """Run benchmark."""
+    topics = [f"source{i % 20}/topic{i}" for i in range(topic_count)]
+    routes, index = setup(agents, topics, per_agent=3)
+    rand = random.Random(7)
+    names = [rand.choice(topics) for _ in range(frames)]
+
+    for label, subscriptions in (("unfiltered", None), ("filtered", index)):
+        server = Server()
+        fanout = FanOut(server, routes, subscriptions)
+        seconds = await run(fanout, names)
+        stats = fanout.stats()
+        print(
+            f"{label:<10} {stats['deliveries'] / frames:8.1f} deliveries/frame "
+            f"{server.eio.sent_bytes / frames / 1024:8.1f} KiB/frame "
+            f"{seconds * 1e6:8.0f} us/frame"
+        )
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args + [2000, 500, 1000][len(args) :])))
@@ -0,0 +1,96 @@
+"""
+Benchmark agent process starts per multiprocessing start method.
+
+Reports the time from starting a process until it has imported the agent
+runtime and exited, and the memory of idle children: resident (RSS) and
+proportional (PSS, shared pages split between processes). The parent
+imports the agent runtime first, as the server does. Reads /proc for
+memory, so runs on Linux only.
+
+Run with: python benchmarks/bench_supervisor_spawn.py [starts] [children]
+"""
+import importlib
+import multiprocessing
+import multiprocessing.forkserver
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from zycelium.zygote.supervisor import PRELOAD_MODULES, agent_context
+
+FORK_SERVER = multiprocessing.forkserver._forkserver  # pylint: disable=protected-access
+IMPORT_RUNTIME = (
+    "import zycelium.zygote.agent, socketio, apscheduler.schedulers.asyncio"
+)
+
+
+def memory(pid: int) -> tuple:
+    """Get (rss, pss) of a process in KiB."""
+    values = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        key, _, value = line.partition(":")
+        if key in ("Rss", "Pss"):
+            values[key] = int(value.split()[0])
+    return values["Rss"], values["Pss"]
+
+
+def start_latency(context, starts: int) -> list:
+    """Start processes that import the runtime, return seconds to exit."""
+    latencies = []
+    for _ in range(starts):
+        start = time.perf_counter()
+        process = context.Process(target=exec, args=(IMPORT_RUNTIME,))
+        process.start()
+        process.join()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def idle_memory(context, children: int) -> tuple:
+    """Start idle children with the runtime imported, return (rss, pss) in KiB."""
+    processes = [
+        context.Process(target=exec, args=(f"{IMPORT_RUNTIME}, time; time.sleep(30)",))
+        for _ in range(children)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        time.sleep(2)
+        usage = [memory(process.pid) for process in processes]
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+    return sum(rss for rss, _ in usage), sum(pss for _, pss in usage)
+
+
+def main(starts: int, children: int) -> None:
+    """Run benchmark."""
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+    contexts = [
+        ("spawn", lambda: multiprocessing.get_context("spawn")),
+        ("fork", lambda: multiprocessing.get_context("fork")),
+        ("forkserver", lambda: agent_context("forkserver", preload=())),
+        ("forkserver+preload", lambda: agent_context("forkserver")),
+    ]
+    print(f"{'method':<20} {'start p50':>10} {'start max':>10} {'RSS':>10} {'PSS':>10}")
+    for label, get_context in contexts:
+        # The fork server is shared, restart it with this preload list
+        FORK_SERVER._stop()  # pylint: disable=protected-access
+        context = get_context()
+        # The first start of a fork server pays for the server itself
+        start_latency(context, 1)
+        latencies = start_latency(context, starts)
+        rss, pss = idle_memory(context, children)
+        print(
+            f"{label:<20} {statistics.median(latencies) * 1e3:8.1f}ms "
+            f"{max(latencies) * 1e3:8.1f}ms "
+            f"{rss / children / 1024:6.1f}MiB {pss / children / 1024:6.1f}MiB"
+        )
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [20, 10][len(args) :]))
@@ -0,0 +1,81 @@
+"""
+Benchmark topic matching with many subscriptions.
+
+Compares the topic trie against checking every subscription in turn.
+
+Run with: python benchmarks/bench_topics.py [subscriptions] [lookups]
+"""
+import random
+import sys
+import time
+
+from zycelium.zygote.topics import TopicTrie, split_topic
+
+
+def make_subscriptions(count: int, rand: random.Random) -> list:
+    """Make subscriptions, mostly exact with some wildcards."""
+    subscriptions = []
+    for i in range(count):
+        source = f"source{rand.randrange(100)}"
+        roll = rand.random()
+        if roll < 0.1:
+            subscriptions.append(f"{source}/+")
+        elif roll < 0.15:
+            subscriptions.append(f"{source}/#")
+        else:
+            subscriptions.append(f"{source}/topic{rand.randrange(count)}/{i % 10}")
+    return subscriptions
+
+
+def linear_match(subscriptions: list, topic: str) -> set:
+    """Match topic against every subscription."""
+    parts = topic.split("/")
+    matched = set()
+    for value, segments in subscriptions:
+        for i, segment in enumerate(segments):
+            if segment == "#":
+                matched.add(value)
+                break
+            if i >= len(parts) or (segment not in ("+", parts[i])):
+                break
+        else:
+            if len(segments) == len(parts):
+                matched.add(value)
+    return matched
+
+
+def main(count: int, lookups: int) -> None:
+    """Run benchmark."""
+    rand = random.Random(42)
+    subscriptions = make_subscriptions(count, rand)
+    topics = [
+        f"source{rand.randrange(100)}/topic{rand.randrange(count)}/{rand.randrange(10)}"
+        for _ in range(lookups)
+    ]
+
+    trie = TopicTrie()
+    start = time.perf_counter()
+    for value, subscription in enumerate(subscriptions):
+        trie.insert(subscription, value)
+    insert_time = time.perf_counter() - start
+
+    parsed = [(value, split_topic(s)) for value, s in enumerate(subscriptions)]
+
+    start = time.perf_counter()
+    trie_results = [trie.match(topic) for topic in topics]
+    trie_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    linear_results = [linear_match(parsed, topic) for topic in topics]
+    linear_time = time.perf_counter() - start
+
+    assert trie_results == linear_results
+    print(f"{count} subscriptions, {lookups} lookups")
+    print(f"trie insert   {insert_time / count * 1e6:10.2f} us/subscription")
+    print(f"trie match    {trie_time / lookups * 1e6:10.2f} us/lookup")
+    print(f"linear match  {linear_time / lookups * 1e6:10.2f} us/lookup")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [10000, 2000][len(args) :]))
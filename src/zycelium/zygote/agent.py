@@ -2,31 +2,73 @@
 Agent.
 """
 import asyncio
-from typing import Awaitable, Callable, Optional
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional
 
 import socketio
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from socketio.exceptions import ConnectionError as SioConnectionError
+from socketio.exceptions import TimeoutError as SioTimeoutError
 
 from zycelium.dataconfig import dataconfig as config
-from zycelium.zygote.frame import Frame
+from zycelium.zygote.frame import ACK_EVENT, BATCH_EVENT, Frame
 from zycelium.zygote.logging import get_logger
+from zycelium.zygote.topics import TopicTrie
 
 
 class Agent:
-    """Agent."""
-
-    def __init__(self, name: str) -> None:
+    """
+    Agent.
+
+    With `coalesce` set to a number of seconds, frames from `emit` are
+    collected for that long and sent to the server as one batch.
+
+    Frames are acknowledged once handled, the server replays frames
+    that were not acknowledged when the agent reconnects. Acknowledgements
+    are sent with the next flush of queued frames, at most `ack_delay`
+    seconds later, only the latest is sent. The server keeps one cursor per
+    agent, so frames are acknowledged in the order they arrived and never
+    past a frame whose handlers failed or are still running. The uuids of the last
+    `dedupe_size` handled frames are kept to drop frames that arrive twice.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        coalesce: float = 0.0,
+        max_batch: int = 100,
+        dedupe_size: int = 1024,
+        ack_delay: float = 0.05,
+    ) -> None:
         self.name = name
+        self.coalesce = coalesce
+        self.max_batch = max_batch
+        self.dedupe_size = dedupe_size
+        self.ack_delay = ack_delay
         self.config = None  # type: Optional[config.Config]
         self.spaces = {}
+        self.subscriptions = set()  # type: set[str]
         self.log = get_logger("zygote.agent")
         self.sio = socketio.AsyncClient(ssl_verify=False)
-        self.on = self.sio.on  # pylint: disable=invalid-name
         self.sio.on("command", self._handle_command)
+        # Frames all go through `_dispatch`, socket.io would send frames with
+        # a handler of their own to that handler only, never to "*"
+        self.sio.on("*", self._dispatch)
+        self._frame_handlers = {}  # type: dict[str, list[Callable]]
+        self._event_topics = TopicTrie()
+        self._event_handlers = []  # type: list[Callable[[dict], Awaitable[None]]]
+        self._catch_all_handlers = []  # type: list[Callable]
         self._scheduler = self._init_scheduler()
         self._startup_handler = None  # type: Optional[Callable[[], Awaitable[None]]]
         self._shutdown_handler = None  # type: Optional[Callable[[], Awaitable[None]]]
+        self._outbox = []  # type: list[dict]
+        self._outbox_task = None  # type: Optional[asyncio.Task]
+        self._ack = None  # type: Optional[dict]
+        self._received = OrderedDict()  # type: OrderedDict[str, None]
+        # Frames not acknowledged yet, in order, with their time and whether
+        # they were handled
+        self._pending = OrderedDict()  # type: OrderedDict[str, tuple]
+        self._handling = set()  # type: set[str]
 
     def _init_scheduler(self) -> AsyncIOScheduler:
         scheduler = AsyncIOScheduler()
@@ -59,6 +101,66 @@ class Agent:
         else:
             self.log.warning("Unknown command: %s", command)
 
+    async def _dispatch(self, event: str, data=None) -> None:
+        """
+        Call handlers registered with `on` for the event, then event handlers
+        matching the frame name, then catch-all handlers.
+        """
+
+        async def handle():
+            for handler in self._frame_handlers.get(event, ()):
+                result = handler(data)
+                if asyncio.iscoroutine(result):
+                    await result
+            if event.startswith("event-") and isinstance(data, dict):
+                matched = self._event_topics.match(data.get("name", ""))
+                for index in sorted(matched):
+                    await self._event_handlers[index](data)
+            for handler in self._catch_all_handlers:
+                await handler(event, data)
+
+        await self._receive(data, handle)
+
+    async def _receive(self, data, handle: Callable) -> None:
+        """
+        Handle a frame unless it was seen before, then acknowledge it.
+
+        Frames whose handlers fail are not remembered and hold back the
+        acknowledgement of later frames, the server replays them from the
+        failed frame on when the agent reconnects.
+        """
+        meta = data.get("meta") if isinstance(data, dict) else None
+        frame_uuid = meta.get("uuid") if isinstance(meta, dict) else None
+        if frame_uuid is None:
+            await handle()
+            return
+        if frame_uuid in self._received or frame_uuid in self._handling:
+            return
+        self._pending.setdefault(frame_uuid, (meta.get("time"), False))
+        self._handling.add(frame_uuid)
+        try:
+            await handle()
+        finally:
+            self._handling.discard(frame_uuid)
+        self._received[frame_uuid] = None
+        if len(self._received) > self.dedupe_size:
+            self._received.popitem(last=False)
+        self._pending[frame_uuid] = (meta.get("time"), True)
+        self._ack_handled()
+
+    def _ack_handled(self) -> None:
+        """Acknowledge the frames handled before the first unhandled frame."""
+        ack = None
+        while self._pending:
+            frame_uuid, (time, handled) = next(iter(self._pending.items()))
+            if not handled:
+                break
+            self._pending.popitem(last=False)
+            ack = {"uuid": frame_uuid, "time": time}
+        if ack is not None:
+            self._ack = ack
+            self._flush_soon(self.ack_delay)
+
     async def _configure(self) -> None:
         """Configure agent."""
         if self.config is None:
@@ -80,7 +182,9 @@ class Agent:
             if self._startup_handler:
                 await self._startup_handler()
             self._start_scheduler()
-            await self.sio.wait()
+            # Cancelling the wait would cancel the client's read loop with it,
+            # the agent could not receive acks or disconnect cleanly
+            await asyncio.shield(self.sio.wait())
         except asyncio.exceptions.CancelledError:
             self.log.info("Agent %s stopped.", self.name)
         finally:
@@ -93,23 +197,115 @@ class Agent:
             await self.disconnect()
 
     async def connect(self, url: str, auth: dict) -> None:
-        """Connect to server."""
+        """Connect to server, sending the frame names the agent subscribed to."""
+        auth = {**auth, "subscriptions": sorted(self.subscriptions)}
+        # The server replays every frame after its cursor
+        self._pending.clear()
         await self.sio.connect(url, auth=auth)
+        if self._outbox:
+            # Frames kept from the previous connection
+            self._flush_soon(0)
 
     async def disconnect(self) -> None:
-        """Disconnect from server."""
+        """
+        Disconnect from server, sending pending frames first.
+
+        The server confirms it took the frames before the agent disconnects.
+        Frames that cannot be sent are kept for the next connection.
+        """
+        if self.sio.connected:
+            try:
+                await self.flush(confirm=True)
+            except SioTimeoutError:
+                self.log.error(
+                    "Server did not confirm the last frames of %s", self.name
+                )
+        elif self._outbox:
+            if self._outbox_task is not None:
+                self._outbox_task.cancel()
+                self._outbox_task = None
+            self.log.error(
+                "Agent %s is not connected, keeping %s unsent frames",
+                self.name,
+                len(self._outbox),
+            )
         await self.sio.disconnect()
 
     async def emit(self, name: str, data: Optional[dict] = None) -> None:
-        """Emit event."""
+        """Emit event, or queue it for the next batch if coalescing."""
         kind = "event"
         frame = Frame(name=name, kind=kind, data=data or {})
-        await self.sio.emit(frame.sio_name(), frame.to_dict(), namespace="/")
+        if self.coalesce <= 0:
+            await self.sio.emit(frame.sio_name(), frame.to_dict(), namespace="/")
+            return
+
+        self._outbox.append(frame.to_dict())
+        if len(self._outbox) >= self.max_batch:
+            await self.flush()
+        else:
+            self._flush_soon(self.coalesce)
+
+    async def emit_many(self, frames: Iterable[tuple]) -> None:
+        """Emit events as one batch, takes (name, data) pairs."""
+        batch = [
+            Frame(name=name, kind="event", data=data or {}).to_dict()
+            for name, data in frames
+        ]
+        await self.flush()
+        await self._send_batch(batch)
+
+    async def flush(self, confirm: bool = False) -> None:
+        """
+        Send frames queued by `emit` and the pending acknowledgement.
+
+        With confirm, wait until the server has handled them.
+        """
+        if self._outbox_task is not None:
+            if self._outbox_task is not asyncio.current_task():
+                self._outbox_task.cancel()
+            self._outbox_task = None
+        batch, self._outbox = self._outbox, []
+        ack, self._ack = self._ack, None
+        await self._send_batch(batch, ack, confirm)
+
+    def _flush_soon(self, delay: float) -> None:
+        """Flush after delay seconds, unless a flush is already due."""
+        if self._outbox_task is None:
+            self._outbox_task = asyncio.get_running_loop().create_task(
+                self._flush_later(delay)
+            )
+
+    async def _flush_later(self, delay: float) -> None:
+        """Send queued frames once the coalescing window is over."""
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    async def _send_batch(
+        self, batch: list, ack: Optional[dict] = None, confirm: bool = False
+    ) -> None:
+        """
+        Send frames, as a batch if there is more than one.
+
+        An acknowledgement goes with the batch, or on its own without frames.
+        With confirm, wait for the server to acknowledge the event.
+        """
+        send = self.sio.call if confirm else self.sio.emit
+        if ack is not None:
+            if batch:
+                await send(BATCH_EVENT, {"frames": batch, "ack": ack}, namespace="/")
+            else:
+                await send(ACK_EVENT, ack, namespace="/")
+        elif len(batch) == 1:
+            frame = Frame.from_dict(batch[0])
+            await send(frame.sio_name(), batch[0], namespace="/")
+        elif batch:
+            await send(BATCH_EVENT, {"frames": batch}, namespace="/")
 
     async def command(self, name: str, data: Optional[dict] = None) -> None:
-        """Send command."""
+        """Send command, after any queued frames."""
         kind = "command"
         frame = Frame(name=name, kind=kind, data=data or {})
+        await self.flush()
         await self.sio.emit(frame.sio_name(), frame.to_dict(), namespace="/")
 
     async def config_update(self, **data) -> None:
@@ -120,6 +316,43 @@ class Agent:
 
         await self.command("config-update", data)
 
+    def subscribe(self, *names: str) -> None:
+        """
+        Subscribe to frames by name, "*" subscribes to every frame.
+
+        Call before connecting, the server only sends subscribed frames.
+        """
+        self.subscriptions.update(names)
+
+    def on(
+        self, event: str, handler: Optional[Callable] = None, namespace=None
+    ):  # pylint: disable=invalid-name
+        """
+        Register socket.io event handler and subscribe to its frames.
+
+        Handlers for "*" get every frame as (event, frame), even frames
+        handled by handlers for their event or by `on_event` handlers.
+        """
+        if event == "*":
+            self.subscribe("*")
+
+            def register(func):
+                self._catch_all_handlers.append(func)
+                return func
+
+            return register if handler is None else register(handler)
+        if "-" not in event:
+            return self.sio.on(event, handler=handler, namespace=namespace)
+        self.subscribe(event.split("-", 1)[1])
+
+        def register_frame_handler(func):
+            self._frame_handlers.setdefault(event, []).append(func)
+            return func
+
+        if handler is None:
+            return register_frame_handler
+        return register_frame_handler(handler)
+
     def on_startup(self, delay: float = 0.0):
         """Startup event handler."""
 
@@ -149,17 +382,17 @@ class Agent:
         return wrapper
 
     def on_event(self, name: str):
-        """On event."""
+        """
+        On event, name may use "+" and "#" wildcards.
+
+        Every handler with a matching name is called, in order of registration.
+        """
 
         def wrapper(func) -> None:
             """Connect wrapper."""
-
-            async def inner(frame) -> None:
-                """Wrapper."""
-                if frame["name"] == name:
-                    await func(frame)
-
-            self.sio.on(f"event-{name}", inner)
+            self._event_topics.insert(name, len(self._event_handlers))
+            self._event_handlers.append(func)
+            self.subscribe(name)
             return func
 
         return wrapper
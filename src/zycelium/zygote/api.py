@@ -1,36 +1,129 @@
 """
 Zygote API.
 """
+import base64
+import copy
+import re
 import secrets
-from typing import Optional
+from uuid import UUID
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Union
 
 from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.expressions import Q
 from tortoise.query_utils import Prefetch
+from tortoise.transactions import in_transaction
 
+from zycelium.zygote.archive import FrameArchive, merge_frames
+from zycelium.zygote.cache import TTLCache
 from zycelium.zygote.logging import get_logger
+from zycelium.zygote.rollup import combine, source_resolution
+from zycelium.zygote.serializers import RowConverter, entity_dict, frame_dict, loads
 from zycelium.zygote.models import (
+    FRAME_FIELDS_BACKFILL,
+    ROLLUP_RESOLUTIONS,
     init_db,
     Frame,
     Space,
     Agent,
     AuthToken,
+    DeliveryCursor,
+    FieldIndex,
     FileStore,
+    RetentionRule,
 )
+from zycelium.zygote.storage import ReaderPool, sql_time, utc
+from zycelium.zygote.signals import (
+    agent_updated,
+    agent_deleted,
+    space_updated,
+    space_deleted,
+    space_joined,
+    space_left,
+)
+
+
+UUID_MAX = (1 << 128) - 1
+
+# Dotted path to a field of frame data, with optional list indexes
+FIELD_PATH = re.compile(r"^[A-Za-z_]\w*(\[\d+\])*(\.[A-Za-z_]\w*(\[\d+\])*)*$")
+
+
+def encode_cursor(time: datetime, frame_uuid: str) -> str:
+    """Encode the position of a frame as an opaque page cursor."""
+    position = f"{time.isoformat()}|{frame_uuid}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a page cursor into the (time, uuid) of a frame."""
+    position = base64.urlsafe_b64decode(cursor.encode()).decode()
+    time, frame_uuid = position.split("|", 1)
+    return datetime.fromisoformat(time), frame_uuid
+
+
+def match_query(text: str) -> str:
+    """
+    Turn words typed by a user into an FTS5 query matching all of them.
+
+    Words are quoted, so operators and punctuation are searched for as is.
+    A word ending in * matches every word it is a prefix of.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if word:
+            quoted = '"' + word.replace('"', '""') + '"'
+            terms.append(quoted + "*" if prefix else quoted)
+    return " ".join(terms)
 
 
 class ZygoteAPI:
     """Zygote API."""
 
-    def __init__(self):
+    def __init__(
+        self,
+        token_cache_size: int = 1024,
+        token_cache_ttl: float = 300.0,
+        entity_cache_size: int = 4096,
+        entity_cache_ttl: float = 300.0,
+    ):
         """Initialize."""
         self.logger = get_logger("zygote.api")
         self.logger.info("Initializing Zygote API")
+        self._token_cache = TTLCache(maxsize=token_cache_size, ttl=token_cache_ttl)
+        self._token_generation = 0
+        # Agents, spaces and memberships by (kind, uuid or name)
+        self._entity_cache = TTLCache(maxsize=entity_cache_size, ttl=entity_cache_ttl)
+        self._entity_generation = 0
+        self._readers = None  # type: Optional[ReaderPool]
+        self.archive = None  # type: Optional[FrameArchive]
 
-    async def start(self, db_url: str):
-        """Initialize database."""
+    async def start(
+        self,
+        db_url: str,
+        read_db_url: Optional[str] = None,
+        archive_path: Optional[Union[str, Path]] = None,
+        read_connections: int = 4,
+    ):
+        """
+        Initialize database.
+
+        With read_db_url, reads use a pool of read_connections read-only
+        connections instead of the write connection.
+        With archive_path, frame listings read through to archived frames.
+        """
         self.logger.info("Initializing database")
         try:
             await init_db(db_url)
+            if read_db_url:
+                self._readers = ReaderPool(read_db_url, read_connections)
+                await self._readers.open()
+            if archive_path is not None:
+                self.archive = FrameArchive(archive_path)
         except Exception as exc:
             self.logger.error("Database initialization failed: %s", exc)
             raise exc
@@ -41,10 +134,60 @@ class ZygoteAPI:
         """Stop."""
         self.logger.info("Stopping")
         try:
+            if self._readers is not None:
+                await self._readers.close()
+                self._readers = None
+            self.archive = None
             await Tortoise.close_connections()
         except Exception as exc:
             self.logger.warning("Error while stopping %s", exc)
 
+    @property
+    def _reader(self) -> Optional[BaseDBAsyncClient]:
+        """Get an idle read-only connection, None to use the write connection."""
+        return self._readers.get() if self._readers is not None else None
+
+    def _forget_agent(self, agent_uuid) -> None:
+        """Drop cached entries for an agent."""
+        agent_uuid = str(agent_uuid)
+        self._token_generation += 1
+        self._token_cache.pop_where(lambda agent: agent["uuid"] == agent_uuid)
+
+    def _cached(self, key: tuple) -> Optional[dict]:
+        """Get a copy of a cached agent, space or membership list."""
+        value = self._entity_cache.get(key)
+        return copy.deepcopy(value) if value is not None else None
+
+    def _cache(self, key: tuple, value: dict, generation: int) -> None:
+        """
+        Cache a copy of value read at generation.
+
+        Values read before the latest invalidation may be stale, they are
+        not cached.
+        """
+        if generation == self._entity_generation:
+            self._entity_cache.set(key, copy.deepcopy(value))
+
+    def _invalidate(self, *kinds: str) -> None:
+        """
+        Drop cached entities of kinds, or every entity if no kind is given.
+
+        Agents embed their spaces and spaces their agents, so changes to
+        either drop everything, only new entities drop just the lists.
+        """
+        self._entity_generation += 1
+        if kinds:
+            self._entity_cache.pop_keys(lambda key: key[0] in kinds)
+        else:
+            self._entity_cache.clear()
+
+    def cache_stats(self) -> dict:
+        """Get cache hit/miss counters."""
+        return {
+            "tokens": self._token_cache.stats(),
+            "entities": self._entity_cache.stats(),
+        }
+
     async def create_space(
         self, name: str, data: Optional[dict] = None, meta: Optional[dict] = None
     ) -> dict:
@@ -54,12 +197,8 @@ class ZygoteAPI:
         meta = meta or {}
         try:
             space_obj = await Space.create(name=name, data=data, meta=meta)
-            space_dict = {
-                "uuid": str(space_obj.uuid),
-                "name": space_obj.name,
-                "data": space_obj.data,
-                "meta": space_obj.meta,
-            }
+            self._invalidate("spaces", "unjoined_spaces")
+            space_dict = entity_dict(space_obj)
             return space_dict
         except Exception:  # pylint: disable=broad-except
             self.logger.error("Failed to create space: %s", name)
@@ -68,25 +207,22 @@ class ZygoteAPI:
     async def get_space(self, space_uuid: int) -> dict:
         """Get space."""
         self.logger.info("Getting space")
+        key = ("space", str(space_uuid))
+        space_dict = self._cached(key)
+        if space_dict is not None:
+            return space_dict
+        generation = self._entity_generation
         try:
             space_obj = await Space.get(uuid=space_uuid).prefetch_related(
                 Prefetch("agents", queryset=Agent.all())
             )
             space_dict = {
-                "uuid": str(space_obj.uuid),
-                "name": space_obj.name,
-                "data": space_obj.data,
-                "meta": space_obj.meta,
+                **entity_dict(space_obj),
                 "agents": [
-                    {
-                        "uuid": str(agent.uuid),
-                        "name": agent.name,
-                        "data": agent.data,
-                        "meta": agent.meta,
-                    }
-                    for agent in space_obj.agents  # type: ignore
+                    entity_dict(agent) for agent in space_obj.agents  # type: ignore
                 ],
             }
+            self._cache(key, space_dict, generation)
             return space_dict
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to get space: %s", space_uuid, exc_info=exc)
@@ -95,17 +231,15 @@ class ZygoteAPI:
     async def get_spaces(self) -> dict:
         """Get spaces."""
         self.logger.info("Getting spaces")
+        key = ("spaces",)
+        spaces_dict = self._cached(key)
+        if spaces_dict is not None:
+            return spaces_dict
+        generation = self._entity_generation
         try:
             spaces = await Space.all()
-            spaces_list = []
-            for space in spaces:
-                space_dict = {
-                    "uuid": str(space.uuid),
-                    "name": space.name,
-                    "data": space.data,
-                    "meta": space.meta,
-                }
-                spaces_list.append(space_dict)
+            spaces_list = [entity_dict(space) for space in spaces]
+            self._cache(key, {"spaces": spaces_list}, generation)
             return {"spaces": spaces_list}
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to get spaces", exc_info=exc)
@@ -128,12 +262,13 @@ class ZygoteAPI:
             space_obj.data = data  # type: ignore
             space_obj.meta = meta  # type: ignore
             await space_obj.save()
-            space_dict = {
-                "uuid": str(space_obj.uuid),
-                "name": space_obj.name,
-                "data": space_obj.data,
-                "meta": space_obj.meta,
-            }
+            self._invalidate()
+            self._token_generation += 1
+            self._token_cache.clear()
+            await space_updated.send(
+                "api", space_uuid=str(space_obj.uuid), name=space_obj.name
+            )
+            space_dict = entity_dict(space_obj)
             return space_dict
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to update space: %s", space_uuid, exc_info=exc)
@@ -145,6 +280,10 @@ class ZygoteAPI:
         try:
             space_obj = await Space.get(id=space_uuid)
             await space_obj.delete()
+            self._invalidate()
+            self._token_generation += 1
+            self._token_cache.clear()
+            await space_deleted.send("api", space_uuid=str(space_obj.uuid))
             return {"success": True}
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to delete space: %s", space_uuid, exc_info=exc)
@@ -159,12 +298,8 @@ class ZygoteAPI:
         meta = meta or {}
         try:
             agent_obj = await Agent.create(name=name, data=data, meta=meta)
-            agent_dict = {
-                "uuid": str(agent_obj.uuid),
-                "name": agent_obj.name,
-                "data": agent_obj.data,
-                "meta": agent_obj.meta,
-            }
+            self._invalidate("agents", "unjoined_agents")
+            agent_dict = entity_dict(agent_obj)
             return agent_dict
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to create agent: %s", name, exc_info=exc)
@@ -173,25 +308,20 @@ class ZygoteAPI:
     async def get_agent(self, agent_uuid: int) -> dict:
         """Get agent."""
         self.logger.info("Getting agent")
+        key = ("agent", str(agent_uuid))
+        agent_dict = self._cached(key)
+        if agent_dict is not None:
+            return agent_dict
+        generation = self._entity_generation
         try:
             agent_obj = await Agent.get(uuid=agent_uuid).prefetch_related(
                 "spaces", Prefetch("spaces", queryset=Space.all())
             )
             agent_dict = {
-                "uuid": str(agent_obj.uuid),
-                "name": agent_obj.name,
-                "data": agent_obj.data,
-                "meta": agent_obj.meta,
-                "spaces": [
-                    {
-                        "uuid": str(space.uuid),
-                        "name": space.name,
-                        "data": space.data,
-                        "meta": space.meta,
-                    }
-                    for space in await agent_obj.spaces
-                ],
+                **entity_dict(agent_obj),
+                "spaces": [entity_dict(space) for space in await agent_obj.spaces],
             }
+            self._cache(key, agent_dict, generation)
             return agent_dict
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to get agent: %s", agent_uuid, exc_info=exc)
@@ -200,17 +330,15 @@ class ZygoteAPI:
     async def get_agents(self) -> dict:
         """Get agents."""
         self.logger.info("Getting agents")
+        key = ("agents",)
+        agents_dict = self._cached(key)
+        if agents_dict is not None:
+            return agents_dict
+        generation = self._entity_generation
         try:
             agents = await Agent.all()
-            agents_list = []
-            for agent in agents:
-                agent_dict = {
-                    "uuid": str(agent.uuid),
-                    "name": agent.name,
-                    "data": agent.data,
-                    "meta": agent.meta,
-                }
-                agents_list.append(agent_dict)
+            agents_list = [entity_dict(agent) for agent in agents]
+            self._cache(key, {"agents": agents_list}, generation)
             return {"agents": agents_list}
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to get agents", exc_info=exc)
@@ -234,20 +362,14 @@ class ZygoteAPI:
             agent_obj.data = data  # type: ignore
             agent_obj.meta = meta  # type: ignore
             await agent_obj.save()
+            self._invalidate()
+            self._forget_agent(agent_uuid)
+            await agent_updated.send(
+                "api", agent_uuid=str(agent_obj.uuid), name=agent_obj.name
+            )
             agent_dict = {
-                "uuid": str(agent_obj.uuid),
-                "name": agent_obj.name,
-                "data": agent_obj.data,
-                "meta": agent_obj.meta,
-                "spaces": [
-                    {
-                        "uuid": str(space.uuid),
-                        "name": space.name,
-                        "data": space.data,
-                        "meta": space.meta,
-                    }
-                    for space in await agent_obj.spaces
-                ],
+                **entity_dict(agent_obj),
+                "spaces": [entity_dict(space) for space in await agent_obj.spaces],
             }
             return agent_dict
         except Exception as exc:  # pylint: disable=broad-except
@@ -260,6 +382,9 @@ class ZygoteAPI:
         try:
             agent_obj = await Agent.get(uuid=agent_uuid)
             await agent_obj.delete()
+            self._invalidate()
+            self._forget_agent(agent_uuid)
+            await agent_deleted.send("api", agent_uuid=str(agent_obj.uuid))
             return {"success": True}
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to delete agent: %s", agent_uuid, exc_info=exc)
@@ -272,6 +397,14 @@ class ZygoteAPI:
             space_obj = await Space.get(uuid=space_uuid)
             agent_obj = await Agent.get(uuid=agent_uuid)
             await space_obj.agents.add(agent_obj)  # type: ignore
+            self._invalidate()
+            self._forget_agent(agent_uuid)
+            await space_joined.send(
+                "api",
+                agent_uuid=str(agent_obj.uuid),
+                space_uuid=str(space_obj.uuid),
+                space_name=space_obj.name,
+            )
             return {"success": True}
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to join space: %s", space_uuid, exc_info=exc)
@@ -284,6 +417,11 @@ class ZygoteAPI:
             space_obj = await Space.get(uuid=space_uuid)
             agent_obj = await Agent.get(uuid=agent_uuid)
             await space_obj.agents.remove(agent_obj)  # type: ignore
+            self._invalidate()
+            self._forget_agent(agent_uuid)
+            await space_left.send(
+                "api", agent_uuid=str(agent_obj.uuid), space_uuid=str(space_obj.uuid)
+            )
             return {"success": True}
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to leave space: %s", space_uuid, exc_info=exc)
@@ -292,42 +430,80 @@ class ZygoteAPI:
     async def get_joined_spaces(self, agent_uuid: int) -> dict:
         """Get joined spaces."""
         self.logger.info("Getting joined spaces")
+        key = ("joined_spaces", str(agent_uuid))
+        spaces_dict = self._cached(key)
+        if spaces_dict is not None:
+            return spaces_dict
+        generation = self._entity_generation
         try:
             agent_obj = await Agent.get(uuid=agent_uuid).prefetch_related(
                 "spaces", Prefetch("spaces", queryset=Space.all())
             )
-            spaces_list = []
-            for space in await agent_obj.spaces:
-                space_dict = {
-                    "uuid": str(space.uuid),
-                    "name": space.name,
-                    "data": space.data,
-                    "meta": space.meta,
-                }
-                spaces_list.append(space_dict)
+            spaces_list = [entity_dict(space) for space in await agent_obj.spaces]
+            self._cache(key, {"spaces": spaces_list}, generation)
             return {"spaces": spaces_list}
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to get joined spaces", exc_info=exc)
             return {"success": False}
 
-    async def get_unjoined_spaces(self, agent_uuid: int) -> dict:
-        """Get unjoined spaces."""
+    async def _unjoined(
+        self, table: str, column: str, other: str, uuid, cursor, limit
+    ) -> tuple:
+        """
+        Get rows of table without a membership of uuid as dicts, by name.
+
+        Memberships are found with an anti-join on the agent_space index,
+        return (dicts, next cursor) where the cursor is the last name.
+        """
+        sql = (
+            f'SELECT t."uuid", t."name", t."data", t."meta" FROM "{table}" t '
+            f'WHERE NOT EXISTS (SELECT 1 FROM "agent_space" m '
+            f'WHERE m."{column}" = t."uuid" AND m."{other}" = ?) '
+            f'AND t."name" > ? ORDER BY t."name" LIMIT ?'
+        )
+        fetch = -1 if limit is None else limit + 1
+        connection = self._reader or Tortoise.get_connection("default")
+        rows = await connection.execute_query_dict(
+            sql, [str(uuid), cursor or "", fetch]
+        )
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["name"]
+        entities = [
+            {
+                "uuid": row["uuid"],
+                "name": row["name"],
+                "data": loads(row["data"]),
+                "meta": loads(row["meta"]),
+            }
+            for row in rows
+        ]
+        return entities, next_cursor
+
+    async def get_unjoined_spaces(
+        self, agent_uuid: int, cursor: Optional[str] = None, limit: Optional[int] = None
+    ) -> dict:
+        """
+        Get spaces the agent has not joined, by name.
+
+        Without a limit every space is returned, else pages are continued
+        with the "next" cursor.
+        """
         self.logger.info("Getting unjoined spaces")
+        key = ("unjoined_spaces", str(agent_uuid), cursor, limit)
+        spaces_dict = self._cached(key)
+        if spaces_dict is not None:
+            return spaces_dict
+        generation = self._entity_generation
         try:
             agent_obj = await Agent.get(uuid=agent_uuid)
-            spaces = await Space.all()
-            spaces_list = []
-            joined_spaces = await agent_obj.spaces
-            for space in spaces:
-                if space not in joined_spaces:
-                    space_dict = {
-                        "uuid": str(space.uuid),
-                        "name": space.name,
-                        "data": space.data,
-                        "meta": space.meta,
-                    }
-                    spaces_list.append(space_dict)
-            return {"spaces": spaces_list}
+            spaces_list, next_cursor = await self._unjoined(
+                "space", "space_id", "agent_id", agent_obj.uuid, cursor, limit
+            )
+            spaces_dict = {"spaces": spaces_list, "next": next_cursor}
+            self._cache(key, spaces_dict, generation)
+            return spaces_dict
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to get unjoined spaces", exc_info=exc)
             return {"success": False}
@@ -335,42 +511,47 @@ class ZygoteAPI:
     async def get_joined_agents(self, space_uuid: int) -> dict:
         """Get joined agents."""
         self.logger.info("Getting joined agents")
+        key = ("joined_agents", str(space_uuid))
+        agents_dict = self._cached(key)
+        if agents_dict is not None:
+            return agents_dict
+        generation = self._entity_generation
         try:
             space_obj = await Space.get(uuid=space_uuid).prefetch_related(
                 "agents", Prefetch("agents", queryset=Agent.all())
             )
-            agents_list = []
-            for agent in await space_obj.agents:  # type: ignore
-                agent_dict = {
-                    "uuid": str(agent.uuid),
-                    "name": agent.name,
-                    "data": agent.data,
-                    "meta": agent.meta,
-                }
-                agents_list.append(agent_dict)
+            agents_list = [
+                entity_dict(agent) for agent in await space_obj.agents  # type: ignore
+            ]
+            self._cache(key, {"agents": agents_list}, generation)
             return {"agents": agents_list}
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to get joined agents", exc_info=exc)
             return {"success": False}
 
-    async def get_unjoined_agents(self, space_uuid: int) -> dict:
-        """Get unjoined agents."""
+    async def get_unjoined_agents(
+        self, space_uuid: int, cursor: Optional[str] = None, limit: Optional[int] = None
+    ) -> dict:
+        """
+        Get agents that have not joined the space, by name.
+
+        Without a limit every agent is returned, else pages are continued
+        with the "next" cursor.
+        """
         self.logger.info("Getting unjoined agents")
+        key = ("unjoined_agents", str(space_uuid), cursor, limit)
+        agents_dict = self._cached(key)
+        if agents_dict is not None:
+            return agents_dict
+        generation = self._entity_generation
         try:
             space_obj = await Space.get(uuid=space_uuid)
-            agents = await Agent.all()
-            agents_list = []
-            joined_agents = await space_obj.agents  # type: ignore
-            for agent in agents:
-                if agent not in joined_agents:
-                    agent_dict = {
-                        "uuid": str(agent.uuid),
-                        "name": agent.name,
-                        "data": agent.data,
-                        "meta": agent.meta,
-                    }
-                    agents_list.append(agent_dict)
-            return {"agents": agents_list}
+            agents_list, next_cursor = await self._unjoined(
+                "agent", "agent_id", "space_id", space_obj.uuid, cursor, limit
+            )
+            agents_dict = {"agents": agents_list, "next": next_cursor}
+            self._cache(key, agents_dict, generation)
+            return agents_dict
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to get unjoined agents", exc_info=exc)
             return {"success": False}
@@ -390,158 +571,299 @@ class ZygoteAPI:
             raise ValueError("name is required")
         if not agent_uuid or not space_uuids:
             raise ValueError("agent_uuid and space_uuids are required")
-        data = data or {}
-        meta = meta or {}
-        space_uuids = space_uuids or []
-        try:
-            frame_obj = await Frame.create(kind=kind, name=name, data=data, meta=meta)
-            if agent_uuid:
-                agent_obj = await Agent.get(uuid=agent_uuid)
-                frame_obj.agent = agent_obj  # type: ignore
-                await frame_obj.save()
-            for space_uuid in space_uuids:
-                space_obj = await Space.get(uuid=space_uuid)
-                await frame_obj.spaces.add(space_obj)  # type: ignore
-            frame_dict = {
-                "uuid": str(frame_obj.uuid),
-                "kind": frame_obj.kind,
-                "name": frame_obj.name,
-                "data": frame_obj.data,
-                "meta": frame_obj.meta,
-            }
-            return frame_dict
-        except Exception as exc:  # pylint: disable=broad-except
-            self.logger.error("Failed to create frame", exc_info=exc)
+        result = await self.create_frames(
+            [
+                {
+                    "kind": kind,
+                    "name": name,
+                    "data": data,
+                    "meta": meta,
+                    "agent_uuid": agent_uuid,
+                    "space_uuids": space_uuids,
+                }
+            ]
+        )
+        if not result.get("frames"):
             return {"success": False}
+        return result["frames"][0]
 
-    async def get_frame(self, frame_uuid: int) -> dict:
-        """Get frame."""
-        self.logger.info("Getting frame")
+    async def create_frames(self, frames: list) -> dict:
+        """
+        Create frames in bulk.
+
+        Each frame is a dict with the arguments of `create_frame`,
+        and may carry its own "uuid" and "time".
+        Agents and spaces are looked up once per batch, frames and their
+        spaces are inserted in one transaction.
+        Frames from unknown agents or without a known space are skipped.
+        """
+        self.logger.info("Creating %s frames", len(frames))
+        for frame in frames:
+            if not frame.get("name"):
+                raise ValueError("name is required")
+            if not frame.get("agent_uuid") or not frame.get("space_uuids"):
+                raise ValueError("agent_uuid and space_uuids are required")
         try:
-            frame_obj = await Frame.get(uuid=frame_uuid).prefetch_related(
-                "agent",
-                Prefetch("agent", queryset=Agent.all()),
-                "spaces",
-                Prefetch("spaces", queryset=Space.all()),
-            )
-            spaces_list = [
+            agent_uuids = {str(frame["agent_uuid"]) for frame in frames}
+            space_uuids = {
+                str(space_uuid)
+                for frame in frames
+                for space_uuid in frame["space_uuids"]
+            }
+            agents = {
+                str(agent.uuid): agent
+                for agent in await Agent.filter(uuid__in=agent_uuids)
+            }
+            known_spaces = {
+                str(space_uuid)
+                for space_uuid in await Space.filter(uuid__in=space_uuids).values_list(
+                    "uuid", flat=True
+                )
+            }
+
+            frame_objs = []
+            frame_space_rows = []
+            for frame in frames:
+                agent_obj = agents.get(str(frame["agent_uuid"]))
+                frame_spaces = [
+                    str(space_uuid)
+                    for space_uuid in frame["space_uuids"]
+                    if str(space_uuid) in known_spaces
+                ]
+                if agent_obj is None or not frame_spaces:
+                    self.logger.warning(
+                        "Skipping frame %s: unknown agent or spaces", frame["name"]
+                    )
+                    continue
+                frame_obj = Frame(
+                    kind=frame.get("kind") or "event",
+                    name=frame["name"],
+                    data=frame.get("data") or {},
+                    meta=frame.get("meta") or {},
+                    agent=agent_obj,
+                )
+                if frame.get("uuid"):
+                    frame_obj.uuid = frame["uuid"]
+                if frame.get("time"):
+                    frame_obj.time = utc(frame["time"])
+                frame_objs.append(frame_obj)
+                frame_space_rows.extend(
+                    [space_uuid, str(frame_obj.uuid)] for space_uuid in frame_spaces
+                )
+
+            if frame_objs:
+                async with in_transaction() as connection:
+                    await Frame.bulk_create(frame_objs, using_db=connection)
+                    await connection.execute_many(
+                        'INSERT INTO "frame_space" ("space_id", "frame_id") '
+                        "VALUES (?, ?)",
+                        frame_space_rows,
+                    )
+            frames_list = [
                 {
-                    "uuid": str(space.uuid),
-                    "name": space.name,
-                    "data": space.data,
-                    "meta": space.meta,
+                    "uuid": str(frame_obj.uuid),
+                    "kind": frame_obj.kind,
+                    "name": frame_obj.name,
+                    "data": frame_obj.data,
+                    "meta": frame_obj.meta,
                 }
-                for space in await frame_obj.spaces  # type: ignore
-            ]  # type: ignore
-            frame_dict = {
-                "uuid": str(frame_obj.uuid),
-                "kind": frame_obj.kind,
-                "name": frame_obj.name,
-                "data": frame_obj.data,
-                "meta": frame_obj.meta,
-                "time": frame_obj.time,
-                "agent": {
-                    "uuid": str(frame_obj.agent.uuid),
-                    "name": frame_obj.agent.name,
-                    "data": frame_obj.agent.data,
-                    "meta": frame_obj.agent.meta,
-                },
-                "spaces": spaces_list,
-            }
-            return frame_dict
+                for frame_obj in frame_objs
+            ]
+            return {"frames": frames_list}
         except Exception as exc:  # pylint: disable=broad-except
-            self.logger.error("Failed to get frame", exc_info=exc)
+            self.logger.error("Failed to create frames", exc_info=exc)
             return {"success": False}
 
-    async def get_frames(self) -> dict:
-        """Get frames."""
-        self.logger.info("Getting frames")
+    async def get_frame(self, frame_uuid: int) -> dict:
+        """Get frame."""
+        self.logger.info("Getting frame")
         try:
-            frames = (
-                await Frame.all()
+            frame_obj = (
+                await Frame.get(uuid=frame_uuid)
+                .using_db(self._reader)
                 .prefetch_related(
                     "agent",
                     Prefetch("agent", queryset=Agent.all()),
                     "spaces",
                     Prefetch("spaces", queryset=Space.all()),
                 )
-                .limit(100)
             )
-            frames_list = []
-            for frame in frames:
-                spaces_list = [
-                    {
-                        "uuid": str(space.uuid),
-                        "name": space.name,
-                        "data": space.data,
-                        "meta": space.meta,
-                    }
-                    for space in await frame.spaces  # type: ignore
-                ]  # type: ignore
-                frame_dict = {
-                    "uuid": str(frame.uuid),
-                    "kind": frame.kind,
-                    "name": frame.name,
-                    "data": frame.data,
-                    "meta": frame.meta,
-                    "agent": {
-                        "uuid": str(frame.agent.uuid),
-                        "name": frame.agent.name,
-                        "data": frame.agent.data,
-                        "meta": frame.agent.meta,
-                    },
-                    "spaces": spaces_list,
-                }
-                frames_list.append(frame_dict)
-            return {"frames": frames_list}
+            return RowConverter().frame(frame_obj)
         except Exception as exc:  # pylint: disable=broad-except
-            self.logger.error("Failed to get frames", exc_info=exc)
+            self.logger.error("Failed to get frame", exc_info=exc)
             return {"success": False}
 
-    async def get_frames_for_agent(self, agent_uuid: int) -> dict:
-        """Get frames."""
+    async def get_frames(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        kind: Optional[str] = None,
+        name: Optional[str] = None,
+        agent_uuid: Optional[str] = None,
+        space_uuid: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> dict:
+        """
+        Get a page of frames, newest first.
+
+        Pass the "next" cursor of a page to get the following page,
+        it is None on the last page. Frames can be filtered by kind, name,
+        agent, space and a time range, since inclusive and until exclusive.
+        Each page takes two queries, whatever its size, pages reaching
+        past the hot window also read archived frames, see `FrameArchive`.
+        """
         self.logger.info("Getting frames")
+        since = utc(since) if since else None
+        until = utc(until) if until else None
         try:
-            agent_obj = await Agent.get(uuid=agent_uuid).prefetch_related(
-                "frames", Prefetch("frames", queryset=Frame.all())
+            filters = {}
+            if kind:
+                filters["kind"] = kind
+            if name:
+                filters["name"] = name
+            if agent_uuid:
+                filters["agent_id"] = agent_uuid
+            if space_uuid:
+                filters["spaces__uuid"] = space_uuid
+            if since:
+                filters["time__gte"] = since
+            if until:
+                filters["time__lt"] = until
+            query = Frame.filter(**filters)
+            position = None
+            if cursor:
+                position = decode_cursor(cursor)
+                time, frame_uuid = position
+                query = query.filter(
+                    Q(time__lt=time) | Q(time=time, uuid__lt=frame_uuid)
+                )
+            frames = (
+                await query.using_db(self._reader)
+                .order_by("-time", "-uuid")
+                .limit(limit + 1)
+                .select_related("agent")
+                .prefetch_related(Prefetch("spaces", queryset=Space.all()))
             )
-            frames_list = []
-            for frame in await agent_obj.frames:  # type: ignore
-                frame_dict = {
-                    "uuid": str(frame.uuid),
-                    "kind": frame.kind,
-                    "name": frame.name,
-                    "data": frame.data,
-                    "meta": frame.meta,
-                }
-                frames_list.append(frame_dict)
-            return {"frames": frames_list}
+            converter = RowConverter()
+            frames_list = [converter.frame(frame) for frame in frames]
+            # Read through to the archive once the page reaches past the hot window
+            if self.archive is not None and (
+                len(frames) <= limit or self.archive.holds(frames[-1].time)
+            ):
+                archived = await self.archive.scan(
+                    limit + 1,
+                    position=position,
+                    kind=kind,
+                    name=name,
+                    agent_uuid=agent_uuid,
+                    space_uuids=[space_uuid] if space_uuid else None,
+                    since=since,
+                    until=until,
+                )
+                frames_list = merge_frames(frames_list, archived, limit=limit + 1)
+            next_cursor = None
+            if len(frames_list) > limit:
+                frames_list = frames_list[:limit]
+                next_cursor = encode_cursor(
+                    frames_list[-1]["time"], frames_list[-1]["uuid"]
+                )
+            return {"frames": frames_list, "next": next_cursor}
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to get frames", exc_info=exc)
             return {"success": False}
 
-    async def get_frames_for_space(self, space_uuid: int) -> dict:
-        """Get frames."""
-        self.logger.info("Getting frames")
+    async def search_frames(
+        self,
+        query: str,
+        cursor: Optional[str] = None,
+        limit: int = 20,
+        kind: Optional[str] = None,
+        name: Optional[str] = None,
+        agent_uuid: Optional[str] = None,
+        space_uuid: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> dict:
+        """
+        Search names and data of frames, best matches first.
+
+        Every word of query must match, see `match_query`. Frames have a
+        "rank", lower is better, and a "snippet" of the matching text.
+        Filters are those of `get_frames`, pass the "next" cursor of a page
+        to get the following page. Archived frames are not searched.
+        """
+        self.logger.info("Searching frames")
         try:
-            space_obj = await Space.get(uuid=space_uuid).prefetch_related(
-                "frames", Prefetch("frames", queryset=Frame.all())
+            match = match_query(query)
+            if not match:
+                return {"frames": [], "next": None}
+            offset = int(cursor) if cursor else 0
+            sql = (
+                'SELECT f.uuid, bm25("frame_search", 4.0, 1.0) AS rank, '
+                "snippet(\"frame_search\", -1, '[', ']', '...', 12) AS snippet "
+                'FROM "frame_search" JOIN "frame" f ON f.uuid = "frame_search".uuid '
             )
+            params = []  # type: list
+            if space_uuid:
+                sql += (
+                    'JOIN "frame_space" fs ON fs.frame_id = f.uuid AND fs.space_id = ? '
+                )
+                params.append(space_uuid)
+            sql += 'WHERE "frame_search" MATCH ?'
+            params.append(match)
+            for column, value in (
+                ("f.kind = ?", kind),
+                ("f.name = ?", name),
+                ("f.agent_id = ?", agent_uuid),
+                ("f.time >= ?", sql_time(since) if since else None),
+                ("f.time < ?", sql_time(until) if until else None),
+            ):
+                if value:
+                    sql += f" AND {column}"
+                    params.append(value)
+            sql += " ORDER BY rank, f.uuid LIMIT ? OFFSET ?"
+            params.extend([limit + 1, offset])
+            connection = self._reader or Tortoise.get_connection("default")
+            rows = await connection.execute_query_dict(sql, params)
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = str(offset + limit)
+            frames = (
+                await Frame.filter(uuid__in=[row["uuid"] for row in rows])
+                .using_db(self._reader)
+                .select_related("agent")
+                .prefetch_related(Prefetch("spaces", queryset=Space.all()))
+            )
+            frames_by_uuid = {str(frame.uuid): frame for frame in frames}
+            converter = RowConverter()
             frames_list = []
-            for frame in await space_obj.frames:  # type: ignore
-                frame_dict = {
-                    "uuid": str(frame.uuid),
-                    "kind": frame.kind,
-                    "name": frame.name,
-                    "data": frame.data,
-                    "meta": frame.meta,
-                }
-                frames_list.append(frame_dict)
-            return {"frames": frames_list}
+            for row in rows:
+                frame = frames_by_uuid.get(row["uuid"])
+                if frame is None:
+                    continue
+                converted = converter.frame(frame)
+                converted["rank"] = row["rank"]
+                converted["snippet"] = row["snippet"]
+                frames_list.append(converted)
+            return {"frames": frames_list, "next": next_cursor}
         except Exception as exc:  # pylint: disable=broad-except
-            self.logger.error("Failed to get frames", exc_info=exc)
+            self.logger.error("Failed to search frames", exc_info=exc)
             return {"success": False}
 
+    async def get_frames_for_agent(
+        self, agent_uuid: str, cursor: Optional[str] = None, limit: int = 100
+    ) -> dict:
+        """Get a page of frames sent by agent, see `get_frames`."""
+        return await self.get_frames(cursor=cursor, limit=limit, agent_uuid=agent_uuid)
+
+    async def get_frames_for_space(
+        self, space_uuid: str, cursor: Optional[str] = None, limit: int = 100
+    ) -> dict:
+        """Get a page of frames in space, see `get_frames`."""
+        return await self.get_frames(cursor=cursor, limit=limit, space_uuid=space_uuid)
+
     async def delete_frame(self, frame_uuid: int) -> dict:
         """Delete frame."""
         self.logger.info("Deleting frame")
@@ -553,6 +875,392 @@ class ZygoteAPI:
             self.logger.error("Failed to delete frame", exc_info=exc)
             return {"success": False}
 
+    async def get_frames_since(
+        self,
+        space_uuids: list,
+        time: datetime,
+        frame_uuid: Optional[str] = None,
+        limit: int = 100,
+    ) -> dict:
+        """
+        Get frames in spaces after (time, frame_uuid), oldest first.
+
+        Frames are ordered by time, then uuid, so a page can be continued
+        from the time and uuid of its last frame.
+        """
+        self.logger.info("Getting frames since %s", time)
+        time = utc(time)
+        try:
+            after = Q(time__gt=time)
+            if frame_uuid is not None:
+                after = after | Q(time=time, uuid__gt=frame_uuid)
+            frames = (
+                await Frame.filter(after, spaces__uuid__in=space_uuids)
+                .using_db(self._reader)
+                .distinct()
+                .order_by("time", "uuid")
+                .limit(limit)
+            )
+            frames_list = [frame_dict(frame) for frame in frames]
+            if self.archive is not None and self.archive.holds(time):
+                # Without a uuid, frames at time itself are skipped too
+                position = (time, frame_uuid or str(UUID(int=UUID_MAX)))
+                archived = await self.archive.scan(
+                    limit, position, newest_first=False, space_uuids=space_uuids
+                )
+                for frame in archived:
+                    frame.pop("agent")
+                    frame.pop("spaces")
+                frames_list = merge_frames(
+                    frames_list, archived, limit=limit, newest_first=False
+                )
+            return {"frames": frames_list}
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Failed to get frames", exc_info=exc)
+            return {"success": False}
+
+    async def get_delivery_cursor(self, agent_uuid: str) -> dict:
+        """Get the last frame acknowledged by agent, time and uuid are None if unset."""
+        self.logger.info("Getting delivery cursor")
+        try:
+            cursor_obj = await DeliveryCursor.get_or_none(agent_id=agent_uuid)
+            if cursor_obj is None or cursor_obj.frame_time is None:
+                return {"time": None, "uuid": None}
+            return {
+                "time": cursor_obj.frame_time,
+                "uuid": str(cursor_obj.frame_uuid) if cursor_obj.frame_uuid else None,
+            }
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Failed to get delivery cursor", exc_info=exc)
+            return {"success": False}
+
+    async def set_delivery_cursor(
+        self, agent_uuid: str, time: datetime, frame_uuid: Optional[str] = None
+    ) -> dict:
+        """Set the last frame acknowledged by agent."""
+        self.logger.info("Setting delivery cursor")
+        try:
+            await DeliveryCursor.update_or_create(
+                defaults={"frame_time": time, "frame_uuid": frame_uuid},
+                agent_id=agent_uuid,
+            )
+            return {"success": True}
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Failed to set delivery cursor", exc_info=exc)
+            return {"success": False}
+
+    async def create_retention_rule(
+        self,
+        name: Optional[str] = None,
+        space_uuid: Optional[str] = None,
+        max_age: Optional[int] = None,
+        max_count: Optional[int] = None,
+    ) -> dict:
+        """
+        Create retention rule.
+
+        Frames matching name and space, or any if None, are deleted once they
+        are older than max_age seconds or beyond the newest max_count frames.
+        Rules for a space only remove frames from that space.
+        """
+        self.logger.info("Creating retention rule")
+        if max_age is None and max_count is None:
+            raise ValueError("max_age or max_count is required")
+        try:
+            rule_obj = await RetentionRule.create(
+                name=name or None,
+                space_id=space_uuid or None,
+                max_age=max_age,
+                max_count=max_count,
+            )
+            return {
+                "uuid": str(rule_obj.uuid),
+                "name": rule_obj.name,
+                "space_uuid": space_uuid or None,
+                "max_age": rule_obj.max_age,
+                "max_count": rule_obj.max_count,
+            }
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Failed to create retention rule", exc_info=exc)
+            return {"success": False}
+
+    async def get_retention_rules(self) -> dict:
+        """Get retention rules."""
+        self.logger.info("Getting retention rules")
+        try:
+            rules_list = [
+                {
+                    "uuid": str(rule_obj.uuid),
+                    "name": rule_obj.name,
+                    "space_uuid": str(rule_obj.space_id)  # type: ignore
+                    if rule_obj.space_id  # type: ignore
+                    else None,
+                    "max_age": rule_obj.max_age,
+                    "max_count": rule_obj.max_count,
+                }
+                for rule_obj in await RetentionRule.all()
+            ]
+            return {"rules": rules_list}
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Failed to get retention rules", exc_info=exc)
+            return {"success": False}
+
+    async def delete_retention_rule(self, rule_uuid: str) -> dict:
+        """Delete retention rule."""
+        self.logger.info("Deleting retention rule")
+        try:
+            rule_obj = await RetentionRule.get(uuid=rule_uuid)
+            await rule_obj.delete()
+            return {"success": True}
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Failed to delete retention rule", exc_info=exc)
+            return {"success": False}
+
+    async def create_field_index(self, name: str, path: str) -> dict:
+        """
+        Create field index.
+
+        Values at path, such as "main.temp", in data of frames named name
+        can then be queried with `get_frames_by_field`. Existing frames
+        are indexed too.
+        """
+        self.logger.info("Creating field index")
+        if not FIELD_PATH.match(path):
+            raise ValueError(f"Invalid field path: {path}")
+        try:
+            async with in_transaction() as connection:
+                field_obj = await FieldIndex.create(
+                    name=name, path=path, using_db=connection
+                )
+                await connection.execute_query(
+                    FRAME_FIELDS_BACKFILL, [str(field_obj.uuid)]
+                )
+            return {
+                "uuid": str(field_obj.uuid),
+                "name": field_obj.name,
+                "path": field_obj.path,
+            }
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Failed to create field index", exc_info=exc)
+            return {"success": False}
+
+    async def get_field_indexes(self) -> dict:
+        """Get field indexes."""
+        self.logger.info("Getting field indexes")
+        try:
+            fields_list = [
+                {
+                    "uuid": str(field_obj.uuid),
+                    "name": field_obj.name,
+                    "path": field_obj.path,
+                }
+                for field_obj in await FieldIndex.all()
+            ]
+            return {"fields": fields_list}
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Failed to get field indexes", exc_info=exc)
+            return {"success": False}
+
+    async def delete_field_index(self, field_uuid: str) -> dict:
+        """Delete field index and its indexed values."""
+        self.logger.info("Deleting field index")
+        try:
+            field_obj = await FieldIndex.get(uuid=field_uuid)
+            async with in_transaction() as connection:
+                await connection.execute_query(
+                    'DELETE FROM "frame_field" WHERE field_id = ?',
+                    [str(field_obj.uuid)],
+                )
+                await connection.execute_query(
+                    'DELETE FROM "field_rollup" WHERE field_id = ?',
+                    [str(field_obj.uuid)],
+                )
+                await field_obj.delete(using_db=connection)
+            return {"success": True}
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Failed to delete field index", exc_info=exc)
+            return {"success": False}
+
+    async def get_frames_by_field(
+        self,
+        name: str,
+        path: str,
+        eq=None,
+        gt=None,
+        gte=None,
+        lt=None,
+        lte=None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> dict:
+        """
+        Get a page of frames by the value of an indexed field, newest first.
+
+        The field must have been declared with `create_field_index`.
+        Frames have a "value", the value of the field. Numbers only match
+        numeric bounds and strings string bounds, true and false are 1 and 0.
+        Pages are continued with the "next" cursor, as in `get_frames`.
+        """
+        self.logger.info("Getting frames by field")
+        try:
+            field_obj = await FieldIndex.get(name=name, path=path)
+            sql = 'SELECT frame_id, value, time FROM "frame_field" WHERE field_id = ?'
+            params = [str(field_obj.uuid)]  # type: list
+            bounds = [
+                (op, value)
+                for op, value in (
+                    ("=", eq),
+                    (">", gt),
+                    (">=", gte),
+                    ("<", lt),
+                    ("<=", lte),
+                )
+                if value is not None
+            ]
+            for op, value in bounds:
+                sql += f" AND value {op} ?"
+                params.append(value)
+            # Any number sorts before any string, keep bounds to one type
+            if any(isinstance(value, str) for _, value in bounds):
+                sql += " AND typeof(value) = 'text'"
+            elif bounds:
+                sql += " AND typeof(value) IN ('integer', 'real')"
+            if since:
+                sql += " AND time >= ?"
+                params.append(sql_time(since))
+            if until:
+                sql += " AND time < ?"
+                params.append(sql_time(until))
+            if cursor:
+                time, frame_uuid = decode_cursor(cursor)
+                sql += " AND (time < ? OR (time = ? AND frame_id < ?))"
+                params.extend([sql_time(time), sql_time(time), frame_uuid])
+            sql += " ORDER BY time DESC, frame_id DESC LIMIT ?"
+            params.append(limit + 1)
+            connection = self._reader or Tortoise.get_connection("default")
+            rows = await connection.execute_query_dict(sql, params)
+            next_cursor = None
+            frames = (
+                await Frame.filter(uuid__in=[row["frame_id"] for row in rows[:limit]])
+                .using_db(self._reader)
+                .select_related("agent")
+                .prefetch_related(Prefetch("spaces", queryset=Space.all()))
+            )
+            frames_by_uuid = {str(frame.uuid): frame for frame in frames}
+            converter = RowConverter()
+            frames_list = []
+            for row in rows[:limit]:
+                frame = frames_by_uuid.get(row["frame_id"])
+                if frame is None:
+                    continue
+                converted = converter.frame(frame)
+                converted["value"] = row["value"]
+                frames_list.append(converted)
+            if len(rows) > limit and frames_list:
+                next_cursor = encode_cursor(
+                    frames_list[-1]["time"], frames_list[-1]["uuid"]
+                )
+            return {"frames": frames_list, "next": next_cursor}
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Failed to get frames by field", exc_info=exc)
+            return {"success": False}
+
+    async def get_rollups(
+        self,
+        name: str,
+        path: str,
+        resolution: int = 3600,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> dict:
+        """
+        Get rollups of a numeric indexed field, oldest first.
+
+        Buckets of resolution seconds, a minute, hour or day, have the count,
+        min, max, sum, mean and last value of the field in frames from the
+        start "time" of the bucket. Rollups outlive deleted frames.
+        """
+        self.logger.info("Getting rollups")
+        if resolution not in ROLLUP_RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {ROLLUP_RESOLUTIONS}")
+        try:
+            rows = await self._rollup_rows(name, path, resolution, since, until)
+            return {"buckets": combine(rows, resolution)}
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Failed to get rollups", exc_info=exc)
+            return {"success": False}
+
+    async def downsample(
+        self,
+        name: str,
+        path: str,
+        window: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> dict:
+        """
+        Get a numeric indexed field in windows of window seconds, oldest first.
+
+        Windows are read from the coarsest rollups they are a multiple of,
+        only windows that are not a multiple of a minute read raw values.
+        since and until are rounded down to the buckets that are read.
+        """
+        self.logger.info("Downsampling")
+        if window < 1:
+            raise ValueError("window must be at least 1 second")
+        try:
+            resolution = source_resolution(window)
+            rows = await self._rollup_rows(name, path, resolution, since, until)
+            return {"buckets": combine(rows, window), "resolution": resolution}
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Failed to downsample", exc_info=exc)
+            return {"success": False}
+
+    async def _rollup_rows(
+        self,
+        name: str,
+        path: str,
+        resolution: Optional[int],
+        since: Optional[datetime],
+        until: Optional[datetime],
+    ) -> list:
+        """Get (bucket, count, min, max, sum, last) rows, raw values if no resolution."""
+        field_obj = await FieldIndex.get(name=name, path=path)
+        params = [str(field_obj.uuid)]  # type: list
+        since = utc(since) if since else None
+        until = utc(until) if until else None
+        if resolution is None:
+            sql = (
+                "SELECT CAST(strftime('%s', time) AS INTEGER), 1, value, value, "
+                'value, value FROM "frame_field" WHERE field_id = ? '
+                "AND typeof(value) IN ('integer', 'real')"
+            )
+            if since:
+                sql += " AND time >= ?"
+                params.append(sql_time(since))
+            if until:
+                sql += " AND time < ?"
+                params.append(sql_time(until))
+            sql += " ORDER BY time"
+        else:
+            sql = (
+                'SELECT bucket, "count", "min", "max", "sum", "last" '
+                'FROM "field_rollup" WHERE field_id = ? AND resolution = ?'
+            )
+            params.append(resolution)
+            if since:
+                sql += " AND bucket >= ?"
+                params.append(int(since.timestamp()) // resolution * resolution)
+            if until:
+                sql += " AND bucket < ?"
+                params.append(int(until.timestamp()))
+            sql += " ORDER BY bucket"
+        connection = self._reader or Tortoise.get_connection("default")
+        _, rows = await connection.execute_query(sql, params)
+        return [tuple(row) for row in rows]
+
     async def create_auth_token(self, agent_uuid: int) -> dict:
         """Create auth token."""
         self.logger.info("Creating auth token")
@@ -562,12 +1270,7 @@ class ZygoteAPI:
             token_obj = await AuthToken.create(agent=agent_obj, token=token)
             token_dict = {
                 "uuid": str(token_obj.uuid),
-                "agent": {
-                    "uuid": str(token_obj.agent.uuid),
-                    "name": token_obj.agent.name,
-                    "data": token_obj.agent.data,
-                    "meta": token_obj.agent.meta,
-                },
+                "agent": entity_dict(token_obj.agent),
                 "token": token_obj.token,
             }
             return token_dict
@@ -585,12 +1288,7 @@ class ZygoteAPI:
             )
             token_dict = {
                 "uuid": str(token_obj.uuid),
-                "agent": {
-                    "uuid": str(token_obj.agent.uuid),
-                    "name": token_obj.agent.name,
-                    "data": token_obj.agent.data,
-                    "meta": token_obj.agent.meta,
-                },
+                "agent": entity_dict(token_obj.agent),
                 "token": token_obj.token,
             }
             return token_dict
@@ -604,14 +1302,20 @@ class ZygoteAPI:
         try:
             token_obj = await AuthToken.get(uuid=token_uuid)
             await token_obj.delete()
+            self._token_generation += 1
+            self._token_cache.pop(token_obj.token)
             return {"success": True}
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to delete auth token", exc_info=exc)
             return {"success": False}
 
     async def get_agent_by_token(self, token: str) -> dict:
-        """Get agent by token."""
+        """Get agent by token, answered from cache when possible."""
         self.logger.info("Getting agent by token")
+        agent_dict = self._token_cache.get(token)
+        if agent_dict is not None:
+            return copy.deepcopy(agent_dict)
+        generation = self._token_generation
         try:
             token_obj = await AuthToken.get(token=token).prefetch_related(
                 "agent",
@@ -619,20 +1323,12 @@ class ZygoteAPI:
             )
             await token_obj.agent.fetch_related("spaces")
             agent_dict = {
-                "uuid": str(token_obj.agent.uuid),
-                "name": token_obj.agent.name,
-                "data": token_obj.agent.data,
-                "meta": token_obj.agent.meta,
-                "spaces": [
-                    {
-                        "uuid": str(space.uuid),
-                        "name": space.name,
-                        "data": space.data,
-                        "meta": space.meta,
-                    }
-                    for space in token_obj.agent.spaces
-                ],
+                **entity_dict(token_obj.agent),
+                "spaces": [entity_dict(space) for space in token_obj.agent.spaces],
             }
+            # Tokens revoked or agents changed during the read may be stale
+            if generation == self._token_generation:
+                self._token_cache.set(token, copy.deepcopy(agent_dict))
             return agent_dict
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to get agent by token", exc_info=exc)
@@ -641,25 +1337,20 @@ class ZygoteAPI:
     async def get_agent_by_name(self, name: str) -> dict:
         """Get agent by name."""
         self.logger.info("Getting agent by name")
+        key = ("agent_name", name)
+        agent_dict = self._cached(key)
+        if agent_dict is not None:
+            return agent_dict
+        generation = self._entity_generation
         try:
             agent_obj = await Agent.get(name=name).prefetch_related(
                 "spaces", Prefetch("spaces", queryset=Space.all())
             )
             agent_dict = {
-                "uuid": str(agent_obj.uuid),
-                "name": agent_obj.name,
-                "data": agent_obj.data,
-                "meta": agent_obj.meta,
-                "spaces": [
-                    {
-                        "uuid": str(space.uuid),
-                        "name": space.name,
-                        "data": space.data,
-                        "meta": space.meta,
-                    }
-                    for space in agent_obj.spaces
-                ],
+                **entity_dict(agent_obj),
+                "spaces": [entity_dict(space) for space in agent_obj.spaces],
             }
+            self._cache(key, agent_dict, generation)
             return agent_dict
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error("Failed to get agent by name", exc_info=exc)
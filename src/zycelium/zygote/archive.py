@@ -0,0 +1,418 @@
+"""
+Cold storage of old frames.
+"""
+import asyncio
+import gzip
+import json
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from tortoise.query_utils import Prefetch
+from tortoise.transactions import in_transaction
+
+from zycelium.zygote.cache import TTLCache
+from zycelium.zygote.logging import get_logger
+from zycelium.zygote.models import Frame, Space
+from zycelium.zygote.serializers import dumps, loads
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".index.json"
+MANIFEST = "archive.json"
+
+
+def _key(frame: dict) -> tuple:
+    """Sort key of a frame, matching the order of `ZygoteAPI.get_frames`."""
+    return (frame["time"], frame["uuid"])
+
+
+def merge_frames(*pages: Iterable[dict], limit: int, newest_first: bool = True) -> list:
+    """Merge pages of frames in (time, uuid) order, dropping duplicates."""
+    frames = sorted(
+        (frame for page in pages for frame in page), key=_key, reverse=newest_first
+    )
+    merged = []
+    for frame in frames:
+        if merged and _key(merged[-1]) == _key(frame):
+            continue
+        merged.append(frame)
+        if len(merged) == limit:
+            break
+    return merged
+
+
+def _write_atomic(path: Path, content: bytes) -> None:
+    """Write a file so it is either complete or missing after a crash."""
+    partial = path.with_name(f".{path.name}.partial")
+    with open(partial, "wb") as file:
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(partial, path)
+
+
+class FrameArchive:
+    """
+    Compressed, time-partitioned segments of frames moved out of the database.
+
+    A segment holds frames of one UTC day, oldest first, as gzipped JSON
+    lines. Next to it, an index file records its time range and the kinds,
+    names, agents and spaces of its frames, so reads only open segments
+    that can match. Frames older than `horizon` have all been archived.
+
+    Archived frames are merged into the last segment of their day while it
+    holds fewer than `segment_size` frames. Every change rewrites the
+    manifest, archives in other processes reload when it changes.
+    """
+
+    def __init__(
+        self, path: Union[str, Path], cache_size: int = 4, segment_size: int = 10000
+    ):
+        self.path = Path(path)
+        self.segment_size = segment_size
+        self.log = get_logger("zygote.archive")
+        self._segments = None  # type: Optional[list[dict]]
+        self._horizon = None  # type: Optional[datetime]
+        self._stamp = None  # type: Optional[tuple]
+        self._cache = TTLCache(maxsize=cache_size, ttl=60.0)
+        self._lock = asyncio.Lock()
+
+    @property
+    def horizon(self) -> Optional[datetime]:
+        """Get the time before which every frame is archived, None if none are."""
+        self._load()
+        return self._horizon
+
+    def holds(self, time: datetime) -> bool:
+        """Return True if frames at time may be archived."""
+        horizon = self.horizon
+        return horizon is not None and time < horizon
+
+    def segments(self) -> list:
+        """Get the index of every segment, oldest first."""
+        self._load()
+        return list(self._segments)  # type: ignore
+
+    def _manifest_stamp(self) -> Optional[tuple]:
+        """Get what changes when the manifest is rewritten, None if missing."""
+        try:
+            stat = os.stat(self.path / MANIFEST)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _load(self) -> None:
+        """Read segment indexes and the horizon, again once the manifest changed."""
+        stamp = self._manifest_stamp()
+        if self._segments is not None and stamp == self._stamp:
+            return
+        self._stamp = stamp
+        segments = []
+        for index_path in self.path.glob(f"*/*{INDEX_SUFFIX}"):
+            index = json.loads(index_path.read_text())
+            index["path"] = index_path.parent / index["segment"]
+            index["start"] = datetime.fromisoformat(index["start"])
+            index["end"] = datetime.fromisoformat(index["end"])
+            segments.append(index)
+        segments.sort(key=lambda index: (index["start"], index["end"]))
+        self._segments = segments
+        self._horizon = None
+        if stamp is not None:
+            horizon = json.loads((self.path / MANIFEST).read_text()).get("horizon")
+            self._horizon = datetime.fromisoformat(horizon) if horizon else None
+
+    def _save_manifest(self) -> None:
+        """Write the horizon, telling other processes to reload."""
+        horizon = self._horizon.isoformat() if self._horizon is not None else None
+        _write_atomic(self.path / MANIFEST, json.dumps({"horizon": horizon}).encode())
+        self._stamp = self._manifest_stamp()
+
+    def _remove_segment(self, index: dict) -> None:
+        """Delete a segment and its index."""
+        index_path = index["path"].parent / (
+            index["segment"][: -len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        )
+        index_path.unlink(missing_ok=True)
+        index["path"].unlink(missing_ok=True)
+        self._cache.pop(index["path"])
+
+    async def archive(
+        self, before: datetime, batch_size: int = 1000, pause: float = 0.01
+    ) -> int:
+        """
+        Move frames older than before out of the database, return how many.
+
+        Each batch is written to segments and the manifest before it is
+        deleted, a crash in between leaves frames in both places, reads drop
+        the duplicates.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        async with self._lock:
+            self._load()
+            self.path.mkdir(parents=True, exist_ok=True)
+            moved = 0
+            while True:
+                frames = (
+                    await Frame.filter(time__lt=before)
+                    .order_by("time", "uuid")
+                    .limit(batch_size)
+                    .select_related("agent")
+                    .prefetch_related(Prefetch("spaces", queryset=Space.all()))
+                )
+                if not frames:
+                    break
+                days = {}  # type: dict[str, list[dict]]
+                for frame in frames:
+                    record = self._record(frame)
+                    days.setdefault(record["time"][:10], []).append(record)
+                replaced = []
+                for day, records in days.items():
+                    previous = self._last_segment(day)
+                    if (
+                        previous
+                        and previous["count"] + len(records) > self.segment_size
+                    ):
+                        previous = None
+                    index = await asyncio.to_thread(
+                        self._write_segment, day, records, previous
+                    )
+                    if previous is not None:
+                        self._segments.remove(previous)  # type: ignore
+                        replaced.append(previous)
+                    self._segments.append(index)  # type: ignore
+                # Frames before the last of the batch are all archived now
+                if self._horizon is None or frames[-1].time > self._horizon:
+                    self._horizon = frames[-1].time
+                self._save_manifest()
+                for index in replaced:
+                    self._remove_segment(index)
+                frame_uuids = [str(frame.uuid) for frame in frames]
+                marks = ", ".join("?" * len(frame_uuids))
+                async with in_transaction() as connection:
+                    await connection.execute_query(
+                        f'DELETE FROM "frame_space" WHERE frame_id IN ({marks})',
+                        frame_uuids,
+                    )
+                    await connection.execute_query(
+                        f'DELETE FROM "frame" WHERE uuid IN ({marks})', frame_uuids
+                    )
+                moved += len(frames)
+                await asyncio.sleep(pause)
+            self._segments.sort(  # type: ignore
+                key=lambda index: (index["start"], index["end"])
+            )
+            if self._horizon is None or before > self._horizon:
+                self._horizon = before
+                self._save_manifest()
+            if moved:
+                self.log.info("Archived %s frames before %s", moved, before)
+            return moved
+
+    @staticmethod
+    def _record(frame: Frame) -> dict:
+        """Get the archived form of a frame."""
+        return {
+            "uuid": str(frame.uuid),
+            "kind": frame.kind,
+            "name": frame.name,
+            "data": frame.data,
+            "meta": frame.meta,
+            "time": frame.time.isoformat(),
+            "agent": {"uuid": str(frame.agent.uuid), "name": frame.agent.name}
+            if frame.agent
+            else None,
+            "spaces": [
+                {"uuid": str(space.uuid), "name": space.name}
+                for space in frame.spaces  # type: ignore
+            ],
+        }
+
+    def _last_segment(self, day: str) -> Optional[dict]:
+        """Get the index of the segment of day with the newest frames."""
+        indexes = [
+            index
+            for index in self._segments  # type: ignore
+            if index["path"].parent.name == day
+        ]
+        return max(indexes, key=lambda index: index["end"], default=None)
+
+    def _write_segment(
+        self, day: str, records: list, previous: Optional[dict] = None
+    ) -> dict:
+        """
+        Write records of one day to a new segment and its index.
+
+        With previous, the segment holds its frames too and replaces it,
+        until previous is removed both are read and duplicates dropped.
+        """
+        directory = self.path / day
+        directory.mkdir(parents=True, exist_ok=True)
+        if previous is not None:
+            records = sorted(
+                [
+                    loads(line)
+                    for line in gzip.decompress(
+                        previous["path"].read_bytes()
+                    ).splitlines()
+                ]
+                + records,
+                key=lambda record: (record["time"], record["uuid"]),
+            )
+        name = f"{records[0]['time'][11:].replace(':', '')}-{uuid.uuid4().hex[:8]}"
+        lines = b"".join(dumps(record) + b"\n" for record in records)
+        segment_path = directory / f"{name}{SEGMENT_SUFFIX}"
+        _write_atomic(segment_path, gzip.compress(lines))
+        index = {
+            "segment": segment_path.name,
+            "start": records[0]["time"],
+            "end": records[-1]["time"],
+            "count": len(records),
+            "kinds": sorted({record["kind"] for record in records}),
+            "names": sorted({record["name"] for record in records}),
+            "agents": sorted(
+                {record["agent"]["uuid"] for record in records if record["agent"]}
+            ),
+            "spaces": sorted(
+                {space["uuid"] for record in records for space in record["spaces"]}
+            ),
+        }
+        # The index is written last, a segment without one is never read
+        _write_atomic(directory / f"{name}{INDEX_SUFFIX}", json.dumps(index).encode())
+        return {
+            **index,
+            "path": segment_path,
+            "start": datetime.fromisoformat(index["start"]),
+            "end": datetime.fromisoformat(index["end"]),
+        }
+
+    def drop_before(self, time: datetime) -> int:
+        """Delete segments whose frames are all older than time, return how many."""
+        self._load()
+        dropped = [index for index in self._segments if index["end"] < time]  # type: ignore
+        if not dropped:
+            return 0
+        self._segments = [
+            index for index in self._segments if index["end"] >= time  # type: ignore
+        ]
+        self._save_manifest()
+        for index in dropped:
+            self._remove_segment(index)
+        return len(dropped)
+
+    async def scan(
+        self,
+        limit: int,
+        position: Optional[tuple] = None,
+        newest_first: bool = True,
+        **filters,
+    ) -> list:
+        """
+        Get up to limit archived frames in (time, uuid) order.
+
+        Newest first, frames before position, the (time, uuid) of a frame,
+        otherwise oldest first after it. Filters are kind, name, agent_uuid,
+        space_uuids, since and until, since is inclusive, until exclusive.
+        """
+        try:
+            return await self._scan(limit, position, newest_first, **filters)
+        except FileNotFoundError:
+            # Replaced by another process since the indexes were read
+            self._segments = None
+            return await self._scan(limit, position, newest_first, **filters)
+
+    async def _scan(
+        self,
+        limit: int,
+        position: Optional[tuple],
+        newest_first: bool,
+        kind: Optional[str] = None,
+        name: Optional[str] = None,
+        agent_uuid: Optional[str] = None,
+        space_uuids: Optional[list] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> list:
+        """Get archived frames, see `scan`."""
+        candidates = []
+        for index in self.segments():
+            if kind and kind not in index["kinds"]:
+                continue
+            if name and name not in index["names"]:
+                continue
+            if agent_uuid and agent_uuid not in index["agents"]:
+                continue
+            if space_uuids and not set(space_uuids) & set(index["spaces"]):
+                continue
+            if since and index["end"] < since or until and index["start"] >= until:
+                continue
+            if position and (
+                index["start"] > position[0]
+                if newest_first
+                else index["end"] < position[0]
+            ):
+                continue
+            candidates.append(index)
+        if newest_first:
+            candidates.sort(key=lambda index: index["end"], reverse=True)
+        frames = []  # type: list[dict]
+        for index in candidates:
+            if len(frames) == limit and (
+                frames[-1]["time"] > index["end"]
+                if newest_first
+                else frames[-1]["time"] < index["start"]
+            ):
+                break
+            matches = [
+                dict(frame)
+                for frame in await self._read(index)
+                if (kind is None or frame["kind"] == kind)
+                and (name is None or frame["name"] == name)
+                and (
+                    agent_uuid is None
+                    or frame["agent"] is not None
+                    and frame["agent"]["uuid"] == agent_uuid
+                )
+                and (
+                    not space_uuids
+                    or any(space["uuid"] in space_uuids for space in frame["spaces"])
+                )
+                and (since is None or frame["time"] >= since)
+                and (until is None or frame["time"] < until)
+                and (
+                    position is None
+                    or (
+                        _key(frame) < position
+                        if newest_first
+                        else _key(frame) > position
+                    )
+                )
+            ]
+            frames = merge_frames(
+                frames, matches, limit=limit, newest_first=newest_first
+            )
+        return frames
+
+    async def _read(self, index: dict) -> list:
+        """Get the frames of a segment, oldest first."""
+        frames = self._cache.get(index["path"])
+        if frames is None:
+            frames = await asyncio.to_thread(self._read_segment, index["path"])
+            self._cache.set(index["path"], frames)
+        return frames
+
+    @staticmethod
+    def _read_segment(path: Path) -> list:
+        """Decompress and parse a segment."""
+        frames = []
+        for line in gzip.decompress(path.read_bytes()).splitlines():
+            record = loads(line)
+            record["time"] = datetime.fromisoformat(record["time"])
+            if record["agent"] is not None:
+                record["agent"].update(data={}, meta={})
+            for space in record["spaces"]:
+                space.update(data={}, meta={})
+            frames.append(record)
+        return frames
@@ -1,12 +1,28 @@
 """
 Frame broker.
 """
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
 import socketio
 
 from zycelium.zygote.api import api
 from zycelium.zygote.config import app_config
-from zycelium.zygote.frame import Frame
+from zycelium.zygote.delivery import DeliveryCursors
+from zycelium.zygote.fanout import FanOut
+from zycelium.zygote.frame import ACK_EVENT, BATCH_EVENT, Frame
+from zycelium.zygote.ingest import frame_writer
 from zycelium.zygote.logging import get_logger
+from zycelium.zygote.routing import RoutingRegistry
+from zycelium.zygote.subscriptions import SubscriptionIndex
+from zycelium.zygote.signals import (
+    agent_updated,
+    agent_deleted,
+    space_updated,
+    space_deleted,
+    space_joined,
+    space_left,
+)
 
 sio = socketio.AsyncServer(
     async_mode="asgi",
@@ -15,7 +31,11 @@ sio = socketio.AsyncServer(
     engineio_logger=app_config.log_level == "debug",
 )
 log = get_logger("zygote.broker")
-SID_AGENT = {}
+routes = RoutingRegistry()
+subscriptions = SubscriptionIndex()
+fanout = FanOut(sio, routes, subscriptions)
+cursors = DeliveryCursors(api)
+_last_frame_time = datetime.min.replace(tzinfo=timezone.utc)
 
 
 @sio.on("connect", namespace="/")  # pyright: reportOptionalCall=false
@@ -35,13 +55,28 @@ async def connect(sid, _environ, auth: dict):
         return False
     log.info("Agent authenticated: %s", agent["name"])
 
-    # Store agent
-    SID_AGENT[sid] = agent
+    # Store agent route
+    route = routes.add(sid, agent)
 
-    # Add agent to spaces
-    for space in agent["spaces"]:
-        sio.enter_room(sid, space["uuid"])
-        log.info("Agent %s joined space %s", agent["name"], space["name"])
+    for space_name in route.spaces:
+        log.info("Agent %s joined space %s", route.name, space_name)
+
+    # Check subscriptions, agents that do not send them get every frame
+    replay_subscriptions = SubscriptionIndex()
+    try:
+        replay_subscriptions.add(sid, auth.get("subscriptions"))
+    except ValueError as exc:
+        log.error("Invalid subscriptions from %s: %s", route.name, exc)
+        routes.remove(sid)
+        return False
+    log.info(
+        "Agent %s subscribed to: %s",
+        route.name,
+        ", ".join(replay_subscriptions.subscriptions(sid)) or "nothing",
+    )
+
+    # Send missed frames, then live frames
+    sio.start_background_task(replay, sid, route.uuid, replay_subscriptions)
 
     # Send command: identity
     frame = Frame(
@@ -53,25 +88,96 @@ async def connect(sid, _environ, auth: dict):
 
 
 @sio.on("disconnect", namespace="/")
-def disconnect(sid):
+async def disconnect(sid):
     """On disconnected."""
-    agent = SID_AGENT.pop(sid, None)
-    log.info("Agent disconnected: %s", agent["name"] if agent else sid)
+    route = routes.remove(sid)
+    subscriptions.remove(sid)
+    log.info("Agent disconnected: %s", route.name if route else sid)
+    if route and not routes.sids_for_agent(route.uuid):
+        await cursors.save(route.uuid)
+
+
+async def replay(sid, agent_uuid, replay_subscriptions: SubscriptionIndex) -> None:
+    """
+    Send frames stored after the delivery cursor of agent, oldest first.
+
+    Frames are read in batches of `replay_batch_size`. Once caught up the
+    agent gets live frames, and a last pass sends frames stored meanwhile.
+    Frames may be sent twice, agents drop frames they have already seen.
+    """
+    time, frame_uuid = await cursors.load(agent_uuid)
+    limit = app_config.replay_batch_size
+    live = False
+    replayed = 0
+    while True:
+        route = routes.get(sid)
+        if route is None:
+            return
+        result = await api.get_frames_since(
+            list(route.spaces.values()), time, frame_uuid, limit=limit
+        )
+        frames = result.get("frames")
+        if frames is None:
+            log.error("Failed to replay frames to %s", route.name)
+            frames = []
+        for data in frames:
+            time, frame_uuid = data["time"], data["uuid"]
+            if sid not in replay_subscriptions.match(data["name"]):
+                continue
+            frame = Frame(
+                data["name"],
+                kind=data["kind"],
+                data=data["data"],
+                meta={"uuid": frame_uuid, "time": time.isoformat()},
+            )
+            await sio.emit(frame.sio_name(), frame.to_dict(), room=sid)
+            replayed += 1
+        if len(frames) == limit:
+            continue
+        if live:
+            break
+        # Go live, then pick up frames that were still queued for the database
+        if routes.get(sid) is None:
+            return
+        subscriptions.add(sid, replay_subscriptions.subscriptions(sid))
+        await frame_writer.flush()
+        live = True
+    if replayed:
+        log.info("Replayed %s frames to %s", replayed, route.name)
+
+
+@sio.on(ACK_EVENT, namespace="/")
+async def on_frame_ack(sid, data):
+    """On frame acknowledged."""
+    route = routes.get(sid)
+    if route is None:
+        return
+    try:
+        time = datetime.fromisoformat(data["time"])
+    except (KeyError, TypeError, ValueError):
+        log.warning("Agent %s sent invalid ack: %s", route.name, data)
+        return
+    cursors.ack(route.uuid, time, data.get("uuid"))
 
 
 @sio.on("command-identity", namespace="/")
 async def on_command_identity(sid, data):
     """On command identity."""
 
-    agent = SID_AGENT[sid]
-    log.info("Agent %s sent command: %s", agent["name"], data["name"])
+    route = routes[sid]
+    log.info("Agent %s sent command: %s", route.name, data["name"])
 
     if data["name"] == "identity":
         frame = Frame(
             "identity",
             kind="command",
-            data={"name": agent["name"]},
-            meta={"spaces": agent["spaces"]},
+            data={"name": route.name},
+            meta={
+                "spaces": [
+                    {"uuid": space_uuid, "name": space_name}
+                    for space_name, space_uuid in route.spaces.items()
+                ]
+            },
         )
         await sio.emit("command", frame.to_dict(), room=sid)
     else:
@@ -81,15 +187,14 @@ async def on_command_identity(sid, data):
 @sio.on("command-config", namespace="/")
 async def on_command_config(sid, data):
     """On command config."""
-    agent = SID_AGENT[sid]
+    route = routes[sid]
     if data["name"] == "config":
-        agent = await api.get_agent(agent["uuid"])
+        agent = await api.get_agent(route.uuid)
         if agent["meta"].get("config"):
             config = agent["meta"]["config"]
             data["data"] = {**data["data"], **config}
 
         agent = await api.update_agent(agent["uuid"], meta={"config": data["data"]})
-        SID_AGENT[sid] = agent
 
         log.info("Agent %s configured.", agent["name"])
         frame = Frame("config", kind="command", data=data["data"])
@@ -101,15 +206,14 @@ async def on_command_config(sid, data):
 @sio.on("command-config-update", namespace="/")
 async def on_command_config_update(sid, data):
     """On command config update."""
-    agent = SID_AGENT[sid]
-    log.info("Agent %s sent command: %s", agent["name"], data["name"])
+    route = routes[sid]
+    log.info("Agent %s sent command: %s", route.name, data["name"])
 
     if data["name"] == "config-update":
-        agent = await api.get_agent(agent["uuid"])
+        agent = await api.get_agent(route.uuid)
         config = agent["meta"].get("config", {})
         config.update(data["data"])
         agent = await api.update_agent(agent["uuid"], meta={"config": config})
-        SID_AGENT[sid] = agent
 
         log.info("Agent %s configured: %s", agent["name"], config)
         frame = Frame("config", kind="command", data=config)
@@ -118,43 +222,119 @@ async def on_command_config_update(sid, data):
         log.warning("Unknown command: %s", data["name"])
 
 
+@sio.on(BATCH_EVENT, namespace="/")
+async def on_frame_batch(sid, data):
+    """On batch of frames, with the agent's latest acknowledgement if any."""
+    if data.get("ack") is not None:
+        await on_frame_ack(sid, data["ack"])
+    await ingest(sid, data.get("frames", []))
+
+
 @sio.on("*", namespace="/")
 async def on_frame(_event, sid, data):
     """On frame."""
-    agent = SID_AGENT[sid]
-    spaces = data.pop("spaces", [])
-    if not spaces:
-        # Use all joined spaces if spaces not specified
-        spaces = [s["uuid"] for s in agent["spaces"]]
-    else:
-        # Filter spaces by name
-        spaces = [s["uuid"] for s in agent["spaces"] if s["name"] in spaces]
-
-    frame_name = data["name"]
-    kind = data["kind"]
-    data["meta"] = {
-        "agent": agent["name"],
-    }
-    if not frame_name:
-        raise ValueError("Frame name not specified")
-
-    # Store frame in database
-    await api.create_frame(
-        kind=kind,
-        name=frame_name,
-        data=data["data"],
-        space_uuids=spaces,
-        agent_uuid=agent["uuid"],
+    await ingest(sid, [data])
+
+
+def _frame_time() -> datetime:
+    """Get time for a new frame, later than the time of the previous frame."""
+    global _last_frame_time  # pylint: disable=global-statement
+    _last_frame_time = max(
+        datetime.now(timezone.utc), _last_frame_time + timedelta(microseconds=1)
     )
+    return _last_frame_time
 
-    # Broadcast frame to spaces
-    frame = Frame(frame_name, kind=kind, data=data["data"])
-    for space in spaces:
-        await sio.emit(frame.sio_name(), frame.to_dict(), room=space)
 
-    log.info(
-        "Agent %s sent frame %s to spaces: %s",
-        agent["name"],
-        frame.sio_name(),
-        ", ".join(spaces),
+async def ingest(sid, frames: list) -> None:
+    """Store frames and broadcast them to spaces, keeping their order."""
+    route = routes[sid]
+    accepted = []
+    for data in frames:
+        if not data.get("name"):
+            log.error("Agent %s sent frame without name", route.name)
+            continue
+        # Use all joined spaces if spaces not specified, else filter by name
+        spaces = routes.resolve(sid, data.pop("spaces", []))
+        if not spaces:
+            log.warning("Agent %s sent frame %s to no spaces", route.name, data["name"])
+            continue
+        # Time and uuid of the stored frame, agents ack frames with them
+        time = _frame_time()
+        frame = Frame(
+            data["name"],
+            kind=data.get("kind", "event"),
+            data=data.get("data") or {},
+            meta={"uuid": str(uuid4()), "time": time.isoformat()},
+        )
+        accepted.append((frame, spaces, time))
+
+    # Queue frames for the database, broadcast without waiting for the write
+    await frame_writer.submit_many(
+        [
+            {
+                "uuid": frame.meta["uuid"],
+                "time": time,
+                "kind": frame.kind,
+                "name": frame.name,
+                "data": frame.data,
+                "space_uuids": spaces,
+                "agent_uuid": route.uuid,
+            }
+            for frame, spaces, time in accepted
+        ]
     )
+
+    # Broadcast frames to spaces, once per agent
+    for frame, spaces, _time in accepted:
+        await fanout.deliver(frame.sio_name(), frame.to_dict(), spaces, name=frame.name)
+        log.info(
+            "Agent %s sent frame %s to spaces: %s",
+            route.name,
+            frame.sio_name(),
+            ", ".join(spaces),
+        )
+
+
+# Keep routes in sync with changes made through the API
+
+
+async def on_agent_updated(agent_uuid, name, **_kwargs):
+    """On agent updated."""
+    routes.rename_agent(agent_uuid, name)
+
+
+async def on_agent_deleted(agent_uuid, **_kwargs):
+    """On agent deleted."""
+    cursors.forget(agent_uuid)
+    for sid in list(routes.sids_for_agent(agent_uuid)):
+        await sio.disconnect(sid)
+
+
+async def on_space_updated(space_uuid, name, **_kwargs):
+    """On space updated."""
+    routes.rename_space(space_uuid, name)
+
+
+async def on_space_deleted(space_uuid, **_kwargs):
+    """On space deleted."""
+    routes.remove_space(space_uuid)
+
+
+async def on_space_joined(agent_uuid, space_uuid, space_name, **_kwargs):
+    """On space joined."""
+    for sid in routes.join(agent_uuid, space_uuid, space_name):
+        log.info("Agent %s joined space %s", routes[sid].name, space_name)
+
+
+async def on_space_left(agent_uuid, space_uuid, **_kwargs):
+    """On space left."""
+    for sid in routes.leave(agent_uuid, space_uuid):
+        log.info("Agent %s left space %s", routes[sid].name, space_uuid)
+
+
+agent_updated.connect(on_agent_updated)
+agent_deleted.connect(on_agent_deleted)
+space_updated.connect(on_space_updated)
+space_deleted.connect(on_space_deleted)
+space_joined.connect(on_space_joined)
+space_left.connect(on_space_left)
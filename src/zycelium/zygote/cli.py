@@ -1,12 +1,22 @@
 """
 Command-line interface.
 """
+import asyncio
+import json
+from datetime import datetime
+
 import click
 import uvicorn
 
 from zycelium.zygote.config import app_config
 from zycelium.zygote.crypto import ensure_tls_certificate_chain
-from zycelium.zygote.server import app_dir
+from zycelium.zygote.host import PACKING_STRATEGIES
+from zycelium.zygote.server import DrainingServer, app_dir
+from zycelium.zygote.storage import (
+    STORAGE_PROFILES,
+    SYNCHRONOUS_LEVELS,
+    storage_urls,
+)
 
 
 @click.group()
@@ -19,20 +29,138 @@ def cli():
 @click.option("--port", default=3965, help="Port to bind to")
 @click.option("--tls/--no-tls", is_flag=True, default=True, help="Enable TLS")
 @click.option("--debug", is_flag=True, default=False, help="Enable debug mode")
-def serve(host, port, tls, debug):
+@click.option(
+    "--durability",
+    type=click.Choice(["async", "sync"]),
+    default="async",
+    help="Broadcast frames before (async) or after (sync) they are stored",
+)
+@click.option("--batch-size", default=100, help="Frames written per transaction")
+@click.option("--batch-interval", default=0.05, help="Seconds to wait for a batch")
+@click.option("--queue-size", default=10000, help="Frames queued before blocking")
+@click.option("--write-retries", default=3, help="Retries of a failed frame write")
+@click.option("--write-retry-backoff", default=0.1, help="Seconds before a retry")
+@click.option(
+    "--db-profile",
+    type=click.Choice(STORAGE_PROFILES),
+    default="tuned",
+    help="SQLite settings: Tortoise defaults, or WAL, mmap and read connections",
+)
+@click.option(
+    "--db-synchronous",
+    type=click.Choice(SYNCHRONOUS_LEVELS, case_sensitive=False),
+    default="NORMAL",
+    help="SQLite synchronous level of the tuned profile",
+)
+@click.option("--db-mmap-size", default=268435456, help="Bytes of database to mmap")
+@click.option("--db-cache-size", default=-65536, help="Page cache, negative in KiB")
+@click.option("--db-busy-timeout", default=5000, help="Milliseconds to wait on locks")
+@click.option("--db-readers", default=4, help="Read-only connections, tuned profile")
+@click.option("--replay-batch-size", default=100, help="Frames replayed per read")
+@click.option(
+    "--compact-interval", default=3600.0, help="Seconds between compactions, 0 never"
+)
+@click.option(
+    "--compact-batch-size", default=500, help="Frames deleted per transaction"
+)
+@click.option(
+    "--archive-after", default=0.0, help="Archive frames older than this many seconds"
+)
+@click.option("--restart-backoff", default=0.5, help="Seconds to wait between restarts")
+@click.option("--restart-max-backoff", default=30.0, help="Longest restart backoff")
+@click.option("--restart-max", default=5, help="Restarts in a window before quarantine")
+@click.option("--restart-window", default=60.0, help="Seconds restarts are counted in")
+@click.option(
+    "--agent-packing",
+    type=click.Choice(PACKING_STRATEGIES),
+    default="process",
+    help="Run every agent in a process, or several agents per host process",
+)
+@click.option("--agent-host-size", default=0, help="Agents per host, 0 for any number")
+@click.option(
+    "--agent-isolate", default="", help="Comma-separated agents with own processes"
+)
+@click.option(
+    "--agent-start-method",
+    type=click.Choice(["fork", "forkserver", "spawn"]),
+    default="forkserver",
+    help="Multiprocessing start method of agent processes",
+)
+@click.option("--agent-preload", default="", help="Comma-separated modules to preload")
+@click.option(
+    "--shutdown-timeout", default=10.0, help="Seconds agents get to drain on shutdown"
+)
+def serve(
+    host,
+    port,
+    tls,
+    debug,
+    durability,
+    batch_size,
+    batch_interval,
+    queue_size,
+    write_retries,
+    write_retry_backoff,
+    db_profile,
+    db_synchronous,
+    db_mmap_size,
+    db_cache_size,
+    db_busy_timeout,
+    db_readers,
+    replay_batch_size,
+    compact_interval,
+    compact_batch_size,
+    archive_after,
+    restart_backoff,
+    restart_max_backoff,
+    restart_max,
+    restart_window,
+    agent_packing,
+    agent_host_size,
+    agent_isolate,
+    agent_start_method,
+    agent_preload,
+    shutdown_timeout,
+):  # pylint: disable=too-many-arguments,too-many-locals
     """Start the server."""
     log_level = "debug" if debug else "info"
     app_config.host = host
     app_config.port = port
     app_config.tls_enable = tls
     app_config.log_level = log_level
+    app_config.ingest_durability = durability
+    app_config.ingest_batch_size = batch_size
+    app_config.ingest_batch_interval = batch_interval
+    app_config.ingest_queue_size = queue_size
+    app_config.ingest_retries = write_retries
+    app_config.ingest_retry_backoff = write_retry_backoff
+    app_config.db_profile = db_profile
+    app_config.db_synchronous = db_synchronous
+    app_config.db_mmap_size = db_mmap_size
+    app_config.db_cache_size = db_cache_size
+    app_config.db_busy_timeout = db_busy_timeout
+    app_config.db_readers = db_readers
+    app_config.replay_batch_size = replay_batch_size
+    app_config.compact_interval = compact_interval
+    app_config.compact_batch_size = compact_batch_size
+    app_config.archive_after = archive_after
+    app_config.restart_backoff = restart_backoff
+    app_config.restart_max_backoff = restart_max_backoff
+    app_config.restart_max = restart_max
+    app_config.restart_window = restart_window
+    app_config.agent_packing = agent_packing
+    app_config.agent_host_size = agent_host_size
+    app_config.agent_isolate = agent_isolate
+    app_config.agent_start_method = agent_start_method
+    app_config.agent_preload = agent_preload
+    app_config.shutdown_timeout = shutdown_timeout
 
     if tls:
         certificate_paths = ensure_tls_certificate_chain("localhost", app_dir, 365)
         app_config.tls_ca_path = str(certificate_paths.ca)
         app_config.tls_cert_path = str(certificate_paths.cert)
         app_config.tls_key_path = str(certificate_paths.key)
-        uvicorn.run(
+        config = uvicorn.Config(
             "zycelium.zygote.server:sio_app",
             host=host,
             port=port,
@@ -42,9 +170,11 @@ def serve(host, port, tls, debug):
             ssl_ca_certs=app_config.tls_ca_path,
         )
     else:
-        uvicorn.run(
+        config = uvicorn.Config(
             "zycelium.zygote.server:sio_app", host=host, port=port, log_level=log_level
         )
+    # Agents send their last frames before uvicorn closes their connections
+    DrainingServer(config).run()
 
 
 @cli.command()
@@ -54,3 +184,273 @@ def destroy():
 
     app_db_path.unlink()
     click.echo("Database destroyed")
+
+
+@cli.command("import-frames")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--agent", "agent_name", required=True, help="Agent that sent frames")
+@click.option("--space", "space_names", multiple=True, help="Space to add frames to")
+@click.option("--batch-size", default=500, help="Frames written per transaction")
+def import_frames(path, agent_name, space_names, batch_size):
+    """Import frames from a JSON lines file."""
+    from zycelium.zygote.server import app_db_path
+
+    count = asyncio.run(
+        _import_frames(
+            f"sqlite://{app_db_path}", path, agent_name, space_names, batch_size
+        )
+    )
+    click.echo(f"Imported {count} frames")
+
+
+async def _import_frames(
+    db_url: str, path: str, agent_name: str, space_names: tuple, batch_size: int
+) -> int:
+    """Read frames from a JSON lines file and store them in batches."""
+    from zycelium.zygote.api import api
+
+    await api.start(db_url)
+    try:
+        agent = await api.get_agent_by_name(agent_name)
+        if agent == {"success": False}:
+            raise click.ClickException(f"Unknown agent: {agent_name}")
+        if space_names:
+            spaces = (await api.get_spaces())["spaces"]
+            space_uuids = [s["uuid"] for s in spaces if s["name"] in space_names]
+        else:
+            space_uuids = [s["uuid"] for s in agent["spaces"]]
+        if not space_uuids:
+            raise click.ClickException("No spaces to import frames into")
+
+        count = 0
+        batch = []
+        with open(path, "r", encoding="utf-8") as file:
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                frame = json.loads(line)
+                try:
+                    # Frames keep the time they were sent at
+                    time = datetime.fromisoformat(frame["time"])
+                except KeyError:
+                    time = None
+                except (TypeError, ValueError) as exc:
+                    raise click.ClickException(
+                        f"Invalid time on line {line_number}: {frame['time']!r}"
+                    ) from exc
+                batch.append(
+                    {
+                        "time": time,
+                        "kind": frame.get("kind", "event"),
+                        "name": frame["name"],
+                        "data": frame.get("data", {}),
+                        "meta": frame.get("meta", {}),
+                        "agent_uuid": agent["uuid"],
+                        "space_uuids": space_uuids,
+                    }
+                )
+                if len(batch) >= batch_size:
+                    count += len((await api.create_frames(batch)).get("frames", []))
+                    batch = []
+        if batch:
+            count += len((await api.create_frames(batch)).get("frames", []))
+        return count
+    finally:
+        await api.stop()
+
+
+@cli.command()
+@click.option("--batch-size", default=500, help="Frames deleted per transaction")
+@click.option(
+    "--full", is_flag=True, default=False, help="Rebuild the database to reclaim space"
+)
+@click.option(
+    "--archive-after",
+    type=float,
+    default=None,
+    help="Archive frames older than this many seconds",
+)
+def compact(batch_size, full, archive_after):
+    """Apply retention rules, archive old frames and reclaim free space."""
+    from zycelium.zygote.server import app_db_path, app_archive_path
+
+    if archive_after is None:
+        archive_after = app_config.archive_after
+    stats = asyncio.run(
+        _compact(app_db_path, app_archive_path, batch_size, full, archive_after)
+    )
+    for key, value in stats.items():
+        click.echo(f"{key}: {value}")
+
+
+async def _compact(
+    db_path, archive_path, batch_size: int, full: bool, archive_after: float
+) -> dict:
+    """Run one compaction against the database."""
+    from zycelium.zygote.api import api
+    from zycelium.zygote.compactor import compactor
+
+    db_url, _ = storage_urls(
+        db_path,
+        profile=app_config.db_profile,
+        synchronous=app_config.db_synchronous,
+        mmap_size=app_config.db_mmap_size,
+        cache_size=app_config.db_cache_size,
+        busy_timeout=app_config.db_busy_timeout,
+    )
+    await api.start(db_url, archive_path=archive_path)
+    try:
+        compactor.batch_size = batch_size
+        compactor.archive_after = archive_after
+        stats = await compactor.run(vacuum=not full)
+        if full:
+            await compactor.vacuum_full()
+        return stats
+    finally:
+        await api.stop()
+
+
+@cli.group()
+def retention():
+    """Manage frame retention rules."""
+
+
+@retention.command("add")
+@click.option("--name", default=None, help="Frame name, every frame if not set")
+@click.option(
+    "--space", "space_name", default=None, help="Space, every space if not set"
+)
+@click.option("--max-age", type=int, default=None, help="Seconds to keep frames")
+@click.option("--max-count", type=int, default=None, help="Frames to keep")
+def retention_add(name, space_name, max_age, max_count):
+    """Add a retention rule."""
+    if max_age is None and max_count is None:
+        raise click.UsageError("Set --max-age, --max-count or both")
+    rule = asyncio.run(_retention_add(name, space_name, max_age, max_count))
+    click.echo(json.dumps(rule))
+
+
+@retention.command("list")
+def retention_list():
+    """List retention rules."""
+    for rule in asyncio.run(_retention_list()):
+        click.echo(json.dumps(rule))
+
+
+@retention.command("remove")
+@click.argument("uuid")
+def retention_remove(uuid):
+    """Remove a retention rule."""
+    click.echo(json.dumps(asyncio.run(_retention_remove(uuid))))
+
+
+async def _retention_add(
+    name: str, space_name: str, max_age: int, max_count: int
+) -> dict:
+    """Store a retention rule."""
+    from zycelium.zygote.api import api
+    from zycelium.zygote.server import app_db_path
+
+    await api.start(f"sqlite://{app_db_path}")
+    try:
+        space_uuid = None
+        if space_name:
+            spaces = (await api.get_spaces())["spaces"]
+            matches = [s["uuid"] for s in spaces if s["name"] == space_name]
+            if not matches:
+                raise click.ClickException(f"Unknown space: {space_name}")
+            space_uuid = matches[0]
+        return await api.create_retention_rule(
+            name=name, space_uuid=space_uuid, max_age=max_age, max_count=max_count
+        )
+    finally:
+        await api.stop()
+
+
+async def _retention_list() -> list:
+    """Get retention rules."""
+    from zycelium.zygote.api import api
+    from zycelium.zygote.server import app_db_path
+
+    await api.start(f"sqlite://{app_db_path}")
+    try:
+        return (await api.get_retention_rules()).get("rules", [])
+    finally:
+        await api.stop()
+
+
+async def _retention_remove(rule_uuid: str) -> dict:
+    """Delete a retention rule."""
+    from zycelium.zygote.api import api
+    from zycelium.zygote.server import app_db_path
+
+    await api.start(f"sqlite://{app_db_path}")
+    try:
+        return await api.delete_retention_rule(rule_uuid)
+    finally:
+        await api.stop()
+
+
+@cli.group()
+def fields():
+    """Manage indexed fields of frame data."""
+
+
+@fields.command("add")
+@click.argument("name")
+@click.argument("path")
+def fields_add(name, path):
+    """Index the field at PATH, such as main.temp, of frames named NAME."""
+    click.echo(json.dumps(asyncio.run(_fields_add(name, path))))
+
+
+@fields.command("list")
+def fields_list():
+    """List indexed fields."""
+    for field in asyncio.run(_fields_list()):
+        click.echo(json.dumps(field))
+
+
+@fields.command("remove")
+@click.argument("uuid")
+def fields_remove(uuid):
+    """Remove an indexed field."""
+    click.echo(json.dumps(asyncio.run(_fields_remove(uuid))))
+
+
+async def _fields_add(name: str, path: str) -> dict:
+    """Store a field index and index existing frames."""
+    from zycelium.zygote.api import api
+    from zycelium.zygote.server import app_db_path
+
+    await api.start(f"sqlite://{app_db_path}")
+    try:
+        return await api.create_field_index(name, path)
+    except ValueError as exc:
+        raise click.UsageError(str(exc)) from exc
+    finally:
+        await api.stop()
+
+
+async def _fields_list() -> list:
+    """Get field indexes."""
+    from zycelium.zygote.api import api
+    from zycelium.zygote.server import app_db_path
+
+    await api.start(f"sqlite://{app_db_path}")
+    try:
+        return (await api.get_field_indexes()).get("fields", [])
+    finally:
+        await api.stop()
+
+
+async def _fields_remove(field_uuid: str) -> dict:
+    """Delete a field index."""
+    from zycelium.zygote.api import api
+    from zycelium.zygote.server import app_db_path
+
+    await api.start(f"sqlite://{app_db_path}")
+    try:
+        return await api.delete_field_index(field_uuid)
+    finally:
+        await api.stop()
@@ -0,0 +1,272 @@
+"""
+Frame retention and database compaction.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from tortoise import Tortoise
+
+from zycelium.zygote.api import ZygoteAPI, api
+from zycelium.zygote.logging import get_logger
+from zycelium.zygote.models import FRAME_SEARCH_REBUILD
+from zycelium.zygote.storage import sql_time
+
+# SQLite value of PRAGMA auto_vacuum for INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class Compactor:
+    """
+    Enforce retention rules, archive old frames and reclaim free pages.
+
+    Frames are deleted in batches of `batch_size`, each batch is its own
+    short transaction followed by a pause, so frame ingest is never held
+    up for long. With `archive_after` set, frames older than that many
+    seconds are moved to the archive of the API, see `FrameArchive`.
+    """
+
+    def __init__(self, zygote_api: ZygoteAPI):
+        self.api = zygote_api
+        self.log = get_logger("zygote.compactor")
+        self.batch_size = 500
+        self.pause = 0.01
+        self.vacuum_pages = 1000
+        self.archive_after = 0.0
+        self._task = None  # type: Optional[asyncio.Task]
+        self._lock = asyncio.Lock()
+        self._stats = {
+            "runs": 0,
+            "frames_deleted": 0,
+            "space_links_deleted": 0,
+            "orphans_deleted": 0,
+            "frames_archived": 0,
+            "segments_dropped": 0,
+            "pages_vacuumed": 0,
+            "last_run_at": None,
+            "last_run_seconds": None,
+        }
+        self._progress = {"running": False, "rule": None, "rules_done": 0, "rules": 0}
+
+    @property
+    def running(self) -> bool:
+        """Return True if the background compactor is running."""
+        return self._task is not None and not self._task.done()
+
+    def start(
+        self,
+        interval: float = 3600.0,
+        batch_size: int = 500,
+        pause: float = 0.01,
+        archive_after: float = 0.0,
+    ) -> None:
+        """Run compaction every interval seconds in the background."""
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.batch_size = batch_size
+        self.pause = pause
+        self.archive_after = archive_after
+        self._task = asyncio.get_running_loop().create_task(self._loop(interval))
+        self.log.info("Started compactor: interval=%s", interval)
+
+    async def stop(self) -> None:
+        """Stop the background compactor."""
+        if not self.running:
+            return
+        self._task.cancel()  # type: ignore
+        try:
+            await self._task  # type: ignore
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.log.info("Stopped compactor: %s", self.stats())
+
+    def stats(self) -> dict:
+        """Return compaction counters and progress of the current run."""
+        return {**self._stats, **self._progress}
+
+    async def _loop(self, interval: float) -> None:
+        """Compact, then wait for the next run."""
+        while True:
+            try:
+                await self.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # pylint: disable=broad-except
+                self.log.error("Compaction failed", exc_info=exc)
+            await asyncio.sleep(interval)
+
+    async def run(self, vacuum: bool = True) -> dict:
+        """Enforce every retention rule, archive, remove orphans and vacuum once."""
+        async with self._lock:
+            started = time.monotonic()
+            rules = (await self.api.get_retention_rules()).get("rules", [])
+            self._progress.update(running=True, rules_done=0, rules=len(rules))
+            try:
+                for rule in rules:
+                    self._progress["rule"] = rule["uuid"]
+                    await self._enforce(rule)
+                    self._progress["rules_done"] += 1
+                self._progress["rule"] = None
+                await self._archive()
+                await self._remove_orphans()
+                if vacuum:
+                    await self._vacuum()
+            finally:
+                self._progress["running"] = False
+            self._stats["runs"] += 1
+            self._stats["last_run_at"] = datetime.now(timezone.utc).isoformat()
+            self._stats["last_run_seconds"] = time.monotonic() - started
+            self.log.info("Compacted: %s", self._stats)
+            return self.stats()
+
+    async def _enforce(self, rule: dict) -> None:
+        """Delete frames past the max age or count of rule."""
+        scope, params = self._scope(rule)
+        if rule["max_age"] is not None:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=rule["max_age"])
+            await self._delete(
+                rule, f"{scope} AND f.time < ?", [*params, sql_time(cutoff)]
+            )
+            if self.api.archive is not None and not (
+                rule["space_uuid"] or rule["name"]
+            ):
+                self._stats["segments_dropped"] += self.api.archive.drop_before(cutoff)
+        if rule["max_count"] is not None:
+            # The newest frame past max_count, it and older frames go
+            connection = Tortoise.get_connection("default")
+            rows = await connection.execute_query_dict(
+                f"SELECT f.time, f.uuid {scope} "
+                "ORDER BY f.time DESC, f.uuid DESC LIMIT 1 OFFSET ?",
+                [*params, rule["max_count"]],
+            )
+            if rows:
+                await self._delete(
+                    rule,
+                    f"{scope} AND (f.time < ? OR (f.time = ? AND f.uuid <= ?))",
+                    [*params, rows[0]["time"], rows[0]["time"], rows[0]["uuid"]],
+                )
+
+    @staticmethod
+    def _scope(rule: dict) -> tuple:
+        """Get FROM and WHERE clauses selecting the frames of rule."""
+        params = []
+        if rule["space_uuid"]:
+            scope = (
+                'FROM "frame_space" fs JOIN "frame" f ON f.uuid = fs.frame_id '
+                "WHERE fs.space_id = ?"
+            )
+            params.append(rule["space_uuid"])
+        else:
+            scope = 'FROM "frame" f WHERE 1'
+        if rule["name"]:
+            scope += " AND f.name = ?"
+            params.append(rule["name"])
+        return scope, params
+
+    async def _delete(self, rule: dict, where: str, params: list) -> None:
+        """Delete matching frames, or their links to the rule space, in batches."""
+        connection = Tortoise.get_connection("default")
+        in_space = bool(rule["space_uuid"])
+        columns = "fs.rowid AS link, f.uuid" if in_space else "f.uuid"
+        while True:
+            rows = await connection.execute_query_dict(
+                f"SELECT {columns} {where} LIMIT ?", [*params, self.batch_size]
+            )
+            if not rows:
+                return
+            frame_uuids = [row["uuid"] for row in rows]
+            marks = ", ".join("?" * len(rows))
+            if in_space:
+                await connection.execute_query(
+                    f'DELETE FROM "frame_space" WHERE rowid IN ({marks})',
+                    [row["link"] for row in rows],
+                )
+                self._stats["space_links_deleted"] += len(rows)
+                # Frames left without a space can no longer be reached
+                # Changes made by the search index triggers are counted too,
+                # count the deleted rows instead
+                deleted = await connection.execute_query_dict(
+                    f'DELETE FROM "frame" WHERE uuid IN ({marks}) AND NOT EXISTS '
+                    '(SELECT 1 FROM "frame_space" WHERE frame_id = "frame".uuid) '
+                    "RETURNING uuid",
+                    frame_uuids,
+                )
+                self._stats["frames_deleted"] += len(deleted)
+            else:
+                await connection.execute_query(
+                    f'DELETE FROM "frame" WHERE uuid IN ({marks})', frame_uuids
+                )
+                self._stats["frames_deleted"] += len(rows)
+            await asyncio.sleep(self.pause)
+
+    async def _archive(self) -> None:
+        """Move frames older than archive_after seconds to the archive."""
+        if not self.archive_after or self.api.archive is None:
+            return
+        before = datetime.now(timezone.utc) - timedelta(seconds=self.archive_after)
+        self._stats["frames_archived"] += await self.api.archive.archive(
+            before, batch_size=self.batch_size, pause=self.pause
+        )
+
+    async def _remove_orphans(self) -> None:
+        """Delete frame_space rows whose frame or space no longer exists."""
+        connection = Tortoise.get_connection("default")
+        while True:
+            rows = await connection.execute_query_dict(
+                'SELECT fs.rowid AS link FROM "frame_space" fs '
+                'WHERE NOT EXISTS (SELECT 1 FROM "frame" WHERE uuid = fs.frame_id) '
+                'OR NOT EXISTS (SELECT 1 FROM "space" WHERE uuid = fs.space_id) '
+                "LIMIT ?",
+                [self.batch_size],
+            )
+            if not rows:
+                return
+            marks = ", ".join("?" * len(rows))
+            await connection.execute_query(
+                f'DELETE FROM "frame_space" WHERE rowid IN ({marks})',
+                [row["link"] for row in rows],
+            )
+            self._stats["orphans_deleted"] += len(rows)
+            await asyncio.sleep(self.pause)
+
+    async def vacuum_full(self) -> None:
+        """
+        Rebuild the database with incremental auto_vacuum.
+
+        Blocks every other connection until it is done, for offline use.
+        """
+        connection = Tortoise.get_connection("default")
+        await connection.execute_script("PRAGMA auto_vacuum = INCREMENTAL")
+        await connection.execute_script("VACUUM")
+        await connection.execute_script(FRAME_SEARCH_REBUILD)
+
+    async def _vacuum(self) -> None:
+        """Return free pages to the file system, if auto_vacuum is incremental."""
+        connection = Tortoise.get_connection("default")
+        rows = await connection.execute_query_dict("PRAGMA auto_vacuum")
+        if rows[0]["auto_vacuum"] != AUTO_VACUUM_INCREMENTAL:
+            self.log.debug("Skipping vacuum: auto_vacuum is not incremental")
+            return
+        free = await self._free_pages()
+        while free:
+            pages = min(free, self.vacuum_pages)
+            # A prepared statement frees one page per step, a script runs to the end
+            await connection.execute_script(f"PRAGMA incremental_vacuum({pages})")
+            remaining = await self._free_pages()
+            if remaining >= free:
+                return
+            self._stats["pages_vacuumed"] += free - remaining
+            free = remaining
+            await asyncio.sleep(self.pause)
+
+    @staticmethod
+    async def _free_pages() -> int:
+        """Get the number of unused pages in the database file."""
+        connection = Tortoise.get_connection("default")
+        rows = await connection.execute_query_dict("PRAGMA freelist_count")
+        return rows[0]["freelist_count"]
+
+
+compactor = Compactor(api)
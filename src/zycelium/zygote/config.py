@@ -18,5 +18,37 @@ class AppConfig:
     tls_cert_path: str = "cert.pem"
     tls_key_path: str = "key.pem"
 
+    ingest_durability: str = "async"
+    ingest_batch_size: int = 100
+    ingest_batch_interval: float = 0.05
+    ingest_queue_size: int = 10000
+    ingest_retries: int = 3
+    ingest_retry_backoff: float = 0.1
+
+    replay_batch_size: int = 100
+
+    db_profile: str = "tuned"
+    db_synchronous: str = "NORMAL"
+    db_mmap_size: int = 268435456
+    db_cache_size: int = -65536
+    db_busy_timeout: int = 5000
+    db_readers: int = 4
+
+    compact_interval: float = 3600.0
+    compact_batch_size: int = 500
+    archive_after: float = 0.0
+
+    restart_backoff: float = 0.5
+    restart_max_backoff: float = 30.0
+    restart_max: int = 5
+    restart_window: float = 60.0
+
+    agent_packing: str = "process"
+    agent_host_size: int = 0
+    agent_isolate: str = ""
+    agent_start_method: str = "forkserver"
+    agent_preload: str = ""
+    shutdown_timeout: float = 10.0
+
 
 app_config = AppConfig()
@@ -0,0 +1,69 @@
+"""
+Delivery cursors of agents.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from zycelium.zygote.api import ZygoteAPI
+from zycelium.zygote.logging import get_logger
+
+
+def _key(time: datetime, frame_uuid: Optional[str]) -> tuple:
+    """Sort key of a frame, matching the order of `ZygoteAPI.get_frames_since`."""
+    return (time, frame_uuid or "")
+
+
+class DeliveryCursors:
+    """
+    Track the last frame each agent acknowledged.
+
+    A cursor is the (time, uuid) of a frame, frames after it are replayed
+    when the agent reconnects. Acknowledgements only move a cursor forward
+    and are kept in memory until `save` writes them to the database.
+    """
+
+    def __init__(self, zygote_api: ZygoteAPI):
+        self.api = zygote_api
+        self.log = get_logger("zygote.delivery")
+        self._cursors = {}  # type: dict[str, tuple[datetime, Optional[str]]]
+        self._dirty = set()  # type: set[str]
+
+    async def load(self, agent_uuid: str) -> tuple:
+        """Get cursor of agent, agents without one start at the current time."""
+        cursor = self._cursors.get(agent_uuid)
+        if cursor is not None:
+            return cursor
+        result = await self.api.get_delivery_cursor(agent_uuid)
+        if result.get("time") is None:
+            cursor = (datetime.now(timezone.utc), None)
+            self._dirty.add(agent_uuid)
+        else:
+            cursor = (result["time"], result["uuid"])
+        self._cursors[agent_uuid] = cursor
+        return cursor
+
+    def ack(self, agent_uuid: str, time: datetime, frame_uuid: str) -> bool:
+        """Move cursor of agent to frame, unless it is already past it."""
+        cursor = self._cursors.get(agent_uuid)
+        if cursor is not None and _key(time, frame_uuid) <= _key(*cursor):
+            return False
+        self._cursors[agent_uuid] = (time, frame_uuid)
+        self._dirty.add(agent_uuid)
+        return True
+
+    def forget(self, agent_uuid: str) -> None:
+        """Drop cursor of a deleted agent."""
+        self._cursors.pop(agent_uuid, None)
+        self._dirty.discard(agent_uuid)
+
+    async def save(self, agent_uuid: Optional[str] = None) -> None:
+        """Write changed cursors, or the cursor of one agent, to the database."""
+        agent_uuids = [agent_uuid] if agent_uuid is not None else list(self._dirty)
+        for dirty_uuid in agent_uuids:
+            if dirty_uuid not in self._dirty:
+                continue
+            self._dirty.discard(dirty_uuid)
+            time, frame_uuid = self._cursors[dirty_uuid]
+            result = await self.api.set_delivery_cursor(dirty_uuid, time, frame_uuid)
+            if result.get("success") is False:
+                self.log.error("Failed to save delivery cursor of %s", dirty_uuid)
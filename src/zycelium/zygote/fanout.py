@@ -0,0 +1,105 @@
+"""
+Frame fan-out to connected agents.
+"""
+from typing import Iterable, Optional
+
+from socketio import packet
+
+from zycelium.zygote.routing import RoutingRegistry
+from zycelium.zygote.subscriptions import SubscriptionIndex
+
+
+class FanOut:
+    """
+    Deliver a frame once to every agent in its target spaces.
+
+    The socket.io packet is encoded once per frame instead of once per
+    recipient, and agents in more than one target space get it only once.
+    With a subscription index, only agents subscribed to the frame get it.
+    """
+
+    def __init__(
+        self,
+        sio,
+        routes: RoutingRegistry,
+        subscriptions: Optional[SubscriptionIndex] = None,
+        namespace: str = "/",
+    ):
+        self.sio = sio
+        self.routes = routes
+        self.subscriptions = subscriptions
+        self.namespace = namespace
+        self._stats = {
+            "frames": 0,
+            "deliveries": 0,
+            "duplicates_suppressed": 0,
+            "filtered": 0,
+            "encodes_saved": 0,
+            "bytes_saved": 0,
+        }
+
+    def recipients(self, space_uuids: Iterable[str], name: Optional[str] = None) -> set:
+        """Get the union of sids in spaces, subscribed to frame name if given."""
+        sids = self._union(space_uuids)[0]
+        if name is not None and self.subscriptions is not None:
+            sids &= self.subscriptions.match(name)
+        return sids
+
+    async def deliver(
+        self,
+        event: str,
+        data: dict,
+        space_uuids: Iterable[str],
+        name: Optional[str] = None,
+    ) -> int:
+        """
+        Send event to every agent in spaces once, return the recipient count.
+
+        With a frame name, agents not subscribed to it are skipped.
+        """
+        sids, duplicates = self._union(space_uuids)
+        self._stats["frames"] += 1
+        self._stats["duplicates_suppressed"] += duplicates
+        if sids and name is not None and self.subscriptions is not None:
+            subscribed = sids & self.subscriptions.match(name)
+            self._stats["filtered"] += len(sids) - len(subscribed)
+            sids = subscribed
+        if not sids:
+            return 0
+
+        pkt = self.sio.packet_class(
+            packet.EVENT, namespace=self.namespace, data=[event, data]
+        )
+        encoded = pkt.encode()
+        if isinstance(encoded, list):
+            # Binary attachments, let socket.io handle them
+            for sid in sids:
+                await self.sio.emit(event, data, to=sid, namespace=self.namespace)
+            self._stats["deliveries"] += len(sids)
+            return len(sids)
+
+        delivered = 0
+        for sid in sids:
+            eio_sid = self.sio.manager.eio_sid_from_sid(sid, self.namespace)
+            if eio_sid is None:
+                continue
+            await self.sio.eio.send(eio_sid, encoded)
+            delivered += 1
+        self._stats["deliveries"] += delivered
+        self._stats["encodes_saved"] += max(delivered - 1, 0)
+        self._stats["bytes_saved"] += duplicates * len(encoded)
+        return delivered
+
+    def _union(self, space_uuids: Iterable[str]) -> tuple:
+        """Get the union of sids in spaces and the number of duplicates."""
+        sids = set()
+        total = 0
+        for space_uuid in space_uuids:
+            space_sids = self.routes.sids_for_space(space_uuid)
+            total += len(space_sids)
+            sids.update(space_sids)
+        return sids, total - len(sids)
+
+    def stats(self) -> dict:
+        """Return fan-out counters."""
+        return dict(self._stats)
@@ -3,6 +3,11 @@ Frame.
 """
 from dataclasses import dataclass, field, asdict
 
+# Socket.io event carrying several frames
+BATCH_EVENT = "frame-batch"
+# Socket.io event acknowledging a delivered frame
+ACK_EVENT = "frame-ack"
+
 
 @dataclass
 class Frame:
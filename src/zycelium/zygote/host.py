@@ -0,0 +1,230 @@
+"""
+Agent hosts, several agents run as tasks of one process.
+
+Hosted agents share the interpreter, imports and event loop of their
+host instead of paying for a process each. An agent that fails or
+stops is restarted by its host without affecting the other agents,
+following a restart policy like supervised processes. Hosts report the
+state of their agents to the supervisor and resume them on its request.
+
+Agents are cancelled when their process is asked to terminate, so they
+flush their outbound frames and run their shutdown handlers before the
+supervisor's deadline.
+"""
+import asyncio
+import importlib
+import signal
+import time
+from collections import deque
+from multiprocessing.connection import Connection
+from typing import Awaitable, Callable, Iterable, Optional
+
+from zycelium.zygote.logging import get_logger
+from zycelium.zygote.supervisor import RestartPolicy
+
+PACKING_STRATEGIES = ("process", "host")
+
+log = get_logger("zygote.host")
+
+
+def pack_agents(
+    names: Iterable[str],
+    strategy: str = "process",
+    host_size: int = 0,
+    isolate: Iterable[str] = (),
+) -> list:
+    """
+    Group agents into processes, return a list of lists of agent names.
+
+    With the "process" strategy every agent gets a process, with "host"
+    agents share processes of up to host_size agents, any number if 0.
+    Agents named in isolate always get a process of their own.
+    """
+    if strategy not in PACKING_STRATEGIES:
+        raise ValueError(
+            f"Unknown packing strategy {strategy!r}, "
+            f"expected one of {', '.join(PACKING_STRATEGIES)}"
+        )
+    if host_size < 0:
+        raise ValueError("host_size must not be negative")
+    names = list(names)
+    isolate = set(isolate)
+    groups = [[name] for name in names if name in isolate]
+    hosted = [name for name in names if name not in isolate]
+    if strategy == "process":
+        return groups + [[name] for name in hosted]
+    size = host_size or len(hosted) or 1
+    return groups + [hosted[i : i + size] for i in range(0, len(hosted), size)]
+
+
+async def run_agent(agent_name: str, url: str, auth: dict) -> None:
+    """Import an agent module and run its agent until it stops."""
+    agent_module = importlib.import_module(agent_name)
+    await agent_module.agent.run(url=url, auth=auth)
+
+
+def on_terminate(callback: Callable[[], None]) -> None:
+    """Call callback when this process receives SIGTERM."""
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, callback)
+    except (NotImplementedError, RuntimeError):
+        # Unsupported on Windows and outside the main thread
+        log.warning("Cannot drain agents on SIGTERM")
+
+
+async def run_until_terminated(coroutine: Awaitable) -> None:
+    """Run an agent coroutine, cancelling it when the process is terminated."""
+    task = asyncio.ensure_future(coroutine)
+    on_terminate(task.cancel)
+    await task
+
+
+async def _run_hosted_agent(
+    agent_name: str,
+    url: str,
+    auth: dict,
+    policy: RestartPolicy,
+    stopping: asyncio.Event,
+    resumed: asyncio.Event,
+    report: Callable[..., None],
+    quarantined: bool = False,
+) -> None:
+    """
+    Run an agent, restarting it when it fails or stops.
+
+    A quarantined agent waits until it is resumed, so its host keeps
+    running and its quarantine outlives the other agents.
+    """
+    exits = deque()  # type: deque[float]
+    restarts = 0
+    while True:
+        if quarantined:
+            report(agent_name, "quarantined", restarts, len(exits))
+            await resumed.wait()
+            log.info("Resuming hosted agent %s", agent_name)
+            exits.clear()
+        resumed.clear()
+        report(agent_name, "running", restarts, len(exits))
+        try:
+            log.info("Starting hosted agent %s", agent_name)
+            await run_agent(agent_name, url, auth)
+            log.warning("Hosted agent %s stopped", agent_name)
+        except Exception as exc:  # pylint: disable=broad-except
+            log.error("Hosted agent %s failed", agent_name, exc_info=exc)
+        if stopping.is_set():
+            return
+        now = time.monotonic()
+        exits.append(now)
+        while exits[0] < now - policy.window:
+            exits.popleft()
+        quarantined = len(exits) > policy.max_restarts
+        if quarantined:
+            log.error(
+                "Hosted agent %s quarantined after %s exits in %ss",
+                agent_name,
+                len(exits),
+                policy.window,
+            )
+            continue
+        delay = policy.delay(len(exits))
+        if delay > 0:
+            report(agent_name, "backoff", restarts, len(exits))
+            try:
+                await asyncio.wait_for(resumed.wait(), delay)
+                exits.clear()
+            except asyncio.TimeoutError:
+                pass
+        restarts += 1
+
+
+async def run_hosted(
+    agents: dict,
+    url: str,
+    policy: Optional[RestartPolicy] = None,
+    channel: Optional[Connection] = None,
+    quarantined: Iterable[str] = (),
+) -> None:
+    """
+    Run agents as tasks of this process, agents maps names to auth.
+
+    The state of every agent is sent over channel as it changes, and
+    ("resume", name) received on it resumes a quarantined or backing off
+    agent. Agents named in quarantined start quarantined. Returns once
+    every agent has drained after the process received SIGTERM.
+    """
+    policy = policy or RestartPolicy()
+    quarantined = set(quarantined)
+    stopping = asyncio.Event()
+    resumed = {agent_name: asyncio.Event() for agent_name in agents}
+
+    def report(agent_name: str, state: str, restarts: int, recent_exits: int) -> None:
+        if channel is None:
+            return
+        try:
+            channel.send(
+                {
+                    "name": agent_name,
+                    "state": state,
+                    "restarts": restarts,
+                    "recent_exits": recent_exits,
+                }
+            )
+        except OSError:
+            log.warning("Cannot report state of hosted agent %s", agent_name)
+
+    loop = asyncio.get_running_loop()
+
+    def on_command() -> None:
+        try:
+            command, agent_name = channel.recv()  # type: ignore
+        except (EOFError, OSError):
+            loop.remove_reader(channel.fileno())  # type: ignore
+            return
+        if command == "resume" and agent_name in resumed:
+            resumed[agent_name].set()
+
+    if channel is not None:
+        loop.add_reader(channel.fileno(), on_command)
+    tasks = [
+        asyncio.create_task(
+            _run_hosted_agent(
+                agent_name,
+                url,
+                auth,
+                policy,
+                stopping,
+                resumed[agent_name],
+                report,
+                agent_name in quarantined,
+            )
+        )
+        for agent_name, auth in agents.items()
+    ]
+
+    def terminate() -> None:
+        log.info("Draining hosted agents")
+        stopping.set()
+        for task in tasks:
+            task.cancel()
+
+    on_terminate(terminate)
+    try:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        if channel is not None:
+            loop.remove_reader(channel.fileno())
+
+
+def host_agents(
+    agents: dict,
+    url: str,
+    restart_policy: Optional[RestartPolicy] = None,
+    channel: Optional[Connection] = None,
+    quarantined: Iterable[str] = (),
+) -> None:
+    """Start an agent host, agents maps names to auth."""
+    log.info("Starting agent host for %s", ", ".join(agents))
+    try:
+        asyncio.run(run_hosted(agents, url, restart_policy, channel, quarantined))
+    except Exception as exc:  # pylint: disable=broad-except
+        log.exception(exc)
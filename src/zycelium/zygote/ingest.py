@@ -0,0 +1,238 @@
+"""
+Write-behind frame ingest.
+"""
+import asyncio
+from typing import Optional
+
+from zycelium.zygote.api import ZygoteAPI, api
+from zycelium.zygote.logging import get_logger
+
+DURABILITY_MODES = ("async", "sync")
+
+
+class FrameWriter:
+    """
+    Queue frames and commit them to the database in batches.
+
+    In "async" durability mode `submit` returns as soon as the frame is queued,
+    in "sync" mode it waits until the batch holding the frame is committed.
+
+    A failed batch is retried up to `retries` times, waiting `retry_backoff`
+    seconds and twice as long before each further retry. A batch that still
+    fails is written a frame at a time, so only frames that cannot be
+    written are dropped.
+    """
+
+    def __init__(self, zygote_api: ZygoteAPI):
+        self.api = zygote_api
+        self.log = get_logger("zygote.ingest")
+        self.durability = "async"
+        self.batch_size = 100
+        self.batch_interval = 0.05
+        self.retries = 3
+        self.retry_backoff = 0.1
+        self._queue = None  # type: Optional[asyncio.Queue]
+        self._task = None  # type: Optional[asyncio.Task]
+        # Frames put in the queue and frames taken out and processed, in order
+        self._enqueued = 0
+        self._processed = 0
+        self._waiters = []  # type: list[tuple[int, asyncio.Future]]
+        self._stats = {
+            "queued": 0,
+            "written": 0,
+            "failed": 0,
+            "batches": 0,
+            "retries": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        """Return True if the background writer is running."""
+        return self._task is not None and not self._task.done()
+
+    async def start(
+        self,
+        durability: str = "async",
+        batch_size: int = 100,
+        batch_interval: float = 0.05,
+        queue_size: int = 10000,
+        retries: int = 3,
+        retry_backoff: float = 0.1,
+    ) -> None:
+        """Start the background writer."""
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if retries < 0:
+            raise ValueError("retries must not be negative")
+        self.durability = durability
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._enqueued = self._processed = 0
+        self._task = asyncio.get_running_loop().create_task(self._writer_loop())
+        self.log.info(
+            "Started frame writer: durability=%s, batch_size=%s, batch_interval=%s",
+            durability,
+            batch_size,
+            batch_interval,
+        )
+
+    async def stop(self) -> None:
+        """Flush queued frames and stop the background writer."""
+        if not self.running:
+            return
+        await self.flush()
+        self._task.cancel()  # type: ignore
+        try:
+            await self._task  # type: ignore
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.log.info("Stopped frame writer: %s", self.stats())
+
+    async def flush(self) -> None:
+        """
+        Wait until every frame queued so far is committed.
+
+        Frames queued meanwhile are not waited for, so a flush ends even
+        while frames keep arriving.
+        """
+        if self._queue is None or not self.running:
+            return
+        if self._processed >= self._enqueued:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((self._enqueued, future))
+        await future
+
+    async def submit(self, **frame) -> None:
+        """
+        Queue a frame for writing, takes the frame keys of `ZygoteAPI.create_frames`.
+
+        Blocks while the queue is full.
+        """
+        if not self.running:
+            await self._commit([(frame, None)])
+            return
+
+        future = None
+        if self.durability == "sync":
+            future = asyncio.get_running_loop().create_future()
+        await self._queue.put((frame, future))  # type: ignore
+        self._enqueued += 1
+        self._stats["queued"] += 1
+        if future is not None:
+            await future
+
+    async def submit_many(self, frames: list) -> None:
+        """Queue frames for writing, in order."""
+        if not frames:
+            return
+        if not self.running:
+            await self._commit([(frame, None) for frame in frames])
+            return
+
+        futures = []
+        for frame in frames:
+            future = None
+            if self.durability == "sync":
+                future = asyncio.get_running_loop().create_future()
+                futures.append(future)
+            await self._queue.put((frame, future))  # type: ignore
+            self._enqueued += 1
+            self._stats["queued"] += 1
+        if futures:
+            await asyncio.gather(*futures)
+
+    def stats(self) -> dict:
+        """Return writer counters."""
+        pending = self._queue.qsize() if self._queue is not None else 0
+        return {**self._stats, "pending": pending}
+
+    async def _writer_loop(self) -> None:
+        """Collect frames into batches and commit them."""
+        loop = asyncio.get_running_loop()
+        queue = self._queue  # type: asyncio.Queue  # type: ignore
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.batch_interval
+            while len(batch) < self.batch_size:
+                if queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(queue.get_nowait())
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+                self._processed += len(batch)
+                self._wake_flushes()
+
+    def _wake_flushes(self) -> None:
+        """Resolve flushes waiting for frames that are now processed."""
+        waiting = []
+        for target, future in self._waiters:
+            if target > self._processed:
+                waiting.append((target, future))
+            elif not future.done():
+                future.set_result(None)
+        self._waiters = waiting
+
+    async def _commit(self, batch: list) -> None:
+        """Write a batch of frames in one transaction, retrying failures."""
+        error = await self._write(batch, self.retries)
+        if error is None:
+            return
+        if len(batch) == 1:
+            self._fail(batch, error)
+            return
+        self.log.warning("Writing %s frames one at a time", len(batch))
+        for item in batch:
+            error = await self._write([item], 0)
+            if error is not None:
+                self._fail([item], error)
+
+    async def _write(self, batch: list, retries: int) -> Optional[Exception]:
+        """Write frames in one transaction, return the last error if it failed."""
+        error = None  # type: Optional[Exception]
+        for attempt in range(retries + 1):
+            if attempt:
+                self._stats["retries"] += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                result = await self.api.create_frames([frame for frame, _ in batch])
+                if result.get("success") is False:
+                    raise RuntimeError("create_frames failed")
+            except Exception as exc:  # pylint: disable=broad-except
+                error = exc
+                self.log.warning("Failed to write %s frames: %s", len(batch), exc)
+                continue
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_result(None)
+            return None
+        return error
+
+    def _fail(self, batch: list, error: Exception) -> None:
+        """Drop frames that could not be written."""
+        self._stats["failed"] += len(batch)
+        self.log.error("Failed to write %s frames", len(batch), exc_info=error)
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_exception(error)
+
+
+frame_writer = FrameWriter(api)
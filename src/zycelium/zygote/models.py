@@ -6,6 +6,187 @@ from tortoise.models import Model
 
 from zycelium.zygote.signals import database_init
 
+# Many-to-many tables are created without indexes, index both directions
+THROUGH_TABLE_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS "idx_frame_space_space_frame" '
+    'ON "frame_space" ("space_id", "frame_id")',
+    'CREATE INDEX IF NOT EXISTS "idx_frame_space_frame_space" '
+    'ON "frame_space" ("frame_id", "space_id")',
+    'CREATE INDEX IF NOT EXISTS "idx_agent_space_agent_space" '
+    'ON "agent_space" ("agent_id", "space_id")',
+    'CREATE INDEX IF NOT EXISTS "idx_agent_space_space_agent" '
+    'ON "agent_space" ("space_id", "agent_id")',
+)
+
+# Words of a frame for full-text search, the keys and values in its data
+_FRAME_TEXT = (
+    "(SELECT group_concat(CASE WHEN typeof(key) = 'text' THEN key || ' ' ELSE '' END "
+    "|| coalesce(atom, ''), ' ') FROM json_tree(CASE WHEN json_valid({row}.data) "
+    "THEN {row}.data ELSE '{{}}' END))"
+)
+
+# Full-text index of frames, kept in step with the frame table by triggers.
+# Rows are keyed on the frame uuid, VACUUM may renumber frame rowids.
+FRAME_SEARCH = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS "frame_search" USING fts5(name, text, uuid UNINDEXED);
+CREATE TRIGGER IF NOT EXISTS "frame_search_insert" AFTER INSERT ON "frame" BEGIN
+    INSERT INTO "frame_search" (name, text, uuid)
+    VALUES (new.name, {_FRAME_TEXT.format(row="new")}, new.uuid);
+END;
+CREATE TRIGGER IF NOT EXISTS "frame_search_delete" AFTER DELETE ON "frame" BEGIN
+    DELETE FROM "frame_search" WHERE uuid = old.uuid;
+END;
+CREATE TRIGGER IF NOT EXISTS "frame_search_update"
+AFTER UPDATE OF name, data ON "frame" BEGIN
+    DELETE FROM "frame_search" WHERE uuid = old.uuid;
+    INSERT INTO "frame_search" (name, text, uuid)
+    VALUES (new.name, {_FRAME_TEXT.format(row="new")}, new.uuid);
+END;
+"""
+
+# Drop an index keyed on frame rowids, made before frame uuids were stored
+FRAME_SEARCH_DROP = """
+DROP TRIGGER IF EXISTS "frame_search_insert";
+DROP TRIGGER IF EXISTS "frame_search_delete";
+DROP TRIGGER IF EXISTS "frame_search_update";
+DROP TABLE IF EXISTS "frame_search";
+"""
+
+# Index every frame again
+FRAME_SEARCH_REBUILD = f"""
+DELETE FROM "frame_search";
+INSERT INTO "frame_search" (name, text, uuid)
+SELECT name, {_FRAME_TEXT.format(row='"frame"')}, uuid FROM "frame";
+"""
+
+# Values of indexed data fields, see FieldIndex, kept in step by triggers
+_FIELD_VALUES = """
+    SELECT fi.uuid, {row}.uuid, json_extract({row}.data, '$.' || fi.path), {row}.time
+    FROM {source} WHERE fi.name = {row}.name
+    AND CASE WHEN json_valid({row}.data) THEN json_type({row}.data, '$.' || fi.path) END
+    IN ('integer', 'real', 'text', 'true', 'false')"""
+
+FRAME_FIELDS = f"""
+CREATE TABLE IF NOT EXISTS "frame_field" (
+    "field_id" CHAR(36) NOT NULL,
+    "frame_id" CHAR(36) NOT NULL,
+    "value",
+    "time" TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "idx_frame_field_time"
+ON "frame_field" ("field_id", "time", "frame_id");
+CREATE INDEX IF NOT EXISTS "idx_frame_field_value" ON "frame_field" ("field_id", "value");
+CREATE INDEX IF NOT EXISTS "idx_frame_field_frame" ON "frame_field" ("frame_id");
+CREATE TRIGGER IF NOT EXISTS "frame_field_insert" AFTER INSERT ON "frame" BEGIN
+    INSERT INTO "frame_field"{_FIELD_VALUES.format(row="new", source='"field_index" fi')};
+END;
+CREATE TRIGGER IF NOT EXISTS "frame_field_delete" AFTER DELETE ON "frame" BEGIN
+    DELETE FROM "frame_field" WHERE frame_id = old.uuid;
+END;
+CREATE TRIGGER IF NOT EXISTS "frame_field_update"
+AFTER UPDATE OF name, data, time ON "frame" BEGIN
+    DELETE FROM "frame_field" WHERE frame_id = old.uuid;
+    INSERT INTO "frame_field"{_FIELD_VALUES.format(row="new", source='"field_index" fi')};
+END;
+"""
+
+# Index the values of one field, the parameter, in existing frames
+FRAME_FIELDS_BACKFILL = (
+    'INSERT INTO "frame_field"'
+    + _FIELD_VALUES.format(row='"frame"', source='"field_index" fi, "frame"')
+    + " AND fi.uuid = ?"
+)
+
+# Bucket sizes in seconds of rollups, minute, hour and day
+ROLLUP_RESOLUTIONS = (60, 3600, 86400)
+
+# Add a numeric field value to the buckets of its time at every resolution
+_ROLLUP_UPSERT = f"""
+INSERT INTO "field_rollup"
+SELECT {{row}}.field_id, r.resolution,
+    CAST(strftime('%s', {{row}}.time) AS INTEGER) / r.resolution * r.resolution,
+    1, {{row}}.value, {{row}}.value, {{row}}.value, {{row}}.value, {{row}}.time
+FROM (
+    {" UNION ALL ".join(f"SELECT {size} AS resolution" for size in ROLLUP_RESOLUTIONS)}
+) r{{join}} WHERE typeof({{row}}.value) IN ('integer', 'real')
+ON CONFLICT ("field_id", "resolution", "bucket") DO UPDATE SET
+    "count" = "count" + 1,
+    "min" = min("min", excluded."min"),
+    "max" = max("max", excluded."max"),
+    "sum" = "sum" + excluded."sum",
+    "last" = CASE WHEN excluded."last_time" >= "last_time"
+        THEN excluded."last" ELSE "last" END,
+    "last_time" = max("last_time", excluded."last_time")"""
+
+# Numeric values of the other frames in the bucket of a rollup
+_BUCKET_VALUES = """FROM "frame_field" s WHERE s.field_id = "field_rollup".field_id
+            AND s.frame_id != old.uuid AND typeof(s.value) IN ('integer', 'real')
+            AND CAST(strftime('%s', s.time) AS INTEGER) / "field_rollup".resolution
+                * "field_rollup".resolution = "field_rollup".bucket"""
+
+# Take the field values of a frame about to change out of its buckets,
+# they are added back as they are indexed again. Min, max and last are
+# found again from the other values when the frame held them, unless
+# frames of the bucket were deleted since, then they are kept. Emptied
+# buckets are dropped.
+_ROLLUP_RETRACT = f"""
+UPDATE "field_rollup" SET
+    "count" = "field_rollup"."count" - 1,
+    "sum" = "field_rollup"."sum" - ff.value,
+    "min" = CASE WHEN "field_rollup"."count" = 1 OR ff.value > "field_rollup"."min" THEN "field_rollup"."min"
+        WHEN (SELECT count(*) {_BUCKET_VALUES}) < "field_rollup"."count" - 1 THEN "field_rollup"."min"
+        ELSE (SELECT min(s.value) {_BUCKET_VALUES}) END,
+    "max" = CASE WHEN "field_rollup"."count" = 1 OR ff.value < "field_rollup"."max" THEN "field_rollup"."max"
+        WHEN (SELECT count(*) {_BUCKET_VALUES}) < "field_rollup"."count" - 1 THEN "field_rollup"."max"
+        ELSE (SELECT max(s.value) {_BUCKET_VALUES}) END,
+    "last" = CASE WHEN "field_rollup"."count" = 1 OR ff.time != "field_rollup"."last_time" THEN "field_rollup"."last"
+        WHEN (SELECT count(*) {_BUCKET_VALUES}) < "field_rollup"."count" - 1 THEN "field_rollup"."last"
+        ELSE (SELECT s.value {_BUCKET_VALUES} ORDER BY s.time DESC LIMIT 1) END,
+    "last_time" = CASE WHEN "field_rollup"."count" = 1 OR ff.time != "field_rollup"."last_time" THEN "field_rollup"."last_time"
+        WHEN (SELECT count(*) {_BUCKET_VALUES}) < "field_rollup"."count" - 1 THEN "field_rollup"."last_time"
+        ELSE (SELECT max(s.time) {_BUCKET_VALUES}) END
+FROM (
+    SELECT ff.field_id, ff.value, ff.time, r.resolution,
+        CAST(strftime('%s', ff.time) AS INTEGER) / r.resolution * r.resolution
+        AS bucket
+    FROM "frame_field" ff, (
+        {" UNION ALL ".join(f"SELECT {size} AS resolution" for size in ROLLUP_RESOLUTIONS)}
+    ) r
+    WHERE ff.frame_id = old.uuid AND typeof(ff.value) IN ('integer', 'real')
+) ff
+WHERE "field_rollup".field_id = ff.field_id AND "field_rollup".resolution = ff.resolution
+    AND "field_rollup".bucket = ff.bucket;
+DELETE FROM "field_rollup" WHERE "count" = 0 AND field_id IN (
+    SELECT field_id FROM "frame_field" WHERE frame_id = old.uuid
+);"""
+
+# Count, min, max, sum and last value of numeric fields per time bucket.
+# Deleting frames leaves rollups as they are, they keep history of
+# frames deleted later. Changed frames are taken out and added again.
+FIELD_ROLLUPS = f"""
+CREATE TABLE IF NOT EXISTS "field_rollup" (
+    "field_id" CHAR(36) NOT NULL,
+    "resolution" INT NOT NULL,
+    "bucket" INT NOT NULL,
+    "count" INT NOT NULL,
+    "min" REAL NOT NULL,
+    "max" REAL NOT NULL,
+    "sum" REAL NOT NULL,
+    "last" REAL NOT NULL,
+    "last_time" TIMESTAMP NOT NULL,
+    PRIMARY KEY ("field_id", "resolution", "bucket")
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS "field_rollup_insert" AFTER INSERT ON "frame_field"
+BEGIN{_ROLLUP_UPSERT.format(row="new", join="")};
+END;
+CREATE TRIGGER IF NOT EXISTS "field_rollup_retract"
+BEFORE UPDATE OF name, data, time ON "frame" BEGIN{_ROLLUP_RETRACT}
+END;
+"""
+
+# Roll up every indexed value, for databases created before rollups
+FIELD_ROLLUPS_REBUILD = _ROLLUP_UPSERT.format(row="ff", join=', "frame_field" ff')
+
 
 async def init_db(db_url: str):
     """Initialize database"""
@@ -16,6 +197,25 @@ async def init_db(db_url: str):
         modules={"models": ["zycelium.zygote.models"]},
     )
     await Tortoise.generate_schemas()
+    connection = Tortoise.get_connection("default")
+    for statement in THROUGH_TABLE_INDEXES:
+        await connection.execute_script(statement)
+    indexed = await connection.execute_query_dict(
+        "SELECT sql FROM sqlite_master WHERE name = 'frame_search'"
+    )
+    if indexed and "uuid" not in indexed[0]["sql"]:
+        await connection.execute_script(FRAME_SEARCH_DROP)
+        indexed = []
+    rolled_up = await connection.execute_query_dict(
+        "SELECT 1 FROM sqlite_master WHERE name = 'field_rollup'"
+    )
+    await connection.execute_script(FRAME_SEARCH)
+    await connection.execute_script(FRAME_FIELDS)
+    await connection.execute_script(FIELD_ROLLUPS)
+    if not indexed:
+        await connection.execute_script(FRAME_SEARCH_REBUILD)
+    if not rolled_up:
+        await connection.execute_script(FIELD_ROLLUPS_REBUILD)
     await database_init.send(f"db_init: {db_url}")
 
 
@@ -23,11 +223,11 @@ class Frame(Model):
     """Frame model"""
 
     uuid = fields.UUIDField(pk=True, index=True)
-    kind = fields.CharField(max_length=16, index=True, default="event")
-    name = fields.CharField(max_length=64, index=True, null=False)
+    kind = fields.CharField(max_length=16, default="event")
+    name = fields.CharField(max_length=64, null=False)
     data = fields.JSONField(default={})
     meta = fields.JSONField(default={})
-    time = fields.DatetimeField(auto_now_add=True, index=True)
+    time = fields.DatetimeField(auto_now_add=True)
     agent = fields.ForeignKeyField("models.Agent", related_name="frames", null=True)
 
     def __str__(self) -> str:
@@ -38,6 +238,14 @@ class Frame(Model):
 
         table = "frame"
         ordering = ["-time"]
+        # Frames are listed newest first by (time, uuid), on their own
+        # or filtered by name, agent or kind
+        indexes = (
+            ("time", "uuid"),
+            ("name", "time", "uuid"),
+            ("agent_id", "time", "uuid"),
+            ("kind", "time", "uuid"),
+        )
 
 
 class Space(Model):
@@ -106,6 +314,69 @@ class AuthToken(Model):
         ordering = ["-created_at"]
 
 
+class DeliveryCursor(Model):
+    """DeliveryCursor model, the last frame an agent acknowledged"""
+
+    uuid = fields.UUIDField(pk=True, index=True)
+    agent = fields.OneToOneField(
+        "models.Agent", related_name="cursor", on_delete=fields.CASCADE
+    )
+    frame_uuid = fields.UUIDField(null=True)
+    frame_time = fields.DatetimeField(null=True)
+    updated_at = fields.DatetimeField(auto_now=True, index=True)
+
+    def __str__(self) -> str:
+        return f"{self.frame_time}"
+
+    class Meta:
+        """Meta class"""
+
+        table = "delivery_cursor"
+
+
+class RetentionRule(Model):
+    """RetentionRule model, limits the age and number of stored frames"""
+
+    uuid = fields.UUIDField(pk=True, index=True)
+    name = fields.CharField(max_length=64, null=True)
+    space = fields.ForeignKeyField(
+        "models.Space", related_name="retention_rules", null=True
+    )
+    max_age = fields.IntField(null=True)
+    max_count = fields.IntField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True, index=True)
+    updated_at = fields.DatetimeField(auto_now=True, index=True)
+
+    def __str__(self) -> str:
+        return f"{self.name or '*'}@{self.space_id or '*'}"  # type: ignore
+
+    class Meta:
+        """Meta class"""
+
+        table = "retention_rule"
+        ordering = ["created_at"]
+
+
+class FieldIndex(Model):
+    """FieldIndex model, a data field of frames with a name that can be queried"""
+
+    uuid = fields.UUIDField(pk=True, index=True)
+    name = fields.CharField(max_length=64, null=False)
+    path = fields.CharField(max_length=128, null=False)
+    created_at = fields.DatetimeField(auto_now_add=True, index=True)
+    updated_at = fields.DatetimeField(auto_now=True, index=True)
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.path}"
+
+    class Meta:
+        """Meta class"""
+
+        table = "field_index"
+        ordering = ["name", "path"]
+        unique_together = (("name", "path"),)
+
+
 class FileStore(Model):
     """FileStore model"""
 
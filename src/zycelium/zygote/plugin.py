@@ -6,6 +6,7 @@ import importlib
 import pkgutil
 from typing import Iterable
 
+from zycelium.zygote.host import run_until_terminated
 from zycelium.zygote.logging import get_logger
 
 log = get_logger("zygote.plugin")
@@ -40,7 +41,7 @@ def start_agent(agent_name: str, url: str, auth: dict) -> None:
     agent_module = importlib.import_module(agent_name)
     try:
         log.info("Starting agent %s", agent_name)
-        asyncio.run(agent_module.agent.run(url=url, auth=auth))
+        asyncio.run(run_until_terminated(agent_module.agent.run(url=url, auth=auth)))
     except Exception as exc:  # pylint: disable=broad-except
         log.exception(exc)
     log.info("Started agent %s", agent_name)
@@ -0,0 +1,89 @@
+"""
+Downsampling of field rollups.
+
+Windows are combined with NumPy if it is installed, in Python otherwise.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from zycelium.zygote.models import ROLLUP_RESOLUTIONS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def source_resolution(window: int) -> Optional[int]:
+    """Get the coarsest rollup windows can be built from, None for raw values."""
+    for resolution in sorted(ROLLUP_RESOLUTIONS, reverse=True):
+        if window % resolution == 0:
+            return resolution
+    return None
+
+
+def combine(rows: list, window: int) -> list:
+    """
+    Merge rows into windows of window seconds, aligned to the epoch.
+
+    Rows are (bucket, count, min, max, sum, last) in bucket order,
+    bucket is the start of a rollup bucket or the time of a raw value
+    in seconds since the epoch.
+    """
+    if window < 1:
+        raise ValueError("window must be at least 1 second")
+    if not rows:
+        return []
+    if numpy is not None:
+        return _combine_numpy(rows, window)
+    return _combine_python(rows, window)
+
+
+def _window(start: float, count, low, high, total, last) -> dict:
+    """Get a window as a dict."""
+    return {
+        "time": datetime.fromtimestamp(start, timezone.utc),
+        "count": int(count),
+        "min": float(low),
+        "max": float(high),
+        "sum": float(total),
+        "mean": float(total) / int(count),
+        "last": float(last),
+    }
+
+
+def _combine_python(rows: list, window: int) -> list:
+    """Merge rows one at a time."""
+    windows = []
+    current = None
+    for bucket, count, low, high, total, last in rows:
+        start = bucket // window * window
+        if current is None or current[0] != start:
+            if current is not None:
+                windows.append(_window(*current))
+            current = [start, count, low, high, total, last]
+        else:
+            current[1] += count
+            current[2] = min(current[2], low)
+            current[3] = max(current[3], high)
+            current[4] += total
+            current[5] = last
+    windows.append(_window(*current))  # type: ignore
+    return windows
+
+
+def _combine_numpy(rows: list, window: int) -> list:
+    """Merge rows with one reduction per column."""
+    table = numpy.array(rows, dtype=numpy.float64)
+    starts = table[:, 0] // window * window
+    first = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(starts)) + 1))
+    last = numpy.concatenate((first[1:], [len(table)])) - 1
+    columns = (
+        starts[first],
+        numpy.add.reduceat(table[:, 1], first),
+        numpy.minimum.reduceat(table[:, 2], first),
+        numpy.maximum.reduceat(table[:, 3], first),
+        numpy.add.reduceat(table[:, 4], first),
+        table[last, 5],
+    )
+    return [_window(*values) for values in zip(*columns)]
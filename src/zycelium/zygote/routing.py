@@ -0,0 +1,152 @@
+"""
+Routing registry for connected agents.
+"""
+import sys
+from typing import Iterable, Optional
+
+
+class AgentRoute:
+    """Routing entry for one connected agent."""
+
+    __slots__ = ("sid", "uuid", "name", "spaces")
+
+    def __init__(self, sid: str, uuid: str, name: str, spaces: dict):
+        self.sid = sid
+        self.uuid = uuid
+        self.name = name
+        self.spaces = spaces  # space name -> space uuid
+
+    def __repr__(self) -> str:
+        return f"AgentRoute({self.name}, spaces={list(self.spaces)})"
+
+
+class RoutingRegistry:
+    """
+    Index connected agents by sid, agent and space.
+
+    Only names and uuids are kept, strings are interned so that
+    agents in the same spaces share them.
+    """
+
+    def __init__(self):
+        self._routes = {}  # type: dict[str, AgentRoute]
+        self._agent_sids = {}  # type: dict[str, set[str]]
+        self._space_sids = {}  # type: dict[str, set[str]]
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def __contains__(self, sid: str) -> bool:
+        return sid in self._routes
+
+    def __getitem__(self, sid: str) -> AgentRoute:
+        return self._routes[sid]
+
+    def get(self, sid: str) -> Optional[AgentRoute]:
+        """Get route for sid."""
+        return self._routes.get(sid)
+
+    def add(self, sid: str, agent: dict) -> AgentRoute:
+        """Add a connected agent, takes an agent dict from the API."""
+        self.remove(sid)
+        agent_uuid = sys.intern(str(agent["uuid"]))
+        route = AgentRoute(
+            sid=sid,
+            uuid=agent_uuid,
+            name=sys.intern(agent["name"]),
+            spaces={
+                sys.intern(space["name"]): sys.intern(str(space["uuid"]))
+                for space in agent.get("spaces", [])
+            },
+        )
+        self._routes[sid] = route
+        self._agent_sids.setdefault(agent_uuid, set()).add(sid)
+        for space_uuid in route.spaces.values():
+            self._space_sids.setdefault(space_uuid, set()).add(sid)
+        return route
+
+    def remove(self, sid: str) -> Optional[AgentRoute]:
+        """Remove a disconnected agent."""
+        route = self._routes.pop(sid, None)
+        if route is None:
+            return None
+        self._discard(self._agent_sids, route.uuid, sid)
+        for space_uuid in route.spaces.values():
+            self._discard(self._space_sids, space_uuid, sid)
+        return route
+
+    def sids_for_agent(self, agent_uuid: str) -> set:
+        """Get sids connected as agent."""
+        return self._agent_sids.get(str(agent_uuid), set())
+
+    def sids_for_space(self, space_uuid: str) -> set:
+        """Get sids of connected agents in space."""
+        return self._space_sids.get(str(space_uuid), set())
+
+    def resolve(self, sid: str, space_names: Optional[Iterable[str]] = None) -> list:
+        """
+        Get uuids of the spaces a frame from sid goes to.
+
+        Without space names, all spaces the agent joined are used,
+        names of spaces the agent did not join are dropped.
+        """
+        spaces = self._routes[sid].spaces
+        if not space_names:
+            return list(spaces.values())
+        return [spaces[name] for name in space_names if name in spaces]
+
+    def rename_agent(self, agent_uuid: str, name: str) -> None:
+        """Update agent name for connected sids."""
+        name = sys.intern(name)
+        for sid in self.sids_for_agent(agent_uuid):
+            self._routes[sid].name = name
+
+    def join(self, agent_uuid: str, space_uuid: str, space_name: str) -> list:
+        """Add space to connected sids of agent, return the sids."""
+        space_uuid = sys.intern(str(space_uuid))
+        space_name = sys.intern(space_name)
+        sids = list(self.sids_for_agent(agent_uuid))
+        for sid in sids:
+            self._routes[sid].spaces[space_name] = space_uuid
+            self._space_sids.setdefault(space_uuid, set()).add(sid)
+        return sids
+
+    def leave(self, agent_uuid: str, space_uuid: str) -> list:
+        """Remove space from connected sids of agent, return the sids."""
+        space_uuid = str(space_uuid)
+        sids = list(self.sids_for_agent(agent_uuid))
+        for sid in sids:
+            spaces = self._routes[sid].spaces
+            for name in [n for n, u in spaces.items() if u == space_uuid]:
+                del spaces[name]
+            self._discard(self._space_sids, space_uuid, sid)
+        return sids
+
+    def rename_space(self, space_uuid: str, name: str) -> None:
+        """Update space name for connected sids."""
+        space_uuid = str(space_uuid)
+        name = sys.intern(name)
+        for sid in self.sids_for_space(space_uuid):
+            spaces = self._routes[sid].spaces
+            for old in [n for n, u in spaces.items() if u == space_uuid]:
+                del spaces[old]
+            spaces[name] = sys.intern(space_uuid)
+
+    def remove_space(self, space_uuid: str) -> list:
+        """Remove a deleted space, return the sids that were in it."""
+        space_uuid = str(space_uuid)
+        sids = list(self.sids_for_space(space_uuid))
+        for sid in sids:
+            spaces = self._routes[sid].spaces
+            for name in [n for n, u in spaces.items() if u == space_uuid]:
+                del spaces[name]
+        self._space_sids.pop(space_uuid, None)
+        return sids
+
+    @staticmethod
+    def _discard(index: dict, key: str, sid: str) -> None:
+        sids = index.get(key)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del index[key]
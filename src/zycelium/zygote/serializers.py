@@ -0,0 +1,128 @@
+"""
+Conversion of models to response dicts and of responses to JSON.
+
+JSON is encoded with orjson if it is installed, with json otherwise.
+"""
+import json
+from datetime import date
+from typing import AsyncIterable, Optional, Union
+from uuid import UUID
+
+from quart import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def entity_dict(entity) -> dict:
+    """Get an agent or space as a dict."""
+    return {
+        "uuid": str(entity.uuid),
+        "name": entity.name,
+        "data": entity.data,
+        "meta": entity.meta,
+    }
+
+
+def frame_dict(frame) -> dict:
+    """Get a frame without its agent and spaces as a dict."""
+    return {
+        "uuid": str(frame.uuid),
+        "kind": frame.kind,
+        "name": frame.name,
+        "data": frame.data,
+        "meta": frame.meta,
+        "time": frame.time,
+    }
+
+
+class RowConverter:
+    """
+    Convert the rows of one response to dicts.
+
+    Agents and spaces are converted once per converter, frames of the
+    same agent or space share its dict. Results must not be modified.
+    """
+
+    __slots__ = ("_entities",)
+
+    def __init__(self):
+        self._entities = {}  # type: dict
+
+    def entity(self, entity) -> dict:
+        """Get an agent or space as a dict."""
+        entity_uuid = entity.uuid
+        converted = self._entities.get(entity_uuid)
+        if converted is None:
+            converted = self._entities[entity_uuid] = entity_dict(entity)
+        return converted
+
+    def frame(self, frame) -> dict:
+        """Get a frame with its agent and spaces prefetched as a dict."""
+        converted = frame_dict(frame)
+        agent = frame.agent
+        converted["agent"] = self.entity(agent) if agent else None
+        converted["spaces"] = [self.entity(space) for space in frame.spaces]
+        return converted
+
+
+def _default(value):
+    """Encode values json does not know."""
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value) -> bytes:
+    """Encode value as JSON, datetimes as ISO 8601."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Integers over 64 bits and the like, json can encode them
+            pass
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+def loads(value: Union[bytes, str]):
+    """Decode JSON."""
+    if orjson is not None:
+        return orjson.loads(value)
+    return json.loads(value)
+
+
+def json_response(value, status: int = 200) -> Response:
+    """Get a JSON response."""
+    return Response(dumps(value), status=status, mimetype="application/json")
+
+
+async def encode_rows(rows: AsyncIterable, ndjson: bool = False):
+    """
+    Encode rows one at a time, as a JSON array or as lines of NDJSON.
+
+    Only the row being encoded is held in memory.
+    """
+    if ndjson:
+        async for row in rows:
+            yield dumps(row) + b"\n"
+        return
+    prefix = b"["
+    async for row in rows:
+        yield prefix + dumps(row)
+        prefix = b","
+    yield b"]" if prefix == b"," else b"[]"
+
+
+def stream_response(rows: AsyncIterable, mimetype: Optional[str] = None) -> Response:
+    """Get a response streaming rows, as NDJSON if that is the mimetype."""
+    ndjson = mimetype == NDJSON_MIMETYPE
+    return Response(
+        encode_rows(rows, ndjson=ndjson),
+        mimetype=NDJSON_MIMETYPE if ndjson else "application/json",
+    )
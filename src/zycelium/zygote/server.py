@@ -1,15 +1,17 @@
 """
 Zygote server.
 """
+import asyncio
 import json
 from pathlib import Path
 
 import socketio
+import uvicorn
 from click import get_app_dir
 from quart import (
     Quart,
     ResponseReturnValue,
-    jsonify,
+    abort,
     request,
     render_template,
     redirect,
@@ -28,16 +30,27 @@ from quart_cors import cors
 from quart_uploads import configure_uploads, UploadSet, ALL, UploadNotAllowed
 
 from zycelium.zygote.api import api
-from zycelium.zygote.broker import sio
+from zycelium.zygote.broker import cursors, sio
+from zycelium.zygote.compactor import compactor
 from zycelium.zygote.config import app_config
+from zycelium.zygote.host import host_agents, pack_agents
+from zycelium.zygote.ingest import frame_writer
 from zycelium.zygote.logging import get_logger
 from zycelium.zygote.plugin import discover_agents, start_agent
-from zycelium.zygote.supervisor import Supervisor
+from zycelium.zygote.serializers import NDJSON_MIMETYPE, json_response, stream_response
+from zycelium.zygote.storage import prepare_database, storage_urls
+from zycelium.zygote.supervisor import (
+    PRELOAD_MODULES,
+    RestartPolicy,
+    Supervisor,
+    agent_context,
+)
 from zycelium.zygote.utils import secret_key, py_string_to_dict
 
 app_dir = Path(get_app_dir("zygote"))
 app_db_path = app_dir / "zygote.db"
 app_files_path = app_dir / "files"
+app_archive_path = app_dir / "archive"
 
 app = Quart(__name__)
 app.secret_key = secret_key(app_dir / "secret_key")
@@ -57,12 +70,9 @@ log = get_logger("zygote.server")
 # Utils
 
 
-async def provision_and_start_agent(
-    agent_name: str, host: str, port: int, tls: bool
-) -> None:
-    """Start an agent."""
-    log.info("Starting agent %s", agent_name)
-    url = f"{'https' if tls else 'http'}://{host}:{port}"
+async def provision_agent(agent_name: str) -> dict:
+    """Create an agent and its token if needed, return its auth."""
+    log.info("Provisioning agent %s", agent_name)
     agent = await api.get_agent_by_name(agent_name.split(".")[-1])
     if agent != {"success": False}:
         tokens = await api.get_auth_tokens_for_agent(agent["uuid"])
@@ -78,8 +88,52 @@ async def provision_and_start_agent(
         agent = await api.create_agent(agent_name.split(".")[-1])
         token = await api.create_auth_token(agent["uuid"])
         auth = {"token": token["token"]}
+    return auth
+
 
-    await sup.add_process(agent_name, start_agent, agent_name, url=url, auth=auth)
+async def start_agents(host: str, port: int, tls: bool) -> None:
+    """Add discovered agents to the supervisor, packed into processes."""
+    url = f"{'https' if tls else 'http'}://{host}:{port}"
+    agents = {}
+    for agent_name in discover_agents():
+        agents[agent_name] = await provision_agent(agent_name)
+    groups = pack_agents(
+        agents,
+        strategy=app_config.agent_packing,
+        host_size=app_config.agent_host_size,
+        isolate=[name for name in app_config.agent_isolate.split(",") if name],
+    )
+    preload = [name for name in app_config.agent_preload.split(",") if name]
+    sup.context = agent_context(
+        app_config.agent_start_method, PRELOAD_MODULES + tuple(preload)
+    )
+    for i, group in enumerate(groups):
+        if len(group) == 1:
+            log.info("Starting agent %s", group[0])
+            await sup.add_process(
+                group[0], start_agent, group[0], url=url, auth=agents[group[0]]
+            )
+        else:
+            log.info("Starting agent host %s for %s", i, ", ".join(group))
+            await sup.add_process(
+                f"agent-host-{i}",
+                host_agents,
+                {name: agents[name] for name in group},
+                url=url,
+                restart_policy=sup.policy,
+                members=group,
+            )
+
+
+async def iter_frames(cursor=None, page_size: int = 500, **filters):
+    """Yield every frame after cursor matching filters, a page at a time."""
+    while True:
+        page = await api.get_frames(cursor=cursor, limit=page_size, **filters)
+        for frame in page.get("frames", []):
+            yield frame
+        cursor = page.get("next")
+        if not cursor:
+            return
 
 
 # Hooks
@@ -90,23 +144,78 @@ async def before_serving():
     """Startup hook."""
     log.info("Starting server")
 
-    await api.start(f"sqlite://{app_db_path}")
-    for agent_name in discover_agents():
-        await provision_and_start_agent(
-            agent_name,
-            host=app_config.host,
-            port=app_config.port,
-            tls=app_config.tls_enable,
+    db_url, read_db_url = storage_urls(
+        app_db_path,
+        profile=app_config.db_profile,
+        synchronous=app_config.db_synchronous,
+        mmap_size=app_config.db_mmap_size,
+        cache_size=app_config.db_cache_size,
+        busy_timeout=app_config.db_busy_timeout,
+    )
+    if app_config.db_profile == "tuned":
+        prepare_database(app_db_path)
+    await api.start(
+        db_url,
+        read_db_url,
+        archive_path=app_archive_path,
+        read_connections=app_config.db_readers,
+    )
+    await frame_writer.start(
+        durability=app_config.ingest_durability,
+        batch_size=app_config.ingest_batch_size,
+        batch_interval=app_config.ingest_batch_interval,
+        queue_size=app_config.ingest_queue_size,
+        retries=app_config.ingest_retries,
+        retry_backoff=app_config.ingest_retry_backoff,
+    )
+    if app_config.compact_interval > 0:
+        compactor.start(
+            interval=app_config.compact_interval,
+            batch_size=app_config.compact_batch_size,
+            archive_after=app_config.archive_after,
         )
+    sup.policy = RestartPolicy(
+        backoff=app_config.restart_backoff,
+        max_backoff=app_config.restart_max_backoff,
+        max_restarts=app_config.restart_max,
+        window=app_config.restart_window,
+    )
+    await start_agents(
+        host=app_config.host, port=app_config.port, tls=app_config.tls_enable
+    )
     await sup.start()
 
 
+async def drain_agents() -> None:
+    """Stop agents, letting them send their last frames, once."""
+    if sup.running:
+        await sup.stop(timeout=app_config.shutdown_timeout)
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    Uvicorn server that drains agents before closing connections.
+
+    Uvicorn closes every connection before the lifespan shutdown runs
+    `after_serving`, agents stopped there could not send their last frames.
+    """
+
+    async def shutdown(self, sockets=None) -> None:
+        log.info("Draining agents")
+        await drain_agents()
+        await super().shutdown(sockets)
+
+
 @app.after_serving
 async def after_serving():
     """Shutdown hook."""
     log.info("Stopping server")
+    # A no-op once DrainingServer drained the agents, under other servers
+    # agents stopped here are disconnected and keep their last frames
+    await drain_agents()
+    await asyncio.gather(compactor.stop(), frame_writer.stop())
+    await cursors.save()
     await api.stop()
-    await sup.stop()
 
 
 @app.errorhandler(Unauthorized)
@@ -158,16 +267,72 @@ async def http_frames():
         data = form["data"]
         agent = form["agent"]
         spaces = form.getlist("spaces")
-        frame = await api.create_frame(
-            kind=kind, name=name, data=data, agent_uuid=agent, space_uuids=spaces
+        result = await api.create_frames(
+            [
+                {
+                    "kind": kind,
+                    "name": name,
+                    "data": data,
+                    "agent_uuid": agent,
+                    "space_uuids": spaces,
+                }
+            ]
         )
-        return redirect(f"/frames/{frame['uuid']}")
-
-    frames = (await api.get_frames())["frames"]
+        if not result.get("frames"):
+            return redirect("/frames")
+        return redirect(f"/frames/{result['frames'][0]['uuid']}")
+
+    filters = {
+        key: request.args[key]
+        for key in ("q", "kind", "name", "agent", "space")
+        if request.args.get(key)
+    }
+    accept = request.headers.get("Accept")
+    # Stream every matching frame instead of a page
+    if not filters.get("q") and (
+        accept == NDJSON_MIMETYPE or request.args.get("stream")
+    ):
+        frames = iter_frames(
+            cursor=request.args.get("cursor"),
+            kind=filters.get("kind"),
+            name=filters.get("name"),
+            agent_uuid=filters.get("agent"),
+            space_uuid=filters.get("space"),
+        )
+        return stream_response(frames, accept)
+    if filters.get("q"):
+        page = await api.search_frames(
+            filters["q"],
+            cursor=request.args.get("cursor"),
+            limit=min(request.args.get("limit", 100, type=int), 1000),
+            kind=filters.get("kind"),
+            name=filters.get("name"),
+            agent_uuid=filters.get("agent"),
+            space_uuid=filters.get("space"),
+        )
+    else:
+        page = await api.get_frames(
+            cursor=request.args.get("cursor"),
+            limit=min(request.args.get("limit", 100, type=int), 1000),
+            kind=filters.get("kind"),
+            name=filters.get("name"),
+            agent_uuid=filters.get("agent"),
+            space_uuid=filters.get("space"),
+        )
+    if accept == "application/json":
+        return json_response(page)
     agents = (await api.get_agents())["agents"]
     spaces = (await api.get_spaces())["spaces"]
+    next_url = None
+    if page.get("next"):
+        next_url = url_for("http_frames", cursor=page["next"], **filters)
     return await render_template(
-        "frames.html", frames=frames, agents=agents, spaces=spaces
+        "frames.html",
+        frames=page.get("frames", []),
+        filters=filters,
+        next_url=next_url,
+        agents=agents,
+        spaces=spaces,
     )
 
 
@@ -234,7 +399,7 @@ async def http_agent(uuid):
     agent = await api.get_agent(uuid)
     agent["data"] = json.dumps(agent["data"], indent=0)
     agent["meta"] = json.dumps(agent["meta"], indent=0)
-    spaces = (await api.get_spaces())["spaces"]
+    spaces = (await api.get_unjoined_spaces(uuid))["spaces"]
     tokens = (await api.get_auth_tokens_for_agent(uuid))["tokens"]
     return await render_template(
         "agent.html", agent=agent, spaces=spaces, tokens=tokens
@@ -301,6 +466,27 @@ async def http_agent_delete_auth_token(uuid, token_uuid):
     return redirect(f"/agents/{uuid}")
 
 
+@app.route("/processes")
+@login_required
+async def http_processes():
+    """Processes route."""
+    processes = list((await sup.status()).values())
+    if request.headers.get("Accept") == "application/json":
+        return json_response({"processes": processes})
+    return await render_template("processes.html", processes=processes)
+
+
+@app.route("/processes/<name>/resume", methods=["POST"])
+@login_required
+async def http_process_resume(name):
+    """Process resume route."""
+    try:
+        await sup.resume(name)
+    except KeyError:
+        abort(404)
+    return redirect(url_for("http_processes"))
+
+
 @app.route("/files", methods=["GET", "POST"])
 async def http_files():
     """Files route."""
@@ -329,7 +515,7 @@ async def http_files():
 
         files = (await api.get_files())["files"]
         if request.headers.get("Accept") == "application/json":
-            return jsonify(files)
+            return json_response(files)
         return await render_template("files.html", files=files)
     except Exception as exc:  # pylint: disable=broad-except
         log.exception(exc)
@@ -341,7 +527,7 @@ async def http_file(uuid):
     """File route."""
     file = await api.get_file(uuid)
     if request.headers.get("Accept") == "application/json":
-        return jsonify(file)
+        return json_response(file)
     return await render_template("file.html", file=file)
 
 
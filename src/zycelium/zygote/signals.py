@@ -6,6 +6,7 @@ from async_signals.dispatcher import Signal
 # Process signals
 process_started = Signal()
 process_stopped = Signal()
+process_quarantined = Signal()
 
 # Supervisor signals
 supervisor_started = Signal()
@@ -14,3 +15,11 @@ supervisor_cancelled = Signal()
 
 # Database signals
 database_init = Signal()
+
+# Agent and space signals
+agent_updated = Signal()
+agent_deleted = Signal()
+space_updated = Signal()
+space_deleted = Signal()
+space_joined = Signal()
+space_left = Signal()
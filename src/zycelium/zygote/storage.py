@@ -0,0 +1,154 @@
+"""
+SQLite storage profiles.
+
+The "default" profile keeps the settings of Tortoise ORM.
+The "tuned" profile trades a little durability for throughput:
+WAL with synchronous=NORMAL may lose the last transactions on power loss,
+but never corrupts the database. It also memory-maps the database,
+grows the page cache, waits for locks instead of failing, and opens
+a pool of read-only connections so reads do not queue behind writes
+or behind each other.
+New databases return space freed by deleted frames in small steps,
+see `prepare_database`.
+"""
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Union
+from urllib.parse import parse_qsl, urlencode
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.backends.sqlite.client import SqliteClient
+
+STORAGE_PROFILES = ("default", "tuned")
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def sqlite_url(path: Union[str, Path], **pragmas) -> str:
+    """Build a Tortoise ORM database url, pragmas are set on connect."""
+    query = f"?{urlencode(pragmas)}" if pragmas else ""
+    return f"sqlite://{path}{query}"
+
+
+def storage_urls(
+    path: Union[str, Path],
+    profile: str = "tuned",
+    synchronous: str = "NORMAL",
+    mmap_size: int = 268435456,
+    cache_size: int = -65536,
+    busy_timeout: int = 5000,
+) -> tuple:
+    """
+    Get (write url, read url) for a database file and profile.
+
+    The read url is None if reads should share the write connection.
+    A negative cache_size is in KiB, a positive one in pages.
+    """
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile: {profile}")
+    if profile == "default":
+        return sqlite_url(path), None
+    synchronous = synchronous.upper()
+    if synchronous not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f"Unknown synchronous level: {synchronous}")
+    pragmas = {
+        "journal_mode": "WAL",
+        "synchronous": synchronous,
+        "mmap_size": mmap_size,
+        "cache_size": cache_size,
+        "busy_timeout": busy_timeout,
+        "temp_store": "MEMORY",
+    }
+    write_url = sqlite_url(path, **pragmas)
+    if str(path) == ":memory:":
+        # Every connection to :memory: opens a new, empty database
+        return write_url, None
+    read_url = sqlite_url(path, **pragmas, query_only="ON")
+    return write_url, read_url
+
+
+def utc(value: datetime) -> datetime:
+    """Get a datetime in UTC, naive datetimes are taken to be in UTC."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def sql_time(value: datetime) -> str:
+    """
+    Format a datetime for raw SQL the way frame times are stored.
+
+    Times are stored as text and compared as text, so they must all be in
+    UTC and formatted alike.
+    """
+    return utc(value).isoformat(" ")
+
+
+def prepare_database(path: Union[str, Path]) -> None:
+    """
+    Create a new database file with incremental auto_vacuum.
+
+    auto_vacuum must be set before anything else is written to the file,
+    Tortoise ORM switches to WAL first. Existing databases are left as is,
+    see `Compactor.vacuum_full`.
+    """
+    if str(path) == ":memory:" or Path(path).exists():
+        return
+    with closing(sqlite3.connect(path)) as connection:
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.execute("VACUUM")
+
+
+async def connect_reader(
+    db_url: str, connection_name: str = "reader"
+) -> BaseDBAsyncClient:
+    """Open a read-only connection, for `QuerySet.using_db`."""
+    path, _, query = db_url[len("sqlite://") :].partition("?")
+    pragmas = dict(parse_qsl(query))
+    client = SqliteClient(path, connection_name=connection_name, **pragmas)
+    await client.create_connection(with_db=True)
+    return client
+
+
+class ReaderPool:
+    """
+    Read-only connections, for `QuerySet.using_db`.
+
+    A Tortoise ORM SQLite client runs one query at a time, so `get` hands
+    out an idle connection if there is one, taking turns otherwise.
+    """
+
+    def __init__(self, db_url: str, size: int = 4):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.db_url = db_url
+        self.size = size
+        self._clients = []  # type: list[BaseDBAsyncClient]
+        self._next = 0
+
+    async def open(self) -> None:
+        """Open the connections."""
+        for i in range(self.size):
+            self._clients.append(await connect_reader(self.db_url, f"reader-{i}"))
+
+    def get(self) -> Optional[BaseDBAsyncClient]:
+        """Get a connection, None if the pool is closed."""
+        if not self._clients:
+            return None
+        count = len(self._clients)
+        for i in range(count):
+            client = self._clients[(self._next + i) % count]
+            # pylint: disable=protected-access
+            if not client._lock.locked():  # type: ignore
+                self._next = (self._next + i + 1) % count
+                return client
+        client = self._clients[self._next]
+        self._next = (self._next + 1) % count
+        return client
+
+    async def close(self) -> None:
+        """Close the connections."""
+        clients, self._clients = self._clients, []
+        for client in clients:
+            await client.close()
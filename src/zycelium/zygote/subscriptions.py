@@ -0,0 +1,53 @@
+"""
+Frame subscriptions of connected agents.
+"""
+from typing import Iterable, Optional
+
+from zycelium.zygote.topics import TopicTrie, split_topic
+
+CATCH_ALL = "#"
+
+
+class SubscriptionIndex:
+    """
+    Index sids by the frame topics they subscribed to.
+
+    Subscriptions may use "+" and "#" wildcards, see `zycelium.zygote.topics`.
+    """
+
+    def __init__(self):
+        self._trie = TopicTrie()
+        self._sid_subscriptions = {}  # type: dict[str, tuple[str, ...]]
+
+    def __len__(self) -> int:
+        return len(self._sid_subscriptions)
+
+    def add(self, sid: str, subscriptions: Optional[Iterable[str]] = None) -> None:
+        """
+        Add subscriptions of sid.
+
+        Without subscriptions, sid gets every frame.
+        Invalid patterns raise ValueError.
+        """
+        self.remove(sid)
+        subscriptions = (
+            (CATCH_ALL,) if subscriptions is None else tuple(set(subscriptions))
+        )
+        for subscription in subscriptions:
+            split_topic(subscription)
+        for subscription in subscriptions:
+            self._trie.insert(subscription, sid)
+        self._sid_subscriptions[sid] = subscriptions
+
+    def remove(self, sid: str) -> None:
+        """Remove subscriptions of sid."""
+        for subscription in self._sid_subscriptions.pop(sid, ()):
+            self._trie.remove(subscription, sid)
+
+    def subscriptions(self, sid: str) -> tuple:
+        """Get subscriptions of sid."""
+        return self._sid_subscriptions.get(sid, ())
+
+    def match(self, name: str) -> set:
+        """Get sids subscribed to frame name."""
+        return self._trie.match(name)
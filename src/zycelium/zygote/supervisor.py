@@ -3,10 +3,16 @@ Supervisor for processes using multiprocessing.
 """
 import asyncio
 import multiprocessing
-from typing import Callable
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from typing import Callable, Iterable, Optional
 
 from zycelium.zygote.logging import get_logger
 from zycelium.zygote.signals import (
+    process_quarantined,
     process_started,
     process_stopped,
     supervisor_started,
@@ -14,38 +20,135 @@ from zycelium.zygote.signals import (
     supervisor_cancelled,
 )
 
+# Imported once by the fork server instead of by every agent start
+PRELOAD_MODULES = (
+    "aiohttp",
+    "apscheduler.schedulers.asyncio",
+    "socketio",
+    "zycelium.dataconfig",
+    "zycelium.zygote.agent",
+    "zycelium.zygote.host",
+    "zycelium.zygote.plugin",
+)
+
+
+def agent_context(method: str = "forkserver", preload: Iterable[str] = PRELOAD_MODULES):
+    """
+    Get a multiprocessing context to start agents with.
+
+    With the forkserver method processes are forked from a server that
+    imported the preload modules once, starts and restarts skip those
+    imports. Only modules that import without side effects should be
+    preloaded, errors other than ImportError stop the fork server.
+    Methods not available on the platform fall back to its default.
+    """
+    if method not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context()
+    context = multiprocessing.get_context(method)
+    if method == "forkserver":
+        context.set_forkserver_preload(list(preload))
+    return context
+
+
+@dataclass
+class RestartPolicy:
+    """
+    Restart policy of supervised processes.
+
+    The first exit in window seconds restarts at once, each further exit
+    doubles the delay from backoff up to max_backoff, plus up to jitter
+    of it at random. More than max_restarts exits in window seconds
+    quarantine the process until it is resumed.
+    """
+
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+    jitter: float = 0.1
+    max_restarts: int = 5
+    window: float = 60.0
+
+    def delay(self, exits: int) -> float:
+        """
+        Seconds to wait before a restart after exits recent exits.
+        """
+        if exits <= 1:
+            return 0.0
+        delay = min(self.max_backoff, self.backoff * 2 ** (exits - 2))
+        return delay * (1 + random.uniform(0, self.jitter))
+
 
 class Process:
     """
     Supervised process.
     """
 
-    def __init__(self, name, function, *args, **kwargs):
+    def __init__(self, name, function, *args, members: Iterable[str] = (), **kwargs):
         self.name = name
         self.function = function
         self.args = args
         self.kwargs = kwargs
         self.process = None
+        self.context = None  # type: Optional[multiprocessing.context.BaseContext]
+        self.policy = None  # type: Optional[RestartPolicy]
+        self.state = "stopped"
+        self.restarts = 0
+        self.exits = deque()  # type: deque[float]
+        # Agents hosted by the process, they report their state over channel
+        self.members = {
+            member: {"state": "stopped", "restarts": 0, "recent_exits": 0}
+            for member in members
+        }
+        self.channel = None  # type: Optional[Connection]
         self.log = get_logger(f"zygote.supervisor.process.{self.name}")
 
     def start(self) -> None:
         """
         Start the agent.
         """
-        self.process = multiprocessing.Process(
-            target=self.function, args=self.args, kwargs=self.kwargs
+        if self.process is not None and self.process.exitcode is not None:
+            # Reap the previous run and release its sentinel
+            self.process.close()
+        kwargs = self.kwargs
+        if self.members:
+            if self.channel is not None:
+                self.channel.close()
+            self.channel, channel = (self.context or multiprocessing).Pipe()
+            kwargs = dict(
+                kwargs,
+                channel=channel,
+                quarantined=[
+                    member
+                    for member, status in self.members.items()
+                    if status["state"] == "quarantined"
+                ],
+            )
+        self.process = (self.context or multiprocessing).Process(
+            target=self.function, args=self.args, kwargs=kwargs
         )
         self.process.start()
+        if self.members:
+            channel.close()
+        self.state = "running"
         self.log.info("Started process %s", self.name)
 
     def stop(self) -> None:
         """
         Stop the agent.
         """
+        self.state = "stopped"
         if self.process is not None:
             self.process.terminate()
             self.log.info("Terminated process %s", self.name)
 
+    def kill(self) -> None:
+        """
+        Kill the agent without letting it clean up.
+        """
+        self.state = "stopped"
+        if self.process is not None:
+            self.process.kill()
+            self.log.warning("Killed process %s", self.name)
+
     def join(self) -> None:
         """
         Join the agent.
@@ -53,6 +156,15 @@ class Process:
         if self.process is not None:
             self.process.join()
 
+    @property
+    def sentinel(self) -> Optional[int]:
+        """
+        File descriptor that becomes ready when the agent exits.
+        """
+        if self.process is not None:
+            return self.process.sentinel
+        return None
+
     def is_alive(self) -> bool:
         """
         Check if the agent is alive.
@@ -61,6 +173,62 @@ class Process:
             return self.process.is_alive()
         return False
 
+    def send(self, message) -> None:
+        """
+        Send a message to the agents hosted by the process.
+        """
+        if self.channel is None:
+            raise RuntimeError(f"Process {self.name} hosts no agents.")
+        self.channel.send(message)
+
+    def receive(self) -> list:
+        """
+        Update and return the states reported by hosted agents.
+
+        Raises EOFError once the process closed its end of the channel.
+        """
+        reports = []
+        while self.channel is not None and self.channel.poll():
+            report = self.channel.recv()
+            self.members[report["name"]].update(
+                state=report["state"],
+                restarts=report["restarts"],
+                recent_exits=report["recent_exits"],
+            )
+            reports.append(report)
+        return reports
+
+    def member_status(self, member: str) -> dict:
+        """
+        Get the state, restart count and host of a hosted agent.
+        """
+        status = self.members[member]
+        state = status["state"]
+        if state != "quarantined" and not self.is_alive():
+            state = "stopped"
+        return {
+            "name": member,
+            "state": state,
+            "pid": self.process.pid if self.process is not None else None,
+            "exitcode": None,
+            "restarts": status["restarts"],
+            "recent_exits": status["recent_exits"],
+            "host": self.name,
+        }
+
+    def status(self) -> dict:
+        """
+        Get the state, restart count and exit code of the agent.
+        """
+        return {
+            "name": self.name,
+            "state": self.state,
+            "pid": self.process.pid if self.process is not None else None,
+            "exitcode": self.process.exitcode if self.process is not None else None,
+            "restarts": self.restarts,
+            "recent_exits": len(self.exits),
+        }
+
     def __enter__(self) -> "Process":
         self.start()
         return self
@@ -73,44 +241,103 @@ class Process:
 class Supervisor:
     """
     Supervisor for processes.
+
+    Processes are restarted when they exit, their sentinels are watched
+    by the event loop instead of being polled. Restarts follow the
+    process's restart policy, or the supervisor's if it has none.
+    Processes are started from the supervisor's multiprocessing context,
+    see `agent_context`, or the default context if it has none.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        policy: Optional[RestartPolicy] = None,
+        context: Optional[multiprocessing.context.BaseContext] = None,
+    ):
         self.processes = {}  # type: dict[str, Process]  # type: ignore
+        self.policy = policy or RestartPolicy()
+        self.context = context
         self.log = get_logger("zygote.supervisor")
-        self._supervise_loop_task = None
+        self._loop = None  # type: Optional[asyncio.AbstractEventLoop]
+        self._watched = {}  # type: dict[str, int]
+        self._reporting = {}  # type: dict[str, int]
+        self._restarts = {}  # type: dict[str, asyncio.Task]
+
+    @property
+    def running(self) -> bool:
+        """
+        Check if the supervisor is started and not stopped.
+        """
+        return self._loop is not None
 
     async def start(self) -> None:
         """
         Start the supervisor.
         """
         self.log.info("Starting supervisor")
+        self._loop = asyncio.get_running_loop()
         for process in self.processes.values():
             process.start()
+            self._watch(process)
             await process_started.send(process.name)
 
-        self._supervise_loop_task = asyncio.get_running_loop().create_task(
-            self.supervise_loop()
-        )
         await supervisor_started.send("supervisor")
         self.log.info("Started supervisor")
 
-    async def stop(self) -> None:
+    async def stop(self, timeout: float = 10.0) -> None:
         """
         Stop the supervisor.
+
+        Every process is asked to terminate at once and given timeout
+        seconds to drain, processes still running after that are killed.
         """
         self.log.info("Stopping supervisor")
-        for process in self.processes.values():
+        for name in list(self._watched):
+            self._unwatch(name)
+        for task in self._restarts.values():
+            task.cancel()
+        self._restarts.clear()
+        if self._loop is not None:
+            self._loop = None
+            await supervisor_cancelled.send("supervisor")
+
+        processes = list(self.processes.values())
+        for process in processes:
             process.stop()
+        exited = await asyncio.gather(
+            *(self._wait_for_exit(process, timeout) for process in processes)
+        )
+        for process, drained in zip(processes, exited):
+            if not drained:
+                self.log.warning(
+                    "Process %s did not stop within %ss", process.name, timeout
+                )
+                process.kill()
             process.join()
             await process_stopped.send(process.name)
 
-        if self._supervise_loop_task is not None:
-            self._supervise_loop_task.cancel()
-
         await supervisor_stopped.send("supervisor")
         self.log.info("Stopped supervisor")
 
+    @staticmethod
+    async def _wait_for_exit(process: Process, timeout: float) -> bool:
+        """
+        Wait up to timeout seconds for a process to exit, return whether it did.
+        """
+        sentinel = process.sentinel
+        if sentinel is None or not process.is_alive():
+            return True
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+        loop.add_reader(sentinel, lambda: exited.done() or exited.set_result(None))
+        try:
+            await asyncio.wait_for(exited, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(sentinel)
+
     async def is_alive(self, name) -> bool:
         """
         Check if process is alive.
@@ -119,23 +346,42 @@ class Supervisor:
             return False
         return self.processes[name].is_alive()
 
+    async def status(self) -> dict:
+        """
+        Get the status of every process and hosted agent by name.
+        """
+        statuses = {}
+        for name, process in self.processes.items():
+            statuses[name] = process.status()
+            for member in process.members:
+                statuses[member] = process.member_status(member)
+        return statuses
+
     async def add_process(
         self,
         name: str,
         function: Callable,
         *args,
         start: bool = False,
+        policy: Optional[RestartPolicy] = None,
+        members: Iterable[str] = (),
         **kwargs,
     ) -> None:
         """
         Add a process to the supervisor.
+
+        A process hosting the agents named in members is passed a channel
+        to report their states on, see `zycelium.zygote.host.run_hosted`.
         """
         if name in self.processes:
             raise KeyError(f"Process {name} already exists.")
-        process = Process(name, function, *args, **kwargs)
+        process = Process(name, function, *args, members=members, **kwargs)
+        process.context = self.context
+        process.policy = policy
         self.processes[name] = process
         if start:
             process.start()
+            self._watch(process)
             await process_started.send(name)
 
     async def remove_process(self, name: str) -> None:
@@ -143,24 +389,169 @@ class Supervisor:
         Remove a process from the supervisor.
         """
         if name in self.processes:
+            self._unwatch(name)
+            self._cancel_restart(name)
             self.processes[name].stop()
             self.processes[name].join()
             del self.processes[name]
             await process_stopped.send(name)
 
-    async def supervise_loop(self) -> None:
-        """
-        Supervise all processes.
-        """
-        while True:
-            for process in self.processes.values():
-                if not process.is_alive():
-                    self.log.error("Process %s died", process.name)
-                    await process_stopped.send(process.name)
-                    process.start()
-                    await process_started.send(process.name)
-            try:
-                await asyncio.sleep(1)
-            except asyncio.CancelledError:
-                await supervisor_cancelled.send("supervisor")
-                break
+    async def resume(self, name: str) -> None:
+        """
+        Start a quarantined or backing off process now, forgetting its exits.
+
+        Hosted agents are resumed by their host, which is started first if
+        it is not running.
+        """
+        host = self._host_of(name)
+        if host is not None:
+            await self._resume_member(host, name)
+            return
+        process = self.processes[name]
+        if self._loop is None:
+            raise RuntimeError("Supervisor is not running.")
+        if process.is_alive():
+            return
+        self._cancel_restart(name)
+        process.exits.clear()
+        self.log.info("Resuming process %s", name)
+        process.start()
+        self._watch(process)
+        await process_started.send(name)
+
+    def _host_of(self, member: str) -> Optional[Process]:
+        """
+        Get the process hosting an agent, None if it is not hosted.
+        """
+        for process in self.processes.values():
+            if member in process.members:
+                return process
+        return None
+
+    async def _resume_member(self, host: Process, member: str) -> None:
+        """
+        Resume a quarantined or backing off hosted agent.
+        """
+        if self._loop is None:
+            raise RuntimeError("Supervisor is not running.")
+        if host.members[member]["state"] not in ("quarantined", "backoff"):
+            return
+        self.log.info("Resuming hosted agent %s", member)
+        if host.is_alive():
+            host.send(("resume", member))
+            return
+        # Started by the host with the others, not quarantined
+        host.members[member]["state"] = "stopped"
+        await self.resume(host.name)
+
+    def _watch(self, process: Process) -> None:
+        """
+        Restart process when it exits, if the supervisor is running.
+        """
+        if self._loop is None or process.sentinel is None:
+            return
+        self._watched[process.name] = process.sentinel
+        self._loop.add_reader(process.sentinel, self._on_exit, process)
+        if process.channel is not None:
+            self._reporting[process.name] = process.channel.fileno()
+            self._loop.add_reader(process.channel, self._on_report, process)
+
+    def _unwatch(self, name: str) -> None:
+        """
+        Stop watching a process, before it is stopped on purpose.
+        """
+        sentinel = self._watched.pop(name, None)
+        if sentinel is not None and self._loop is not None:
+            self._loop.remove_reader(sentinel)
+        self._unwatch_reports(name)
+
+    def _unwatch_reports(self, name: str) -> None:
+        """
+        Stop reading the reports of the agents hosted by a process.
+        """
+        channel = self._reporting.pop(name, None)
+        if channel is not None and self._loop is not None:
+            self._loop.remove_reader(channel)
+
+    def _on_report(self, process: Process) -> None:
+        """
+        Record the states reported by the agents hosted by a process.
+        """
+        try:
+            reports = process.receive()
+        except (EOFError, OSError):
+            self._unwatch_reports(process.name)
+            return
+        for report in reports:
+            if report["state"] == "quarantined":
+                self.log.error("Hosted agent %s quarantined", report["name"])
+                self._loop.create_task(  # type: ignore
+                    process_quarantined.send(report["name"])
+                )
+
+    def _cancel_restart(self, name: str) -> None:
+        """
+        Cancel the pending restart of a process.
+        """
+        task = self._restarts.pop(name, None)
+        if task is not None:
+            task.cancel()
+
+    def _on_exit(self, process: Process) -> None:
+        """
+        Schedule the restart of a process that exited.
+        """
+        if process.name in self._reporting:
+            # Reports sent just before the exit
+            self._on_report(process)
+        self._unwatch(process.name)
+        task = self._loop.create_task(self._restart(process))  # type: ignore
+        self._restarts[process.name] = task
+
+    async def _restart(self, process: Process) -> None:
+        """
+        Restart a process that exited after a backoff, or quarantine it.
+        """
+        try:
+            await self._backoff_and_start(process)
+        finally:
+            if self._restarts.get(process.name) is asyncio.current_task():
+                del self._restarts[process.name]
+
+    async def _backoff_and_start(self, process: Process) -> None:
+        """
+        Record an exit of process and restart it as its policy allows.
+        """
+        # The sentinel fires as the process exits, reap it for its exit code
+        process.join()
+        policy = process.policy or self.policy
+        now = time.monotonic()
+        process.exits.append(now)
+        while process.exits[0] < now - policy.window:
+            process.exits.popleft()
+        self.log.error(
+            "Process %s died with exit code %s", process.name, process.process.exitcode
+        )
+        await process_stopped.send(process.name)
+        if len(process.exits) > policy.max_restarts:
+            process.state = "quarantined"
+            self.log.error(
+                "Process %s quarantined after %s exits in %ss",
+                process.name,
+                len(process.exits),
+                policy.window,
+            )
+            await process_quarantined.send(process.name)
+            return
+        delay = policy.delay(len(process.exits))
+        if delay > 0:
+            process.state = "backoff"
+            self.log.warning("Restarting process %s in %.2fs", process.name, delay)
+            await asyncio.sleep(delay)
+        # Stopped or removed while the signal was handled or backing off
+        if self._loop is None or self.processes.get(process.name) is not process:
+            return
+        process.restarts += 1
+        process.start()
+        self._watch(process)
+        await process_started.send(process.name)
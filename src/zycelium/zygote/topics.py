@@ -0,0 +1,104 @@
+"""
+Hierarchical topic matching.
+
+Frame names are slash-delimited topics, such as "openweather/current".
+Subscriptions may use MQTT-style wildcards:
+
+- "+" matches exactly one segment: "openweather/+"
+- "#" matches the remaining segments, including none: "openweather/#"
+
+For compatibility, a "*" segment is the same as "+",
+and "*" on its own is the same as "#".
+"""
+from typing import Hashable
+
+
+class _Node:
+    """Trie node."""
+
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children = {}  # type: dict[str, _Node]
+        self.values = set()  # type: set[Hashable]
+
+
+def split_topic(pattern: str) -> list:
+    """Split a subscription pattern into segments, checking wildcards."""
+    if pattern == "*":
+        return ["#"]
+    segments = ["+" if segment == "*" else segment for segment in pattern.split("/")]
+    for i, segment in enumerate(segments):
+        if "#" in segment and (segment != "#" or i != len(segments) - 1):
+            raise ValueError(f"'#' must be the last segment: {pattern}")
+        if "+" in segment and segment != "+":
+            raise ValueError(f"'+' must be a whole segment: {pattern}")
+    return segments
+
+
+class TopicTrie:
+    """
+    Map subscription patterns to values and find the values matching a topic.
+
+    Matching cost grows with the depth of the topic,
+    not with the number of subscriptions.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def insert(self, pattern: str, value: Hashable) -> None:
+        """Subscribe value to pattern."""
+        node = self._root
+        for segment in split_topic(pattern):
+            node = node.children.setdefault(segment, _Node())
+        if value not in node.values:
+            node.values.add(value)
+            self._count += 1
+
+    def remove(self, pattern: str, value: Hashable) -> None:
+        """Unsubscribe value from pattern, pruning empty nodes."""
+        path = [self._root]
+        segments = split_topic(pattern)
+        for segment in segments:
+            node = path[-1].children.get(segment)
+            if node is None:
+                return
+            path.append(node)
+        if value not in path[-1].values:
+            return
+        path[-1].values.discard(value)
+        self._count -= 1
+        for segment, parent, node in zip(
+            reversed(segments), reversed(path[:-1]), reversed(path[1:])
+        ):
+            if node.values or node.children:
+                break
+            del parent.children[segment]
+
+    def match(self, topic: str) -> set:
+        """Get values subscribed to patterns matching topic."""
+        segments = topic.split("/")
+        depth = len(segments)
+        matched = set()
+        stack = [(self._root, 0)]
+        while stack:
+            node, i = stack.pop()
+            children = node.children
+            multi = children.get("#")
+            if multi is not None:
+                matched.update(multi.values)
+            if i == depth:
+                matched.update(node.values)
+                continue
+            child = children.get(segments[i])
+            if child is not None:
+                stack.append((child, i + 1))
+            child = children.get("+")
+            if child is not None:
+                stack.append((child, i + 1))
+        return matched
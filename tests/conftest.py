@@ -13,3 +13,34 @@ async def api():
     await _api.start("sqlite://:memory:")
     yield _api
     await _api.stop()
+
+
+@pytest.fixture
+def create_frames(api):  # pylint: disable=redefined-outer-name
+    """
+    Frame factory fixture, creates frames of an agent and returns them.
+
+    Frames are dicts of frame keys without agent and spaces. The agent,
+    "test" by default, and a space of the same name are created on first
+    use, frames go to that space unless space_uuids are given.
+    """
+
+    async def create(frames: list, space_uuids=None, agent_name: str = "test"):
+        agent = await api.get_agent_by_name(agent_name)
+        if agent == {"success": False}:
+            agent = await api.create_agent(agent_name)
+        if space_uuids is None:
+            spaces = {
+                space["name"]: space for space in (await api.get_spaces())["spaces"]
+            }
+            space = spaces.get(agent_name) or await api.create_space(agent_name)
+            space_uuids = [space["uuid"]]
+        result = await api.create_frames(
+            [
+                {**frame, "agent_uuid": agent["uuid"], "space_uuids": space_uuids}
+                for frame in frames
+            ]
+        )
+        return result["frames"]
+
+    return create
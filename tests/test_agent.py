@@ -0,0 +1,233 @@
+"""Test agent."""
+import asyncio
+
+import pytest
+
+from zycelium.zygote.agent import Agent
+from zycelium.zygote.frame import ACK_EVENT, BATCH_EVENT
+
+
+def test_handlers_subscribe():
+    """Test registering handlers subscribes to their frames."""
+    agent = Agent("test")
+
+    @agent.on_event("openweather/current")
+    async def weather(_frame):
+        pass
+
+    @agent.on("*")
+    async def everything(_event, _frame):
+        pass
+
+    agent.subscribe("fediverse/*")
+    assert agent.subscriptions == {"openweather/current", "*", "fediverse/*"}
+
+
+async def test_on_event_wildcards():
+    """Test on_event handlers match topics with wildcards."""
+    agent = Agent("test")
+    called = []
+
+    @agent.on_event("openweather/+")
+    async def weather(frame):
+        called.append(("weather", frame["name"]))
+
+    @agent.on_event("openweather/current")
+    async def current(frame):
+        called.append(("current", frame["name"]))
+
+    @agent.on("*")
+    async def everything(event, _frame):
+        called.append(("*", event))
+
+    await agent._dispatch(  # pylint: disable=protected-access
+        "event-openweather/current", {"name": "openweather/current"}
+    )
+    assert called == [
+        ("weather", "openweather/current"),
+        ("current", "openweather/current"),
+        ("*", "event-openweather/current"),
+    ]
+
+
+async def test_specific_and_catch_all_handlers():
+    """Test frames with a handler of their own still reach catch-all handlers."""
+    agent = Agent("test")
+    called = []
+
+    @agent.on("event-test")
+    def specific(frame):
+        called.append(("specific", frame["name"]))
+
+    @agent.on_event("+")
+    async def wildcard(frame):
+        called.append(("wildcard", frame["name"]))
+
+    @agent.on("*")
+    async def everything(event, _frame):
+        called.append(("*", event))
+
+    # Frames reach the agent through socket.io's catch-all handler
+    await agent.sio._trigger_event(  # pylint: disable=protected-access
+        "event-test", "/", {"name": "test"}
+    )
+    assert called == [
+        ("specific", "test"),
+        ("wildcard", "test"),
+        ("*", "event-test"),
+    ]
+
+
+class RecordingClient:
+    """Socket.io client that records emitted events."""
+
+    connected = True
+
+    def __init__(self):
+        self.sent = []
+
+    async def emit(self, event, data, namespace=None):
+        """Record event."""
+        self.sent.append((event, data))
+
+    async def call(self, event, data, namespace=None):
+        """Record event, as confirmed by the server."""
+        self.sent.append(("confirmed", event))
+
+    async def disconnect(self):
+        """Disconnect."""
+        self.connected = False
+
+
+async def test_emit_many_sends_one_batch():
+    """Test emit_many sends frames as one batch, in order."""
+    agent = Agent("test")
+    agent.sio = RecordingClient()
+    await agent.emit_many([("a", {"v": 1}), ("b", {"v": 2})])
+    assert len(agent.sio.sent) == 1
+    event, data = agent.sio.sent[0]
+    assert event == BATCH_EVENT
+    assert [frame["name"] for frame in data["frames"]] == ["a", "b"]
+
+
+async def test_emit_coalesces():
+    """Test emit collects frames during the coalescing window."""
+    agent = Agent("test", coalesce=0.01)
+    agent.sio = RecordingClient()
+    for i in range(3):
+        await agent.emit("a", {"v": i})
+    assert agent.sio.sent == []
+    await asyncio.sleep(0.05)
+    assert len(agent.sio.sent) == 1
+    assert [frame["data"]["v"] for frame in agent.sio.sent[0][1]["frames"]] == [0, 1, 2]
+
+
+async def test_disconnect_confirms_queued_frames():
+    """Test queued frames are confirmed on disconnect, or kept if disconnected."""
+    agent = Agent("test", coalesce=10)
+    agent.sio = RecordingClient()
+    await agent.emit("a")
+    await agent.disconnect()
+    assert agent.sio.sent == [("confirmed", "event-a")]
+
+    await agent.emit("b")
+    await agent.disconnect()
+    outbox = agent._outbox  # pylint: disable=protected-access
+    assert [frame["name"] for frame in outbox] == ["b"]
+    assert agent.sio.sent == [("confirmed", "event-a")]
+
+
+async def test_command_flushes_queued_frames():
+    """Test commands are sent after queued frames."""
+    agent = Agent("test", coalesce=10)
+    agent.sio = RecordingClient()
+    await agent.emit("a")
+    await agent.command("config-update", {"v": 1})
+    assert [event for event, _ in agent.sio.sent] == [
+        "event-a",
+        "command-config-update",
+    ]
+
+
+async def test_duplicate_frames_handled_once():
+    """Test redelivered frames are dropped and handled frames acknowledged."""
+    agent = Agent("test")
+    agent.sio = RecordingClient()
+    handled = []
+
+    @agent.on_event("test")
+    async def on_test(frame):
+        handled.append(frame)
+
+    frame = {
+        "name": "test",
+        "kind": "event",
+        "data": {},
+        "meta": {"uuid": "frame-1", "time": "2026-01-01T00:00:00+00:00"},
+    }
+    await agent._dispatch("event-test", frame)  # pylint: disable=protected-access
+    await agent._dispatch("event-test", frame)  # pylint: disable=protected-access
+    assert len(handled) == 1
+    await agent.flush()
+    assert agent.sio.sent == [
+        (ACK_EVENT, {"uuid": "frame-1", "time": "2026-01-01T00:00:00+00:00"})
+    ]
+
+
+def make_frame(i: int) -> dict:
+    """Make a delivered frame."""
+    return {
+        "name": "test",
+        "kind": "event",
+        "data": {"v": i},
+        "meta": {"uuid": f"frame-{i}", "time": f"2026-01-01T00:00:0{i}+00:00"},
+    }
+
+
+async def test_acks_coalesce():
+    """Test only the latest acknowledgement is sent, with queued frames."""
+    agent = Agent("test", coalesce=10, ack_delay=0.01)
+    agent.sio = RecordingClient()
+    agent.on_event("test")(lambda _frame: asyncio.sleep(0))
+    dispatch = agent._dispatch  # pylint: disable=protected-access
+    for i in range(3):
+        await dispatch("event-test", make_frame(i))
+    assert agent.sio.sent == []
+    await asyncio.sleep(0.05)
+    assert agent.sio.sent == [
+        (ACK_EVENT, {"uuid": "frame-2", "time": make_frame(2)["meta"]["time"]})
+    ]
+
+    await dispatch("event-test", make_frame(3))
+    await agent.emit("a")
+    await agent.flush()
+    event, data = agent.sio.sent[1]
+    assert event == BATCH_EVENT
+    assert [frame["name"] for frame in data["frames"]] == ["a"]
+    assert data["ack"]["uuid"] == "frame-3"
+
+
+async def test_failed_frames_are_not_acked():
+    """Test a failed frame holds back acks until it is handled when redelivered."""
+    agent = Agent("test")
+    agent.sio = RecordingClient()
+    calls = []
+
+    @agent.on_event("test")
+    async def on_test(frame):
+        calls.append(frame["data"]["v"])
+        if len(calls) == 1:
+            raise RuntimeError("not yet")
+
+    dispatch = agent._dispatch  # pylint: disable=protected-access
+
+    with pytest.raises(RuntimeError):
+        await dispatch("event-test", make_frame(1))
+    await dispatch("event-test", make_frame(2))
+    await agent.flush()
+    assert agent.sio.sent == []
+    await dispatch("event-test", make_frame(1))
+    await dispatch("event-test", make_frame(2))
+    await agent.flush()
+    assert calls == [1, 2, 1]
+    assert [data["uuid"] for _, data in agent.sio.sent] == ["frame-2"]
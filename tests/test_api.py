@@ -1,4 +1,7 @@
 """Test API."""
+from datetime import datetime, timedelta, timezone
+
+from zycelium.zygote.models import Agent
 
 
 async def test_create_space(api):
@@ -194,3 +197,246 @@ async def test_delete_frame(api):
     await api.delete_frame(frame["uuid"])
     frames = await api.get_frames_for_agent(agent["uuid"])
     assert len(frames["frames"]) == 0
+
+
+async def test_create_frames(api):
+    """Test create frames in bulk."""
+    space = await api.create_space("test")
+    space2 = await api.create_space("test2")
+    agent = await api.create_agent("test")
+    frames = await api.create_frames(
+        [
+            {
+                "kind": "event",
+                "name": f"test-{i}",
+                "agent_uuid": agent["uuid"],
+                "space_uuids": [space["uuid"], space2["uuid"]],
+            }
+            for i in range(10)
+        ]
+    )
+    assert len(frames["frames"]) == 10
+    frames = await api.get_frames_for_space(space2["uuid"])
+    assert len(frames["frames"]) == 10
+    frame = await api.get_frame(frames["frames"][0]["uuid"])
+    assert frame["agent"]["uuid"] == agent["uuid"]
+    assert len(frame["spaces"]) == 2
+
+
+async def test_create_frames_skips_unknown_agent(api):
+    """Test create frames skips frames from unknown agents."""
+    space = await api.create_space("test")
+    agent = await api.create_agent("test")
+    frames = await api.create_frames(
+        [
+            {
+                "kind": "event",
+                "name": "known",
+                "agent_uuid": agent["uuid"],
+                "space_uuids": [space["uuid"]],
+            },
+            {
+                "kind": "event",
+                "name": "unknown",
+                "agent_uuid": "00000000-0000-0000-0000-000000000000",
+                "space_uuids": [space["uuid"]],
+            },
+        ]
+    )
+    assert [frame["name"] for frame in frames["frames"]] == ["known"]
+
+
+async def test_get_agent_by_token_cached(api):
+    """Test agent lookup by token is served from cache."""
+    agent = await api.create_agent("test")
+    token = await api.create_auth_token(agent["uuid"])
+    first = await api.get_agent_by_token(token["token"])
+    second = await api.get_agent_by_token(token["token"])
+    assert first == second
+    stats = api.cache_stats()["tokens"]
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+
+
+async def test_get_agent_by_token_cache_invalidated(api):
+    """Test membership changes and token deletion invalidate the cache."""
+    space = await api.create_space("test")
+    agent = await api.create_agent("test")
+    token = await api.create_auth_token(agent["uuid"])
+    assert (await api.get_agent_by_token(token["token"]))["spaces"] == []
+    await api.join_space(space["uuid"], agent["uuid"])
+    cached = await api.get_agent_by_token(token["token"])
+    assert cached["spaces"][0]["uuid"] == space["uuid"]
+    await api.delete_auth_token(token["uuid"])
+    assert (await api.get_agent_by_token(token["token"])) == {"success": False}
+
+
+async def test_get_agent_by_token_revoked_during_lookup(api, monkeypatch):
+    """Test a token revoked while it is being looked up is not cached."""
+    agent = await api.create_agent("test")
+    token = await api.create_auth_token(agent["uuid"])
+    fetch_related = Agent.fetch_related
+
+    async def revoke_then_fetch(self, *args, **kwargs):
+        await api.delete_auth_token(token["uuid"])
+        return await fetch_related(self, *args, **kwargs)
+
+    monkeypatch.setattr(Agent, "fetch_related", revoke_then_fetch)
+    assert (await api.get_agent_by_token(token["token"]))["uuid"] == agent["uuid"]
+    monkeypatch.undo()
+    assert (await api.get_agent_by_token(token["token"])) == {"success": False}
+
+
+async def test_time_filters_normalize_time_zones(api, create_frames):
+    """Test naive and non-UTC times filter frames stored in UTC alike."""
+    start = datetime(2026, 1, 5, 12, tzinfo=timezone.utc)
+    await create_frames(
+        [
+            {"name": "reading", "data": {"temp": i}, "time": start + timedelta(hours=i)}
+            for i in range(3)
+        ]
+    )
+    await api.create_field_index("reading", "temp")
+    naive = datetime(2026, 1, 5, 13)
+    local = datetime(2026, 1, 5, 15, tzinfo=timezone(timedelta(hours=2)))
+    space_uuids = [space["uuid"] for space in (await api.get_spaces())["spaces"]]
+    for since in (naive, local):
+        frames = (await api.get_frames(since=since))["frames"]
+        assert [frame["data"]["temp"] for frame in frames] == [2, 1]
+        frames = (await api.search_frames("reading", since=since))["frames"]
+        assert len(frames) == 2
+        frames = (await api.get_frames_by_field("reading", "temp", since=since))[
+            "frames"
+        ]
+        assert [frame["value"] for frame in frames] == [2, 1]
+        frames = (await api.get_frames_since(space_uuids, since))["frames"]
+        assert [frame["data"]["temp"] for frame in frames] == [2]
+
+
+async def test_get_frames_since(api):
+    """Test frames after a (time, uuid) cursor are returned oldest first."""
+    space = await api.create_space("test")
+    agent = await api.create_agent("test")
+    start = datetime.now(timezone.utc)
+    await api.create_frames(
+        [
+            {
+                "name": f"test-{i}",
+                "time": start + timedelta(seconds=i),
+                "agent_uuid": agent["uuid"],
+                "space_uuids": [space["uuid"]],
+            }
+            for i in range(5)
+        ]
+    )
+    first = (await api.get_frames_since([space["uuid"]], start, limit=2))["frames"]
+    assert [frame["name"] for frame in first] == ["test-1", "test-2"]
+    rest = await api.get_frames_since(
+        [space["uuid"]], first[-1]["time"], first[-1]["uuid"]
+    )
+    assert [frame["name"] for frame in rest["frames"]] == ["test-3", "test-4"]
+
+
+async def test_delivery_cursor(api):
+    """Test storing the last frame acknowledged by an agent."""
+    agent = await api.create_agent("test")
+    assert await api.get_delivery_cursor(agent["uuid"]) == {"time": None, "uuid": None}
+    time = datetime.now(timezone.utc)
+    frame_uuid = "00000000-0000-0000-0000-000000000001"
+    await api.set_delivery_cursor(agent["uuid"], time, frame_uuid)
+    await api.set_delivery_cursor(agent["uuid"], time, frame_uuid)
+    assert await api.get_delivery_cursor(agent["uuid"]) == {
+        "time": time,
+        "uuid": frame_uuid,
+    }
+
+
+async def test_get_frames_pages(api):
+    """Test frames are paged newest first with a cursor, and filtered."""
+    space = await api.create_space("test")
+    agent = await api.create_agent("test")
+    start = datetime.now(timezone.utc)
+    await api.create_frames(
+        [
+            {
+                "time": start + timedelta(seconds=i),
+                "kind": "event" if i % 2 else "command",
+                "name": f"test-{i}",
+                "agent_uuid": agent["uuid"],
+                "space_uuids": [space["uuid"]],
+            }
+            for i in range(5)
+        ]
+    )
+    first = await api.get_frames(limit=3)
+    assert [frame["name"] for frame in first["frames"]] == [
+        "test-4",
+        "test-3",
+        "test-2",
+    ]
+    assert first["frames"][0]["spaces"][0]["uuid"] == space["uuid"]
+    second = await api.get_frames(cursor=first["next"], limit=3)
+    assert [frame["name"] for frame in second["frames"]] == ["test-1", "test-0"]
+    assert second["next"] is None
+    events = await api.get_frames(kind="event", space_uuid=space["uuid"])
+    assert [frame["name"] for frame in events["frames"]] == ["test-3", "test-1"]
+
+
+async def test_entity_cache_hits(api):
+    """Test agents, spaces and memberships are served from cache."""
+    space = await api.create_space("test")
+    agent = await api.create_agent("test")
+    await api.join_space(space["uuid"], agent["uuid"])
+    first = await api.get_agent(agent["uuid"])
+    first["spaces"].clear()
+    second = await api.get_agent(agent["uuid"])
+    assert second["spaces"][0]["uuid"] == space["uuid"]
+    await api.get_joined_agents(space["uuid"])
+    await api.get_joined_agents(space["uuid"])
+    stats = api.cache_stats()["entities"]
+    assert stats["misses"] == 2
+    assert stats["hits"] == 2
+
+
+async def test_entity_cache_invalidated(api):
+    """Test mutations drop cached entities and lists."""
+    space = await api.create_space("test")
+    agent = await api.create_agent("test")
+    assert (await api.get_unjoined_spaces(agent["uuid"]))["spaces"] == [
+        {key: space[key] for key in ("uuid", "name", "data", "meta")}
+    ]
+    assert len((await api.get_agents())["agents"]) == 1
+    await api.create_agent("other")
+    assert len((await api.get_agents())["agents"]) == 2
+
+    await api.join_space(space["uuid"], agent["uuid"])
+    assert (await api.get_unjoined_spaces(agent["uuid"]))["spaces"] == []
+    assert len((await api.get_joined_spaces(agent["uuid"]))["spaces"]) == 1
+    await api.update_space(space["uuid"], "renamed", {}, {})
+    assert (await api.get_agent(agent["uuid"]))["spaces"][0]["name"] == "renamed"
+    await api.leave_space(space["uuid"], agent["uuid"])
+    assert (await api.get_joined_spaces(agent["uuid"]))["spaces"] == []
+    await api.update_agent(agent["uuid"], "renamed", {}, {})
+    assert (await api.get_agent_by_name("test")) == {"success": False}
+    assert (await api.get_agent_by_name("renamed"))["uuid"] == agent["uuid"]
+    await api.delete_agent(agent["uuid"])
+    assert (await api.get_agent(agent["uuid"])) == {"success": False}
+
+
+async def test_get_unjoined_pages(api):
+    """Test unjoined spaces and agents are paged by name."""
+    agent = await api.create_agent("test")
+    spaces = [await api.create_space(f"space-{i}") for i in range(5)]
+    await api.join_space(spaces[1]["uuid"], agent["uuid"])
+    names, cursor = [], None
+    while True:
+        page = await api.get_unjoined_spaces(agent["uuid"], cursor=cursor, limit=2)
+        names.extend(space["name"] for space in page["spaces"])
+        cursor = page["next"]
+        if cursor is None:
+            break
+    assert names == ["space-0", "space-2", "space-3", "space-4"]
+    other = await api.create_agent("other", {"room": ["hall", 1]}, {"v": 2})
+    agents = await api.get_unjoined_agents(spaces[1]["uuid"], limit=5)
+    assert agents == {"agents": [other], "next": None}
+    assert await api.get_unjoined_spaces("missing") == {"success": False}
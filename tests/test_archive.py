@@ -0,0 +1,117 @@
+"""Test archiving of old frames."""
+from datetime import datetime, timedelta, timezone
+
+from zycelium.zygote.archive import FrameArchive
+from zycelium.zygote.compactor import Compactor
+from zycelium.zygote.models import Frame
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def at_times(times, name="test"):
+    """Get a frame at each time."""
+    return [{"name": name, "time": time} for time in times]
+
+
+async def get_all(api, **filters):
+    """Page through every frame, return (time, uuid) keys."""
+    keys, cursor = [], None
+    while True:
+        page = await api.get_frames(cursor=cursor, limit=3, **filters)
+        keys.extend((frame["time"], frame["uuid"]) for frame in page["frames"])
+        cursor = page["next"]
+        if cursor is None:
+            return keys
+
+
+async def test_pages_read_through_to_archive(api, tmp_path, create_frames):
+    """Test listings continue past the hot window into archived frames."""
+    space = await api.create_space("test")
+    times = [NOW - timedelta(days=3, hours=i * 6) for i in range(8)]
+    times += [NOW - timedelta(minutes=i) for i in range(4)]
+    await create_frames(at_times(times), [space["uuid"]])
+    expected = await get_all(api)
+    assert len(expected) == 12
+
+    api.archive = FrameArchive(tmp_path)
+    moved = await api.archive.archive(NOW - timedelta(days=1), batch_size=3)
+    assert moved == 8
+    assert await Frame.all().count() == 4
+    # One segment per day, batches are merged into it
+    assert len(api.archive.segments()) == len({time.date() for time in times[:8]})
+
+    assert await get_all(api) == expected
+    assert await get_all(api, space_uuid=space["uuid"]) == expected
+    assert await get_all(api, until=NOW - timedelta(days=2)) == expected[4:]
+    # Indexes are read back from disk
+    api.archive = FrameArchive(tmp_path)
+    assert await get_all(api) == expected
+    frame = (await api.get_frames(limit=5))["frames"][-1]
+    assert frame["agent"]["name"] == "test"
+    assert frame["spaces"][0]["uuid"] == space["uuid"]
+
+
+async def test_segments_are_skipped_by_index(api, tmp_path, create_frames):
+    """Test filters only read segments that can match."""
+    space = await api.create_space("test")
+    old = NOW - timedelta(days=5)
+    await create_frames(at_times([old], "first"), [space["uuid"]])
+    await create_frames(at_times([old + timedelta(days=1)], "second"), [space["uuid"]])
+    api.archive = FrameArchive(tmp_path)
+    await api.archive.archive(NOW)
+    [first, _] = sorted(api.archive.segments(), key=lambda index: index["start"])
+    first["path"].unlink()
+    frames = (await api.get_frames(name="second"))["frames"]
+    assert [frame["name"] for frame in frames] == ["second"]
+
+
+async def test_replay_reads_archived_frames(api, tmp_path, create_frames):
+    """Test frames since a cursor include archived frames, oldest first."""
+    space = await api.create_space("test")
+    times = [NOW - timedelta(days=2, minutes=i) for i in range(3)]
+    times.append(NOW - timedelta(minutes=1))
+    frames = await create_frames(at_times(times), [space["uuid"]])
+    api.archive = FrameArchive(tmp_path)
+    await api.archive.archive(NOW - timedelta(days=1))
+    since = await api.get_frames_since([space["uuid"]], NOW - timedelta(days=3))
+    oldest_first = [frames[2], frames[1], frames[0], frames[3]]
+    assert [frame["uuid"] for frame in since["frames"]] == [
+        frame["uuid"] for frame in oldest_first
+    ]
+    assert set(since["frames"][0]) == {"uuid", "kind", "name", "data", "meta", "time"}
+
+
+async def test_compactor_archives_and_drops_segments(api, tmp_path, create_frames):
+    """Test the compactor archives frames and drops segments past retention."""
+    space = await api.create_space("test")
+    await create_frames(at_times([NOW - timedelta(days=10)]), [space["uuid"]])
+    await create_frames(at_times([NOW - timedelta(days=2)]), [space["uuid"]])
+    await create_frames(at_times([NOW]), [space["uuid"]])
+    api.archive = FrameArchive(tmp_path)
+    compactor = Compactor(api)
+    compactor.archive_after = 86400
+    stats = await compactor.run()
+    assert stats["frames_archived"] == 2
+    await api.create_retention_rule(max_age=5 * 86400)
+    stats = await compactor.run()
+    assert stats["segments_dropped"] == 1
+    assert len(await get_all(api)) == 2
+
+
+async def test_archives_share_a_directory(api, tmp_path, create_frames):
+    """Test an archive sees segments another process wrote or dropped since."""
+    space = await api.create_space("test")
+    noon = NOW.replace(hour=12, minute=0) - timedelta(days=2)
+    times = [noon - timedelta(minutes=i) for i in range(5)]
+    await create_frames(at_times(times), [space["uuid"]])
+    api.archive = FrameArchive(tmp_path)
+    assert api.archive.horizon is None
+
+    other = FrameArchive(tmp_path)
+    assert await other.archive(NOW - timedelta(days=1), batch_size=2) == 5
+    assert [index["count"] for index in other.segments()] == [5]
+    assert len(list(tmp_path.glob("*/*.jsonl.gz"))) == 1
+    assert len(await get_all(api)) == 5
+
+    assert other.drop_before(NOW) == 1
+    assert await get_all(api) == []
@@ -0,0 +1,56 @@
+"""Test in-memory caches."""
+import time
+
+from zycelium.zygote.cache import TTLCache
+
+
+def test_get_set():
+    """Test get and set count hits and misses."""
+    cache = TTLCache(maxsize=2)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_evicts_least_recently_used():
+    """Test the least recently used entry is evicted."""
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expires():
+    """Test entries expire after ttl."""
+    cache = TTLCache(ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_pop_where():
+    """Test removing entries by value."""
+    cache = TTLCache()
+    cache.set("a", {"uuid": "x"})
+    cache.set("b", {"uuid": "y"})
+    assert cache.pop_where(lambda value: value["uuid"] == "x") == 1
+    assert "a" not in cache
+    assert "b" in cache
+
+
+def test_pop_keys():
+    """Test removing entries by key."""
+    cache = TTLCache()
+    cache.set(("agent", "x"), 1)
+    cache.set(("space", "x"), 2)
+    assert cache.pop_keys(lambda key: key[0] == "agent") == 1
+    assert ("agent", "x") not in cache
+    assert ("space", "x") in cache
@@ -0,0 +1,66 @@
+"""Test frame retention and compaction."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from tortoise import Tortoise
+
+from zycelium.zygote.compactor import Compactor
+
+
+def frames_apart(name, count, start=None):
+    """Get frames one second apart, oldest first."""
+    start = start or datetime.now(timezone.utc) - timedelta(seconds=count)
+    return [{"name": name, "time": start + timedelta(seconds=i)} for i in range(count)]
+
+
+async def test_max_count_keeps_newest(api, create_frames):
+    """Test a count rule keeps the newest frames of that name."""
+    space = await api.create_space("test")
+    await create_frames(frames_apart("keep", 5), [space["uuid"]])
+    await create_frames(frames_apart("trim", 10), [space["uuid"]])
+    await api.create_retention_rule(name="trim", max_count=3)
+    compactor = Compactor(api)
+    compactor.batch_size = 2
+    stats = await compactor.run()
+    assert stats["frames_deleted"] == 7
+    names = [frame["name"] for frame in (await api.get_frames())["frames"]]
+    assert names.count("trim") == 3
+    assert names.count("keep") == 5
+
+
+async def test_max_age_in_space_keeps_shared_frames(api, create_frames):
+    """Test a space rule only removes frames from that space."""
+    space = await api.create_space("test")
+    other = await api.create_space("other")
+    old = datetime.now(timezone.utc) - timedelta(days=2)
+    await create_frames(frames_apart("only", 4, old), [space["uuid"]])
+    await create_frames(frames_apart("shared", 4, old), [space["uuid"], other["uuid"]])
+    await create_frames(frames_apart("new", 2), [space["uuid"]])
+    await api.create_retention_rule(space_uuid=space["uuid"], max_age=3600)
+    stats = await Compactor(api).run()
+    assert stats["space_links_deleted"] == 8
+    assert stats["frames_deleted"] == 4
+    in_space = await api.get_frames(space_uuid=space["uuid"])
+    assert {frame["name"] for frame in in_space["frames"]} == {"new"}
+    in_other = await api.get_frames(space_uuid=other["uuid"])
+    assert len(in_other["frames"]) == 4
+
+
+async def test_orphaned_links_removed(api):
+    """Test frame_space rows pointing at missing frames are removed."""
+    space = await api.create_space("test")
+    connection = Tortoise.get_connection("default")
+    await connection.execute_script("PRAGMA foreign_keys = OFF")
+    await connection.execute_query(
+        'INSERT INTO "frame_space" ("space_id", "frame_id") VALUES (?, ?)',
+        [space["uuid"], "00000000-0000-0000-0000-000000000000"],
+    )
+    await connection.execute_script("PRAGMA foreign_keys = ON")
+    stats = await Compactor(api).run()
+    assert stats["orphans_deleted"] == 1
+
+
+async def test_rule_needs_a_limit(api):
+    """Test rules without max age or count are rejected."""
+    with pytest.raises(ValueError):
+        await api.create_retention_rule(name="test")
@@ -0,0 +1,30 @@
+"""Test delivery cursors."""
+from datetime import datetime, timedelta, timezone
+
+from zycelium.zygote.delivery import DeliveryCursors
+
+
+async def test_new_agent_starts_now(api):
+    """Test agents without a cursor start at the current time."""
+    agent = await api.create_agent("test")
+    cursors = DeliveryCursors(api)
+    before = datetime.now(timezone.utc)
+    time, frame_uuid = await cursors.load(agent["uuid"])
+    assert time >= before
+    assert frame_uuid is None
+
+
+async def test_ack_moves_forward_and_saves(api):
+    """Test acks only move the cursor forward and are saved."""
+    agent = await api.create_agent("test")
+    cursors = DeliveryCursors(api)
+    time, _ = await cursors.load(agent["uuid"])
+    later = time + timedelta(seconds=1)
+    assert cursors.ack(agent["uuid"], later, "00000000-0000-0000-0000-000000000002")
+    assert not cursors.ack(agent["uuid"], time, "00000000-0000-0000-0000-000000000003")
+    await cursors.save()
+
+    assert await DeliveryCursors(api).load(agent["uuid"]) == (
+        later,
+        "00000000-0000-0000-0000-000000000002",
+    )
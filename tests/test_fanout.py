@@ -0,0 +1,85 @@
+"""Test frame fan-out."""
+import socketio
+
+from zycelium.zygote.fanout import FanOut
+from zycelium.zygote.routing import RoutingRegistry
+
+
+class FakeManager:
+    """Socket.io manager that knows every sid."""
+
+    def eio_sid_from_sid(self, sid, _namespace):
+        """Map sid to engine.io sid."""
+        return f"eio-{sid}"
+
+
+class FakeEngineIO:
+    """Engine.io server that records sent packets."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, eio_sid, data):
+        """Record packet."""
+        self.sent.append((eio_sid, data))
+
+
+class FakeServer:
+    """Socket.io server with fake transport."""
+
+    packet_class = socketio.packet.Packet
+
+    def __init__(self):
+        self.manager = FakeManager()
+        self.eio = FakeEngineIO()
+
+
+def make_routes() -> RoutingRegistry:
+    """Two agents, one of them in both spaces."""
+    routes = RoutingRegistry()
+    routes.add(
+        "sid-1",
+        {
+            "uuid": "agent-1",
+            "name": "one",
+            "spaces": [
+                {"uuid": "home", "name": "home"},
+                {"uuid": "work", "name": "work"},
+            ],
+        },
+    )
+    routes.add(
+        "sid-2",
+        {
+            "uuid": "agent-2",
+            "name": "two",
+            "spaces": [{"uuid": "home", "name": "home"}],
+        },
+    )
+    return routes
+
+
+async def test_deliver_once_per_recipient():
+    """Test agents in several target spaces get the frame once."""
+    server = FakeServer()
+    fanout = FanOut(server, make_routes())
+    count = await fanout.deliver("event-test", {"name": "test"}, ["home", "work"])
+    assert count == 2
+    assert sorted(eio_sid for eio_sid, _ in server.eio.sent) == [
+        "eio-sid-1",
+        "eio-sid-2",
+    ]
+    encoded = {data for _, data in server.eio.sent}
+    assert len(encoded) == 1
+    stats = fanout.stats()
+    assert stats["duplicates_suppressed"] == 1
+    assert stats["bytes_saved"] == len(encoded.pop())
+    assert stats["encodes_saved"] == 1
+
+
+async def test_deliver_to_empty_space():
+    """Test nothing is sent to a space without agents."""
+    server = FakeServer()
+    fanout = FanOut(server, make_routes())
+    assert await fanout.deliver("event-test", {"name": "test"}, ["garden"]) == 0
+    assert server.eio.sent == []
@@ -0,0 +1,92 @@
+"""Test indexed queries on frame data fields."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from tortoise import Tortoise
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def readings(temps, name="openweather/current"):
+    """Get a frame per temperature, a minute apart, oldest first."""
+    return [
+        {
+            "name": name,
+            "data": {"main": {"temp": temp}},
+            "time": NOW - timedelta(minutes=len(temps) - i),
+        }
+        for i, temp in enumerate(temps)
+    ]
+
+
+async def test_range_query_on_indexed_field(api, create_frames):
+    """Test existing and new frames are indexed and queried by value and time."""
+    frames = await create_frames(readings([12, 31.5, "n/a", 35, 28]))
+    await create_frames(readings([40], name="other"))
+    field = await api.create_field_index("openweather/current", "main.temp")
+    assert field["path"] == "main.temp"
+    frames += await create_frames(readings([33]))
+
+    result = await api.get_frames_by_field("openweather/current", "main.temp", gt=30)
+    assert [frame["value"] for frame in result["frames"]] == [33, 35, 31.5]
+    assert result["frames"][0]["uuid"] == frames[-1]["uuid"]
+
+    recent = await api.get_frames_by_field(
+        "openweather/current",
+        "main.temp",
+        gt=30,
+        since=NOW - timedelta(minutes=3),
+    )
+    assert [frame["value"] for frame in recent["frames"]] == [33, 35]
+    text = await api.get_frames_by_field("openweather/current", "main.temp", eq="n/a")
+    assert [frame["uuid"] for frame in text["frames"]] == [frames[2]["uuid"]]
+
+    await api.delete_frame(frames[3]["uuid"])
+    result = await api.get_frames_by_field("openweather/current", "main.temp", gte=30)
+    assert [frame["value"] for frame in result["frames"]] == [33, 31.5]
+
+
+async def test_field_query_pages(api, create_frames):
+    """Test every match is returned once across pages."""
+    await create_frames(readings(list(range(7))))
+    await api.create_field_index("openweather/current", "main.temp")
+    values, cursor = [], None
+    while True:
+        page = await api.get_frames_by_field(
+            "openweather/current", "main.temp", cursor=cursor, limit=3
+        )
+        values.extend(frame["value"] for frame in page["frames"])
+        cursor = page["next"]
+        if cursor is None:
+            break
+    assert values == [6, 5, 4, 3, 2, 1, 0]
+
+
+async def test_field_index_uses_index(api):
+    """Test range queries on a field do not scan the frame table."""
+    field = await api.create_field_index("openweather/current", "main.temp")
+    connection = Tortoise.get_connection("default")
+    plan = await connection.execute_query_dict(
+        'EXPLAIN QUERY PLAN SELECT frame_id FROM "frame_field" '
+        "WHERE field_id = ? AND value > ? AND time >= ? "
+        "ORDER BY time DESC, frame_id DESC LIMIT 10",
+        [field["uuid"], 30, NOW],
+    )
+    details = " ".join(row["detail"] for row in plan)
+    assert "USING INDEX" in details
+    assert "SCAN" not in details.replace("SCAN frame_field USING INDEX", "")
+
+
+async def test_field_index_lifecycle(api, create_frames):
+    """Test invalid paths are rejected and removing an index drops its values."""
+    with pytest.raises(ValueError):
+        await api.create_field_index("openweather/current", "main.temp'")
+    await create_frames(readings([20]))
+    field = await api.create_field_index("openweather/current", "main.temp")
+    assert (await api.get_field_indexes())["fields"] == [field]
+    assert await api.delete_field_index(field["uuid"]) == {"success": True}
+    connection = Tortoise.get_connection("default")
+    rows = await connection.execute_query_dict('SELECT * FROM "frame_field"')
+    assert rows == []
+    result = await api.get_frames_by_field("openweather/current", "main.temp")
+    assert result == {"success": False}
@@ -0,0 +1,156 @@
+"""Test agent hosts."""
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import types
+
+import pytest
+
+from zycelium.zygote.host import host_agents, pack_agents, run_hosted
+from zycelium.zygote.supervisor import RestartPolicy, Supervisor
+
+
+class FakeAgent:
+    """Agent that counts runs, then fails or waits forever."""
+
+    def __init__(self, fail: bool):
+        self.fail = fail
+        self.runs = 0
+
+    async def run(self, url: str, auth: dict) -> None:
+        """Run agent."""
+        assert url == "https://localhost:3965" and auth["token"]
+        self.runs += 1
+        if self.fail:
+            raise RuntimeError("bot_token is empty")
+        await asyncio.Event().wait()
+
+
+class DrainingAgent:
+    """Agent that records when it starts and when it drains on cancel."""
+
+    def __init__(self, path):
+        self.path = path
+
+    async def run(self, url: str, auth: dict) -> None:
+        """Run agent, like `Agent.run` it returns when cancelled."""
+        (self.path / f"started-{auth['token']}").touch()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            await asyncio.sleep(0.05)
+            (self.path / f"drained-{auth['token']}").touch()
+
+
+def add_agent_module(monkeypatch, name: str, fail: bool, agent=None) -> FakeAgent:
+    """Make an importable agent module."""
+    module = types.ModuleType(name)
+    module.agent = agent or FakeAgent(fail)  # type: ignore
+    monkeypatch.setitem(sys.modules, name, module)
+    return module.agent  # type: ignore
+
+
+def test_pack_agents():
+    """Test agents are grouped by strategy, size and isolation."""
+    names = ["a", "b", "c", "d", "e"]
+    assert pack_agents(names) == [["a"], ["b"], ["c"], ["d"], ["e"]]
+    assert pack_agents(names, "host") == [names]
+    assert pack_agents(names, "host", host_size=2, isolate=["c"]) == [
+        ["c"],
+        ["a", "b"],
+        ["d", "e"],
+    ]
+    assert pack_agents([], "host") == []
+    with pytest.raises(ValueError):
+        pack_agents(names, "thread")
+
+
+async def test_hosted_agents_are_isolated(monkeypatch):
+    """Test a failing agent is quarantined while the others keep running."""
+    healthy = add_agent_module(monkeypatch, "hosted_healthy", fail=False)
+    failing = add_agent_module(monkeypatch, "hosted_failing", fail=True)
+    agents = {
+        "hosted_healthy": {"token": "a"},
+        "hosted_failing": {"token": "b"},
+        "hosted_missing": {"token": "c"},
+    }
+    policy = RestartPolicy(backoff=0.01, max_restarts=2)
+    host = asyncio.create_task(run_hosted(agents, "https://localhost:3965", policy))
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if failing.runs == 3:
+            break
+    await asyncio.sleep(0.05)
+    assert (healthy.runs, failing.runs) == (1, 3)
+    assert not host.done()
+    host.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await host
+
+
+def test_hosted_agents_drain_on_terminate(monkeypatch, tmp_path):
+    """Test a terminated host cancels its agents and waits for them to drain."""
+    add_agent_module(monkeypatch, "hosted_draining", False, DrainingAgent(tmp_path))
+    agents = {"hosted_draining": {"token": "a"}}
+    # Forked so the host sees the agent module
+    process = multiprocessing.get_context("fork").Process(
+        target=host_agents, args=(agents, "https://localhost:3965")
+    )
+    process.start()
+    for _ in range(200):
+        if (tmp_path / "started-a").exists():
+            break
+        time.sleep(0.01)
+    os.kill(process.pid, signal.SIGTERM)
+    process.join(5)
+    assert process.exitcode == 0
+    assert (tmp_path / "drained-a").exists()
+
+
+async def wait_for_status(sup: Supervisor, name: str, **expected) -> dict:
+    """Wait until the status of a process or hosted agent matches expected."""
+    for _ in range(250):
+        status = (await sup.status())[name]
+        if all(status[key] == value for key, value in expected.items()):
+            return status
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"{name} is {status}, expected {expected}")
+
+
+async def test_supervised_host_reports_quarantine(monkeypatch):
+    """Test hosted agents are quarantined and resumed through the supervisor."""
+    add_agent_module(monkeypatch, "reported_healthy", fail=False)
+    add_agent_module(monkeypatch, "reported_failing", fail=True)
+    agents = {"reported_healthy": {"token": "a"}, "reported_failing": {"token": "b"}}
+    sup = Supervisor(
+        RestartPolicy(backoff=0.01, max_restarts=1),
+        # Forked so the host sees the agent modules
+        multiprocessing.get_context("fork"),
+    )
+    await sup.add_process(
+        "agent-host-0",
+        host_agents,
+        agents,
+        url="https://localhost:3965",
+        restart_policy=sup.policy,
+        members=agents,
+    )
+    await sup.start()
+    try:
+        await wait_for_status(sup, "reported_failing", state="quarantined", restarts=1)
+        await wait_for_status(sup, "reported_healthy", state="running")
+        host = await wait_for_status(sup, "agent-host-0", state="running")
+
+        await sup.resume("reported_failing")
+        await wait_for_status(sup, "reported_failing", state="quarantined", restarts=2)
+
+        # A restarted host keeps the quarantine
+        os.kill(host["pid"], signal.SIGKILL)
+        status = await wait_for_status(sup, "reported_failing", restarts=0)
+        assert status["state"] == "quarantined"
+        assert status["pid"] != host["pid"]
+    finally:
+        await sup.stop(timeout=1)
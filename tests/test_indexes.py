@@ -0,0 +1,68 @@
+"""Test frame queries are served by indexes."""
+from datetime import datetime, timezone
+
+from tortoise import Tortoise
+from tortoise.expressions import Q
+
+from zycelium.zygote.models import Frame
+
+NOW = datetime.now(timezone.utc)
+FRAME_UUID = "00000000-0000-0000-0000-000000000000"
+
+
+async def query_plan(queryset) -> list:
+    """Get the query plan of a queryset, one line per step."""
+    connection = Tortoise.get_connection("default")
+    rows = await connection.execute_query_dict(f"EXPLAIN QUERY PLAN {queryset.sql()}")
+    return [row["detail"] for row in rows]
+
+
+def latest(queryset):
+    """Order a queryset like a page of `ZygoteAPI.get_frames`."""
+    after = Q(time__lt=NOW) | Q(time=NOW, uuid__lt=FRAME_UUID)
+    return queryset.filter(after).order_by("-time", "-uuid").limit(100)
+
+
+def assert_indexed(plan: list, search: str) -> None:
+    """Check plan searches frames through an index and does not sort."""
+    assert any(
+        step.startswith("SEARCH frame USING INDEX") and step.endswith(search)
+        for step in plan
+    ), plan
+    assert not any("TEMP B-TREE FOR ORDER BY" in step for step in plan), plan
+    assert not any("AUTOMATIC" in step for step in plan), plan
+
+
+async def test_latest_frames_plan(api):
+    """Test listing the latest frames walks the (time, uuid) index."""
+    plan = await query_plan(latest(Frame.all()))
+    assert_indexed(plan, "(time<?)")
+
+
+async def test_latest_frames_by_name_plan(api):
+    """Test listing frames by name uses the (name, time, uuid) index."""
+    plan = await query_plan(latest(Frame.filter(name="test")))
+    assert_indexed(plan, "(name=? AND time<?)")
+
+
+async def test_frames_by_agent_in_time_range_plan(api):
+    """Test listing frames of an agent in a time range uses an index."""
+    plan = await query_plan(
+        latest(Frame.filter(agent_id=FRAME_UUID, time__gte=NOW, time__lt=NOW))
+    )
+    assert_indexed(plan, "(agent_id=? AND time>? AND time<?)")
+
+
+async def test_frames_by_kind_plan(api):
+    """Test listing frames by kind uses the (kind, time, uuid) index."""
+    plan = await query_plan(latest(Frame.filter(kind="event")))
+    assert_indexed(plan, "(kind=? AND time<?)")
+
+
+async def test_frames_in_space_plan(api):
+    """Test listing frames in a space uses the through-table index."""
+    plan = await query_plan(latest(Frame.filter(spaces__uuid=FRAME_UUID)))
+    assert_indexed(plan, "(time<?)")
+    assert any(
+        "frame_space USING COVERING INDEX idx_frame_space" in step for step in plan
+    ), plan
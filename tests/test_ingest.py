@@ -0,0 +1,172 @@
+"""Test write-behind frame ingest."""
+import asyncio
+
+import pytest
+
+from zycelium.zygote.ingest import FrameWriter
+
+
+async def setup_agent_and_space(api):
+    """Create an agent that joined a space."""
+    space = await api.create_space("test")
+    agent = await api.create_agent("test")
+    await api.join_space(space["uuid"], agent["uuid"])
+    return agent, space
+
+
+async def test_submit_without_start_writes_through(api):
+    """Test submit writes immediately when the writer is not running."""
+    agent, space = await setup_agent_and_space(api)
+    writer = FrameWriter(api)
+    await writer.submit(
+        kind="event", name="test", agent_uuid=agent["uuid"], space_uuids=[space["uuid"]]
+    )
+    frames = await api.get_frames_for_agent(agent["uuid"])
+    assert len(frames["frames"]) == 1
+
+
+async def test_async_batches_and_flush(api):
+    """Test frames are written in batches and flushed on stop."""
+    agent, space = await setup_agent_and_space(api)
+    writer = FrameWriter(api)
+    await writer.start(batch_size=10, batch_interval=1.0)
+    for i in range(25):
+        await writer.submit(
+            kind="event",
+            name=f"test-{i}",
+            agent_uuid=agent["uuid"],
+            space_uuids=[space["uuid"]],
+        )
+    await writer.stop()
+    frames = await api.get_frames_for_agent(agent["uuid"])
+    assert len(frames["frames"]) == 25
+    stats = writer.stats()
+    assert stats["written"] == 25
+    assert stats["batches"] == 3
+    assert stats["pending"] == 0
+
+
+async def test_sync_waits_for_commit(api):
+    """Test sync durability returns after the frame is stored."""
+    agent, space = await setup_agent_and_space(api)
+    writer = FrameWriter(api)
+    await writer.start(durability="sync", batch_interval=0.01)
+    await writer.submit(
+        kind="event", name="test", agent_uuid=agent["uuid"], space_uuids=[space["uuid"]]
+    )
+    frames = await api.get_frames_for_agent(agent["uuid"])
+    assert len(frames["frames"]) == 1
+    await writer.stop()
+
+
+async def test_bounded_queue_backpressure(api):
+    """Test submit blocks while the queue is full."""
+    agent, space = await setup_agent_and_space(api)
+    writer = FrameWriter(api)
+    await writer.start(batch_size=1, batch_interval=0.0, queue_size=1)
+    frame = {
+        "kind": "event",
+        "name": "test",
+        "agent_uuid": agent["uuid"],
+        "space_uuids": [space["uuid"]],
+    }
+    submits = [asyncio.create_task(writer.submit(**frame)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert writer.stats()["pending"] <= 1
+    await asyncio.gather(*submits)
+    await writer.stop()
+    frames = await api.get_frames_for_agent(agent["uuid"])
+    assert len(frames["frames"]) == 5
+
+
+async def test_unknown_durability_fails(api):
+    """Test unknown durability mode is rejected."""
+    writer = FrameWriter(api)
+    with pytest.raises(ValueError):
+        await writer.start(durability="maybe")
+
+
+async def test_submit_many_keeps_order(api):
+    """Test frames submitted together are written in order."""
+    agent, space = await setup_agent_and_space(api)
+    writer = FrameWriter(api)
+    await writer.start(durability="sync", batch_size=2, batch_interval=0.01)
+    await writer.submit_many(
+        [
+            {
+                "kind": "event",
+                "name": f"test-{i}",
+                "agent_uuid": agent["uuid"],
+                "space_uuids": [space["uuid"]],
+            }
+            for i in range(5)
+        ]
+    )
+    assert writer.stats()["written"] == 5
+    await writer.stop()
+
+
+async def test_flush_under_load(api):
+    """Test flush waits for frames queued before it, not for an empty queue."""
+    agent, space = await setup_agent_and_space(api)
+    writer = FrameWriter(api)
+    await writer.start(batch_size=5, batch_interval=0.0, queue_size=20)
+    frame = {
+        "kind": "event",
+        "name": "test",
+        "agent_uuid": agent["uuid"],
+        "space_uuids": [space["uuid"]],
+    }
+
+    async def produce():
+        while True:
+            await writer.submit(**frame)
+            await asyncio.sleep(0)
+
+    producer = asyncio.create_task(produce())
+    try:
+        await asyncio.sleep(0.05)
+        queued = writer.stats()["queued"]
+        await asyncio.wait_for(writer.flush(), timeout=5)
+        assert writer.stats()["written"] >= queued
+    finally:
+        producer.cancel()
+    await writer.stop()
+
+
+class FailingAPI:
+    """API that fails the first write, and every write of a "bad" frame."""
+
+    def __init__(self, api):
+        self.api = api
+        self.calls = 0
+
+    async def create_frames(self, frames: list) -> dict:
+        """Create frames, or fail."""
+        self.calls += 1
+        if self.calls == 1 or any(frame["name"] == "bad" for frame in frames):
+            return {"success": False}
+        return await self.api.create_frames(frames)
+
+
+async def test_failed_write_drops_only_bad_frames(api):
+    """Test failed batches are retried, then written a frame at a time."""
+    agent, space = await setup_agent_and_space(api)
+    writer = FrameWriter(FailingAPI(api))  # type: ignore
+    await writer.start(batch_size=10, batch_interval=1.0, retry_backoff=0.001)
+    await writer.submit_many(
+        [
+            {
+                "kind": "event",
+                "name": name,
+                "agent_uuid": agent["uuid"],
+                "space_uuids": [space["uuid"]],
+            }
+            for name in ["a", "b", "bad", "c"]
+        ]
+    )
+    await writer.stop()
+    frames = await api.get_frames_for_agent(agent["uuid"])
+    assert sorted(frame["name"] for frame in frames["frames"]) == ["a", "b", "c"]
+    stats = writer.stats()
+    assert (stats["written"], stats["failed"], stats["retries"]) == (3, 1, 3)
@@ -0,0 +1,150 @@
+"""Test rollups of numeric frame fields."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from tortoise import Tortoise
+
+from zycelium.zygote import rollup
+from zycelium.zygote.models import FIELD_ROLLUPS_REBUILD, ROLLUP_RESOLUTIONS, Frame
+
+# Start of a day, readings are placed at known offsets from it
+DAY = datetime(2026, 1, 5, tzinfo=timezone.utc)
+NAME = "openweather/current"
+
+
+def readings(offsets_and_temps):
+    """Get a frame per (seconds after DAY, temperature)."""
+    return [
+        {
+            "name": NAME,
+            "data": {"main": {"temp": temp}},
+            "time": DAY + timedelta(seconds=offset),
+        }
+        for offset, temp in offsets_and_temps
+    ]
+
+
+READINGS = [(10, 20.0), (50, 24.0), (70, 21), (3700, 30.5), (3650, "n/a")]
+
+
+async def test_rollups_are_updated_at_ingest(api, create_frames):
+    """Test values are added to minute, hour and day buckets as frames arrive."""
+    await api.create_field_index(NAME, "main.temp")
+    frames = await create_frames(readings(READINGS))
+
+    minutes = (await api.get_rollups(NAME, "main.temp", resolution=60))["buckets"]
+    assert [bucket["time"] for bucket in minutes] == [
+        DAY,
+        DAY + timedelta(minutes=1),
+        DAY + timedelta(minutes=61),
+    ]
+    assert minutes[0] == {
+        "time": DAY,
+        "count": 2,
+        "min": 20.0,
+        "max": 24.0,
+        "sum": 44.0,
+        "mean": 22.0,
+        "last": 24.0,
+    }
+    hours = (await api.get_rollups(NAME, "main.temp"))["buckets"]
+    assert [bucket["count"] for bucket in hours] == [3, 1]
+    [day] = (await api.get_rollups(NAME, "main.temp", resolution=86400))["buckets"]
+    assert (day["count"], day["min"], day["max"], day["last"]) == (4, 20.0, 30.5, 30.5)
+
+    # Late frames do not replace the last value, deleted frames stay rolled up
+    await create_frames(readings([(5, 99)]))
+    await api.delete_frame(frames[0]["uuid"])
+    [day] = (await api.get_rollups(NAME, "main.temp", resolution=86400))["buckets"]
+    assert (day["count"], day["max"], day["last"]) == (5, 99.0, 30.5)
+
+    with pytest.raises(ValueError):
+        await api.get_rollups(NAME, "main.temp", resolution=120)
+
+
+async def test_downsample_picks_source(api, create_frames):
+    """Test windows are built from the coarsest rollups that fit, or raw values."""
+    await create_frames(readings(READINGS))
+    await api.create_field_index(NAME, "main.temp")
+
+    result = await api.downsample(NAME, "main.temp", window=2 * 3600)
+    assert result["resolution"] == 3600
+    assert [bucket["count"] for bucket in result["buckets"]] == [4]
+
+    result = await api.downsample(NAME, "main.temp", window=120)
+    assert result["resolution"] == 60
+    assert [bucket["count"] for bucket in result["buckets"]] == [3, 1]
+
+    result = await api.downsample(NAME, "main.temp", window=45)
+    assert result["resolution"] is None
+    assert [bucket["sum"] for bucket in result["buckets"]] == [20.0, 45.0, 30.5]
+
+    result = await api.downsample(
+        NAME, "main.temp", window=60, since=DAY + timedelta(seconds=30)
+    )
+    assert [bucket["count"] for bucket in result["buckets"]] == [2, 1, 1]
+
+
+async def test_rebuild_matches_incremental(api, create_frames):
+    """Test rolling up existing values gives the same buckets as ingest."""
+    await api.create_field_index(NAME, "main.temp")
+    await create_frames(readings(READINGS))
+    expected = await api.get_rollups(NAME, "main.temp", resolution=60)
+    connection = Tortoise.get_connection("default")
+    await connection.execute_script('DELETE FROM "field_rollup"')
+    await connection.execute_script(FIELD_ROLLUPS_REBUILD)
+    assert await api.get_rollups(NAME, "main.temp", resolution=60) == expected
+
+
+async def test_updated_frames_are_rolled_up_once(api, create_frames):
+    """Test changed values, times and names replace their rollups."""
+    await api.create_field_index(NAME, "main.temp")
+    frames = await create_frames(readings(READINGS))
+    # Lower the maximum, move a frame to the next minute, rename the last
+    await Frame.filter(uuid=frames[1]["uuid"]).update(data={"main": {"temp": 22.5}})
+    await Frame.filter(uuid=frames[0]["uuid"]).update(time=DAY + timedelta(seconds=65))
+    await Frame.filter(uuid=frames[3]["uuid"]).update(name="other")
+
+    [day] = (await api.get_rollups(NAME, "main.temp", resolution=86400))["buckets"]
+    assert (day["count"], day["min"], day["max"], day["sum"], day["last"]) == (
+        3,
+        20.0,
+        22.5,
+        63.5,
+        21.0,
+    )
+    minutes = (await api.get_rollups(NAME, "main.temp", resolution=60))["buckets"]
+    assert [(bucket["count"], bucket["last"]) for bucket in minutes] == [
+        (1, 22.5),
+        (2, 21.0),
+    ]
+    # Same as rolling up the current values from scratch
+    expected = {
+        resolution: await api.get_rollups(NAME, "main.temp", resolution=resolution)
+        for resolution in ROLLUP_RESOLUTIONS
+    }
+    connection = Tortoise.get_connection("default")
+    await connection.execute_script('DELETE FROM "field_rollup"')
+    await connection.execute_script(FIELD_ROLLUPS_REBUILD)
+    for resolution, rollups in expected.items():
+        assert (
+            await api.get_rollups(NAME, "main.temp", resolution=resolution) == rollups
+        )
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_combine(monkeypatch, vectorized):
+    """Test windows are merged the same with and without NumPy."""
+    if vectorized:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(rollup, "numpy", None)
+    rows = [(0, 2, 1.0, 5.0, 6.0, 5.0), (60, 1, -1.0, -1.0, -1.0, -1.0)]
+    rows.append((180, 3, 2.0, 4.0, 9.0, 2.0))
+    windows = rollup.combine(rows, 120)
+    assert [(w["count"], w["min"], w["max"], w["sum"], w["last"]) for w in windows] == [
+        (3, -1.0, 5.0, 5.0, -1.0),
+        (3, 2.0, 4.0, 9.0, 2.0),
+    ]
+    assert windows[1]["time"] == datetime(1970, 1, 1, 0, 2, tzinfo=timezone.utc)
+    assert rollup.combine([], 60) == []
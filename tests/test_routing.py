@@ -0,0 +1,76 @@
+"""Test the routing registry."""
+from zycelium.zygote.routing import RoutingRegistry
+
+AGENT = {
+    "uuid": "agent-1",
+    "name": "weather",
+    "spaces": [
+        {"uuid": "space-1", "name": "home"},
+        {"uuid": "space-2", "name": "work"},
+    ],
+}
+
+
+def test_add_and_remove():
+    """Test adding and removing connected agents."""
+    routes = RoutingRegistry()
+    route = routes.add("sid-1", AGENT)
+    assert route.name == "weather"
+    assert routes.sids_for_space("space-1") == {"sid-1"}
+    assert routes.sids_for_agent("agent-1") == {"sid-1"}
+    routes.remove("sid-1")
+    assert len(routes) == 0
+    assert routes.sids_for_space("space-1") == set()
+
+
+def test_resolve():
+    """Test resolving target spaces by name."""
+    routes = RoutingRegistry()
+    routes.add("sid-1", AGENT)
+    assert routes.resolve("sid-1") == ["space-1", "space-2"]
+    assert routes.resolve("sid-1", ["work", "unknown"]) == ["space-2"]
+
+
+def test_join_and_leave():
+    """Test live membership changes."""
+    routes = RoutingRegistry()
+    routes.add("sid-1", AGENT)
+    assert routes.join("agent-1", "space-3", "garden") == ["sid-1"]
+    assert routes.resolve("sid-1", ["garden"]) == ["space-3"]
+    assert routes.sids_for_space("space-3") == {"sid-1"}
+    routes.leave("agent-1", "space-1")
+    assert routes.resolve("sid-1", ["home"]) == []
+    assert routes.sids_for_space("space-1") == set()
+
+
+def test_rename_space():
+    """Test renaming a space keeps its uuid."""
+    routes = RoutingRegistry()
+    routes.add("sid-1", AGENT)
+    routes.rename_space("space-1", "house")
+    assert routes.resolve("sid-1", ["house"]) == ["space-1"]
+    assert routes.resolve("sid-1", ["home"]) == []
+
+
+def test_names_are_interned():
+    """Test agents share interned strings."""
+    routes = RoutingRegistry()
+    first = routes.add("sid-1", AGENT)
+    second = routes.add("sid-2", {**AGENT, "name": "".join(["wea", "ther"])})
+    assert first.name is second.name
+
+
+async def test_api_membership_updates_broker_routes(api):
+    """Test the broker routes follow membership changes made through the API."""
+    from zycelium.zygote.broker import routes  # pylint: disable=import-outside-toplevel
+
+    space = await api.create_space("test")
+    agent = await api.create_agent("test")
+    routes.add("sid-test", await api.get_agent(agent["uuid"]))
+    try:
+        await api.join_space(space["uuid"], agent["uuid"])
+        assert routes.resolve("sid-test", ["test"]) == [space["uuid"]]
+        await api.leave_space(space["uuid"], agent["uuid"])
+        assert routes.resolve("sid-test", ["test"]) == []
+    finally:
+        routes.remove("sid-test")
@@ -0,0 +1,90 @@
+"""Test full-text search of frames."""
+from tortoise import Tortoise
+
+from zycelium.zygote.api import match_query
+from zycelium.zygote.models import FRAME_SEARCH_REBUILD
+
+
+def test_match_query():
+    """Test words are quoted and trailing stars kept."""
+    assert match_query('temp-sensor "a" kitch*') == '"temp-sensor" """a""" "kitch"*'
+    assert match_query("  * ") == ""
+
+
+async def test_search_matches_name_and_data(api, create_frames):
+    """Test data keys, nested values and names are searchable, names rank first."""
+    frames = await create_frames(
+        [
+            {"name": "kitchen/light", "data": {"state": "on"}},
+            {"name": "hall/light", "data": {"room": {"label": "kitchen"}}},
+            {"name": "garden/sensor", "data": {"readings": [21.5, "dry"]}},
+        ],
+    )
+    result = await api.search_frames("kitchen")
+    assert [frame["uuid"] for frame in result["frames"]] == [
+        frames[0]["uuid"],
+        frames[1]["uuid"],
+    ]
+    assert "[kitchen]" in result["frames"][1]["snippet"]
+    assert len((await api.search_frames("label kitchen"))["frames"]) == 1
+    assert len((await api.search_frames("readings dry"))["frames"]) == 1
+    assert len((await api.search_frames("gard*"))["frames"]) == 1
+    assert (await api.search_frames("AND OR ("))["frames"] == []
+
+    await api.delete_frame(frames[0]["uuid"])
+    result = await api.search_frames("kitchen")
+    assert [frame["uuid"] for frame in result["frames"]] == [frames[1]["uuid"]]
+
+
+async def test_search_pages_and_filters(api, create_frames):
+    """Test results are paged and filtered like frame listings."""
+    space = await api.create_space("test")
+    frames = await create_frames(
+        [
+            {"kind": "event" if i % 2 else "message", "name": "log", "data": {"n": i}}
+            for i in range(7)
+        ],
+        [space["uuid"]],
+    )
+    seen, cursor = [], None
+    while True:
+        page = await api.search_frames("log", cursor=cursor, limit=3)
+        seen.extend(frame["uuid"] for frame in page["frames"])
+        cursor = page["next"]
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(frame["uuid"] for frame in frames)
+    events = await api.search_frames("log", kind="event", space_uuid=space["uuid"])
+    assert len(events["frames"]) == 3
+    other = await api.create_space("other")
+    assert (await api.search_frames("log", space_uuid=other["uuid"]))["frames"] == []
+
+
+async def test_rebuild_keeps_results(api, create_frames):
+    """Test the search index can be rebuilt from the frame table."""
+    await create_frames([{"name": "door", "data": {"open": True}}])
+    connection = Tortoise.get_connection("default")
+    await connection.execute_script(FRAME_SEARCH_REBUILD)
+    assert len((await api.search_frames("door open"))["frames"]) == 1
+
+
+async def test_search_survives_vacuum(api, create_frames):
+    """Test hits and deletes follow frames when VACUUM renumbers rowids."""
+    frames = await create_frames(
+        [
+            {"name": f"lamp/{i}", "data": {"word": "lamp" if i else "gone"}}
+            for i in range(3)
+        ]
+    )
+    await api.delete_frame(frames[0]["uuid"])
+    # As VACUUM may do, move frames to other rowids, the first to a free one
+    connection = Tortoise.get_connection("default")
+    await connection.execute_script('UPDATE "frame" SET rowid = rowid - 1')
+
+    result = await api.search_frames("lamp")
+    assert sorted(frame["uuid"] for frame in result["frames"]) == sorted(
+        [frames[1]["uuid"], frames[2]["uuid"]]
+    )
+    await api.delete_frame(frames[1]["uuid"])
+    result = await api.search_frames("lamp")
+    assert [frame["uuid"] for frame in result["frames"]] == [frames[2]["uuid"]]
@@ -0,0 +1,87 @@
+"""Test conversion of rows and responses to JSON."""
+import json
+from datetime import datetime, timezone
+from uuid import UUID
+
+import pytest
+
+from zycelium.zygote import serializers
+from zycelium.zygote.models import Frame
+
+TIME = datetime(2026, 1, 5, 12, 30, 0, 250, tzinfo=timezone.utc)
+
+
+async def rows(count):
+    """Yield count rows."""
+    for i in range(count):
+        yield {"n": i, "time": TIME}
+
+
+@pytest.mark.parametrize("backend", ["json", "orjson"])
+def test_dumps(monkeypatch, backend):
+    """Test both backends encode datetimes, uuids and large numbers alike."""
+    if backend == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(serializers, "orjson", None)
+    uuid = UUID("12345678-1234-5678-1234-567812345678")
+    encoded = serializers.dumps({"time": TIME, "uuid": uuid, "big": 2**70, "n": None})
+    assert json.loads(encoded) == {
+        "time": "2026-01-05T12:30:00.000250+00:00",
+        "uuid": str(uuid),
+        "big": 2**70,
+        "n": None,
+    }
+    assert serializers.loads(encoded)["big"] == 2**70
+
+
+@pytest.mark.parametrize("count", [0, 1, 3])
+async def test_stream_response(count):
+    """Test rows stream as a JSON array or NDJSON."""
+    response = serializers.stream_response(rows(count))
+    assert response.mimetype == "application/json"
+    assert json.loads(await response.get_data()) == [
+        {"n": i, "time": TIME.isoformat()} for i in range(count)
+    ]
+    response = serializers.stream_response(rows(count), serializers.NDJSON_MIMETYPE)
+    lines = (await response.get_data()).decode().splitlines()
+    assert [json.loads(line)["n"] for line in lines] == list(range(count))
+
+
+async def test_converter_shares_entities(api):
+    """Test frames of one agent and space share their converted dicts."""
+    agent = await api.create_agent("test")
+    space = await api.create_space("test")
+    await api.create_frames(
+        [
+            {
+                "name": f"frame-{i}",
+                "agent_uuid": agent["uuid"],
+                "space_uuids": [space["uuid"]],
+            }
+            for i in range(3)
+        ]
+    )
+    converter = serializers.RowConverter()
+    frames = [
+        converter.frame(frame)
+        for frame in await Frame.all().prefetch_related("agent", "spaces")
+    ]
+    assert frames[0]["agent"] == {
+        "uuid": agent["uuid"],
+        "name": "test",
+        "data": {},
+        "meta": {},
+    }
+    assert frames[0]["agent"] is frames[2]["agent"]
+    assert frames[0]["spaces"][0] is frames[1]["spaces"][0]
+    assert set(frames[1]) == {
+        "uuid",
+        "kind",
+        "name",
+        "data",
+        "meta",
+        "time",
+        "agent",
+        "spaces",
+    }
@@ -0,0 +1,136 @@
+"""Test the server."""
+import asyncio
+import socket
+
+import uvicorn
+
+from zycelium.zygote.agent import Agent
+from zycelium.zygote.broker import routes
+from zycelium.zygote.host import run_until_terminated
+from zycelium.zygote.ingest import frame_writer
+from zycelium.zygote.server import DrainingServer, sio_app, sup
+
+draining_agent = Agent("draining", coalesce=60)
+
+
+@draining_agent.on_shutdown()
+async def send_last_frames():
+    """Queue frames that are only sent when the agent disconnects."""
+    for i in range(3):
+        await draining_agent.emit("last", {"i": i})
+
+
+def run_draining_agent(url: str, auth: dict) -> None:
+    """Run the draining agent until it is terminated."""
+    asyncio.run(run_until_terminated(draining_agent.run(url, auth)))
+
+
+def free_port() -> int:
+    """Get a free local port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_server() -> tuple:
+    """Serve the socket.io app without lifespan, return the server, task and url."""
+    port = free_port()
+    server = DrainingServer(
+        uvicorn.Config(
+            sio_app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"
+        )
+    )
+    server.install_signal_handlers = lambda: None  # type: ignore
+    serving = asyncio.create_task(server.serve())
+    while not server.started and not serving.done():
+        await asyncio.sleep(0.01)
+    return server, serving, f"http://127.0.0.1:{port}"
+
+
+async def wait_until(condition, timeout: float = 5.0) -> None:
+    """Wait until condition() is true."""
+    for _ in range(int(timeout / 0.02)):
+        if condition():
+            return
+        await asyncio.sleep(0.02)
+    assert condition()
+
+
+async def provision(api, agent_name: str, space: dict) -> tuple:
+    """Create an agent in space, return it and its auth."""
+    agent = await api.create_agent(agent_name)
+    await api.join_space(space["uuid"], agent["uuid"])
+    token = await api.create_auth_token(agent["uuid"])
+    return agent, {"token": token["token"]}
+
+
+async def test_shutdown_drains_agents(api):
+    """Test frames agents send as the server shuts down are written."""
+    space = await api.create_space("draining")
+    agent, auth = await provision(api, "draining", space)
+
+    await frame_writer.start()
+    server, serving, url = await start_server()
+    await sup.add_process("draining", run_draining_agent, url, auth)
+    try:
+        await sup.start()
+        await wait_until(lambda: routes.sids_for_agent(agent["uuid"]))
+        # Let the agent start up before it is terminated
+        await asyncio.sleep(0.2)
+
+        server.should_exit = True
+        await asyncio.wait_for(serving, 15)
+        assert not sup.running
+        await frame_writer.stop()
+        frames = await api.get_frames(name="last")
+        assert sorted(frame["data"]["i"] for frame in frames["frames"]) == [0, 1, 2]
+    finally:
+        server.should_exit = True
+        await asyncio.wait_for(serving, 15)
+        await frame_writer.stop()
+        await sup.remove_process("draining")
+
+
+async def test_failed_frames_are_replayed(api):
+    """Test a frame that failed is replayed although a later frame was acked."""
+    space = await api.create_space("replay")
+    receiver_row, receiver_auth = await provision(api, "receiver", space)
+    sender_row, sender_auth = await provision(api, "sender", space)
+    receiver = Agent("receiver", ack_delay=0.01)
+    sender = Agent("sender")
+    calls = []
+
+    @receiver.on_event("test")
+    async def on_test(frame):
+        calls.append(frame["data"]["v"])
+        if calls == [1]:
+            raise RuntimeError("not yet")
+
+    await frame_writer.start()
+    server, serving, url = await start_server()
+    try:
+        await receiver.connect(url, receiver_auth)
+        await sender.connect(url, sender_auth)
+        await wait_until(
+            lambda: routes.sids_for_agent(receiver_row["uuid"])
+            and routes.sids_for_agent(sender_row["uuid"])
+        )
+        await sender.emit("test", {"v": 1})
+        await sender.emit("test", {"v": 2})
+        await wait_until(lambda: calls == [1, 2])
+        # Time for an ack of frame 2 to reach the server
+        await asyncio.sleep(0.1)
+
+        await receiver.disconnect()
+        await wait_until(lambda: not routes.sids_for_agent(receiver_row["uuid"]))
+        await receiver.connect(url, receiver_auth)
+        await wait_until(lambda: calls == [1, 2, 1])
+        await asyncio.sleep(0.1)
+        assert calls == [1, 2, 1]
+    finally:
+        for agent in (receiver, sender):
+            if agent.sio.connected:
+                await agent.disconnect()
+        server.should_exit = True
+        await asyncio.wait_for(serving, 15)
+        await frame_writer.stop()
@@ -0,0 +1,80 @@
+"""Test storage profiles."""
+import asyncio
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from zycelium.zygote.api import ZygoteAPI
+from zycelium.zygote.storage import ReaderPool, prepare_database, storage_urls
+
+
+def test_storage_urls():
+    """Test profiles map to database urls."""
+    assert storage_urls("/tmp/z.db", profile="default") == ("sqlite:///tmp/z.db", None)
+    write_url, read_url = storage_urls("/tmp/z.db", synchronous="full")
+    assert "synchronous=FULL" in write_url
+    assert "query_only=ON" in read_url
+    assert storage_urls(":memory:")[1] is None
+    with pytest.raises(ValueError):
+        storage_urls("/tmp/z.db", profile="fast")
+
+
+async def test_tuned_profile_reads(api, tmp_path):
+    """Test frames written by the API are read through the read connection."""
+    await api.stop()
+    tuned = ZygoteAPI()
+    await tuned.start(*storage_urls(tmp_path / "zygote.db"))
+    try:
+        space = await tuned.create_space("test")
+        agent = await tuned.create_agent("test")
+        await tuned.create_frame(
+            kind="event",
+            name="test",
+            agent_uuid=agent["uuid"],
+            space_uuids=[space["uuid"]],
+        )
+        frames = await tuned.get_frames(space_uuid=space["uuid"])
+        assert [frame["name"] for frame in frames["frames"]] == ["test"]
+        journal = (
+            await tuned._reader.execute_query_dict(  # pylint: disable=protected-access
+                "PRAGMA journal_mode"
+            )
+        )
+        assert journal == [{"journal_mode": "wal"}]
+    finally:
+        await tuned.stop()
+
+
+async def test_reader_pool_prefers_idle(api, tmp_path):
+    """Test the pool hands out connections that are not running a query."""
+    await api.stop()
+    write_url, read_url = storage_urls(tmp_path / "zygote.db")
+    tuned = ZygoteAPI()
+    await tuned.start(write_url)
+    pool = ReaderPool(read_url, size=2)
+    await pool.open()
+    try:
+        first = pool.get()
+        async with first._lock:  # pylint: disable=protected-access
+            assert pool.get() is not first
+            assert pool.get() is not first
+        # Idle connections take turns
+        assert pool.get() is not pool.get()
+        query = "SELECT count(*) AS n FROM frame"
+        results = await asyncio.gather(
+            *(pool.get().execute_query_dict(query) for _ in range(4))
+        )
+        assert results == [[{"n": 0}]] * 4
+    finally:
+        await pool.close()
+        await tuned.stop()
+    assert pool.get() is None
+
+
+def test_prepare_database(tmp_path):
+    """Test new databases are created with incremental auto_vacuum."""
+    path = tmp_path / "zygote.db"
+    prepare_database(path)
+    with closing(sqlite3.connect(path)) as connection:
+        assert connection.execute("PRAGMA auto_vacuum").fetchone() == (2,)
@@ -0,0 +1,43 @@
+"""Test frame subscriptions."""
+import pytest
+
+from zycelium.zygote.subscriptions import SubscriptionIndex
+
+
+def test_exact_and_wildcard():
+    """Test matching exact names and patterns."""
+    index = SubscriptionIndex()
+    index.add("sid-1", ["openweather/current"])
+    index.add("sid-2", ["openweather/+"])
+    index.add("sid-3", ["*"])
+    index.add("sid-4", [])
+    index.add("sid-5", ["fediverse/#"])
+    assert index.match("openweather/current") == {"sid-1", "sid-2", "sid-3"}
+    assert index.match("openweather/forecast") == {"sid-2", "sid-3"}
+    assert index.match("telegram/send") == {"sid-3"}
+    assert index.match("fediverse/bookmark") == {"sid-3", "sid-5"}
+
+
+def test_invalid_pattern():
+    """Test invalid patterns are rejected without partial subscriptions."""
+    index = SubscriptionIndex()
+    with pytest.raises(ValueError):
+        index.add("sid-1", ["a", "b/#/c"])
+    assert index.match("a") == set()
+
+
+def test_default_is_catch_all():
+    """Test agents without subscriptions get every frame."""
+    index = SubscriptionIndex()
+    index.add("sid-1")
+    assert index.match("anything") == {"sid-1"}
+
+
+def test_remove():
+    """Test removing subscriptions of a disconnected agent."""
+    index = SubscriptionIndex()
+    index.add("sid-1", ["a", "b/+", "*"])
+    index.remove("sid-1")
+    assert len(index) == 0
+    assert index.match("a") == set()
+    assert index.match("b/c") == set()
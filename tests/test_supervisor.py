@@ -1,9 +1,18 @@
 """
 Test the supervisor.process module. 
 """
+import asyncio
+import os
+import signal
 import time
 
-from zycelium.zygote.supervisor import Process, Supervisor
+from zycelium.zygote.signals import process_quarantined, process_started
+from zycelium.zygote.supervisor import (
+    Process,
+    RestartPolicy,
+    Supervisor,
+    agent_context,
+)
 
 
 def dummy_process() -> None:
@@ -14,6 +23,34 @@ def dummy_process() -> None:
         time.sleep(1)
 
 
+def draining_process() -> None:
+    """
+    A process that takes a while to exit when asked to terminate.
+    """
+
+    def drain(*_args) -> None:
+        time.sleep(0.3)
+        os._exit(0)  # pylint: disable=protected-access
+
+    signal.signal(signal.SIGTERM, drain)
+    dummy_process()
+
+
+def stubborn_process() -> None:
+    """
+    A process that ignores requests to terminate.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    dummy_process()
+
+
+def crashing_process() -> None:
+    """
+    A process that exits at once with an error.
+    """
+    os._exit(1)  # pylint: disable=protected-access
+
+
 def test_process() -> None:
     """
     Test the start method.
@@ -37,3 +74,138 @@ async def test_supervisor() -> None:
     assert await supervisor.is_alive("dummy")
     await supervisor.stop()
     assert not await supervisor.is_alive("dummy")
+
+
+async def test_supervisor_restarts_on_exit() -> None:
+    """
+    Test a killed process is restarted within milliseconds.
+    """
+    restarted = asyncio.Event()
+
+    async def on_started(sender, **_kwargs):
+        if sender == "dummy":
+            restarted.set()
+
+    process_started.connect(on_started)
+    supervisor = Supervisor(RestartPolicy(backoff=0))
+    await supervisor.add_process("dummy", dummy_process)
+    await supervisor.start()
+    try:
+        latencies = []
+        for _ in range(3):
+            restarted.clear()
+            pid = supervisor.processes["dummy"].process.pid
+            start = time.perf_counter()
+            os.kill(pid, signal.SIGKILL)
+            await asyncio.wait_for(restarted.wait(), timeout=5)
+            latencies.append(time.perf_counter() - start)
+            assert supervisor.processes["dummy"].process.pid != pid
+        assert max(latencies) < 0.5
+    finally:
+        process_started.disconnect(on_started)
+        await supervisor.stop()
+    assert not await supervisor.is_alive("dummy")
+
+
+def test_restart_policy_delay() -> None:
+    """
+    Test delays double after the first exit, up to the maximum.
+    """
+    policy = RestartPolicy(backoff=1, max_backoff=5, jitter=0)
+    assert [policy.delay(exits) for exits in range(1, 6)] == [0, 1, 2, 4, 5]
+    policy.jitter = 0.5
+    assert 4 <= policy.delay(4) <= 6
+
+
+async def test_supervisor_quarantines_crash_loop() -> None:
+    """
+    Test a crash-looping process is quarantined until resumed.
+    """
+    quarantined = asyncio.Event()
+
+    async def on_quarantined(sender, **_kwargs):
+        if sender == "crash":
+            quarantined.set()
+
+    process_quarantined.connect(on_quarantined)
+    supervisor = Supervisor(RestartPolicy(backoff=0.05, max_restarts=3))
+    await supervisor.add_process("crash", crashing_process)
+    await supervisor.start()
+    try:
+        start = time.perf_counter()
+        await asyncio.wait_for(quarantined.wait(), timeout=5)
+        # Backed off 0.05 and 0.1 seconds before the second and third restarts
+        assert time.perf_counter() - start >= 0.15
+        status = (await supervisor.status())["crash"]
+        assert (status["state"], status["restarts"], status["exitcode"]) == (
+            "quarantined",
+            3,
+            1,
+        )
+        await asyncio.sleep(0.1)
+        assert not await supervisor.is_alive("crash")
+
+        quarantined.clear()
+        await supervisor.resume("crash")
+        await asyncio.wait_for(quarantined.wait(), timeout=5)
+        assert (await supervisor.status())["crash"]["restarts"] == 6
+    finally:
+        process_quarantined.disconnect(on_quarantined)
+        await supervisor.stop()
+
+
+async def test_supervisor_forkserver() -> None:
+    """
+    Test processes start and restart from a preloaded fork server.
+    """
+    restarted = asyncio.Event()
+
+    async def on_started(sender, **_kwargs):
+        if sender == "sleep":
+            restarted.set()
+
+    process_started.connect(on_started)
+    supervisor = Supervisor(RestartPolicy(backoff=0), agent_context("forkserver"))
+    await supervisor.add_process("sleep", time.sleep, 60)
+    await supervisor.start()
+    try:
+        pid = supervisor.processes["sleep"].process.pid
+        restarted.clear()
+        start = time.perf_counter()
+        os.kill(pid, signal.SIGKILL)
+        await asyncio.wait_for(restarted.wait(), timeout=5)
+        assert time.perf_counter() - start < 0.5
+        assert (await supervisor.status())["sleep"]["restarts"] == 1
+        assert await supervisor.is_alive("sleep")
+    finally:
+        process_started.disconnect(on_started)
+        await supervisor.stop()
+    assert not await supervisor.is_alive("sleep")
+
+
+async def test_supervisor_stops_in_parallel() -> None:
+    """
+    Test processes drain concurrently, stragglers are killed at the deadline.
+    """
+    supervisor = Supervisor()
+    for i in range(4):
+        await supervisor.add_process(f"draining-{i}", draining_process)
+    await supervisor.start()
+    await asyncio.sleep(0.2)
+    start = time.perf_counter()
+    await supervisor.stop(timeout=5)
+    # Bounded by the slowest process, not the sum of their drain times
+    assert time.perf_counter() - start < 0.9
+    assert {p.process.exitcode for p in supervisor.processes.values()} == {0}
+
+    supervisor = Supervisor()
+    await supervisor.add_process("stubborn", stubborn_process)
+    await supervisor.add_process("dummy", dummy_process)
+    await supervisor.start()
+    await asyncio.sleep(0.2)
+    start = time.perf_counter()
+    await supervisor.stop(timeout=0.2)
+    assert time.perf_counter() - start < 1
+    status = await supervisor.status()
+    assert status["stubborn"]["exitcode"] == -signal.SIGKILL
+    assert status["dummy"]["exitcode"] == -signal.SIGTERM
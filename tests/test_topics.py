@@ -0,0 +1,62 @@
+"""Test hierarchical topic matching."""
+import pytest
+
+from zycelium.zygote.topics import TopicTrie, split_topic
+
+
+def test_exact():
+    """Test exact topics."""
+    trie = TopicTrie()
+    trie.insert("openweather/current", 1)
+    assert trie.match("openweather/current") == {1}
+    assert trie.match("openweather") == set()
+    assert trie.match("openweather/current/extra") == set()
+
+
+def test_single_level_wildcard():
+    """Test "+" matches one segment."""
+    trie = TopicTrie()
+    trie.insert("openweather/+", 1)
+    trie.insert("+/send", 2)
+    assert trie.match("openweather/current") == {1}
+    assert trie.match("telegram/send") == {2}
+    assert trie.match("openweather/current/extra") == set()
+
+
+def test_multi_level_wildcard():
+    """Test "#" matches remaining segments, including none."""
+    trie = TopicTrie()
+    trie.insert("fediverse/#", 1)
+    trie.insert("#", 2)
+    assert trie.match("fediverse") == {1, 2}
+    assert trie.match("fediverse/bookmark/new") == {1, 2}
+    assert trie.match("telegram/send") == {2}
+
+
+def test_star_aliases():
+    """Test "*" aliases for compatibility."""
+    trie = TopicTrie()
+    trie.insert("*", 1)
+    trie.insert("openweather/*", 2)
+    assert trie.match("openweather/current") == {1, 2}
+    assert trie.match("telegram/send/now") == {1}
+
+
+def test_remove_prunes():
+    """Test removing subscriptions."""
+    trie = TopicTrie()
+    trie.insert("a/+/c", 1)
+    trie.insert("a/+/c", 2)
+    trie.remove("a/+/c", 1)
+    assert trie.match("a/b/c") == {2}
+    trie.remove("a/+/c", 2)
+    assert trie.match("a/b/c") == set()
+    assert len(trie) == 0
+    trie.remove("x/y", 3)
+
+
+@pytest.mark.parametrize("pattern", ["a/#/c", "a/b#", "a/b+/c"])
+def test_invalid_patterns(pattern):
+    """Test misplaced wildcards are rejected."""
+    with pytest.raises(ValueError):
+        split_topic(pattern)